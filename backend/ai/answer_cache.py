@@ -0,0 +1,281 @@
+"""
+Cache sémantique des réponses du chat RAG
+Une question identique ou quasi identique (similarité d'embedding) posée sur
+le même corpus et dans la même portée réutilise la réponse déjà générée.
+"""
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import threading
+import hashlib
+import base64
+import json
+import time
+import uuid
+import logging
+
+from ai.corpus_version import search_scope_keys, get_corpus_version_tracker
+
+logger = logging.getLogger(__name__)
+
+
+def _encode_embedding(embedding: np.ndarray) -> str:
+    """Sérialise un vecteur float32 en base64"""
+    return base64.b64encode(np.asarray(embedding, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def _decode_embedding(data: str) -> np.ndarray:
+    """Désérialise un vecteur float32 depuis base64"""
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+
+class MemoryAnswerBackend:
+    """Stockage en mémoire (fallback sans Redis, tests)"""
+
+    def __init__(self, ttl_seconds: float, max_entries_per_scope: int, max_scopes: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_scope = max_entries_per_scope
+        self.max_scopes = max_scopes
+        self._scopes: "OrderedDict[str, OrderedDict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, scope_key: str) -> List[Tuple[str, np.ndarray, Dict]]:
+        """Entrées non expirées d'une portée"""
+        now = time.time()
+        with self._lock:
+            entries = self._scopes.get(scope_key)
+            if not entries:
+                return []
+            self._scopes.move_to_end(scope_key)
+
+            expired = [eid for eid, (_, _, created) in entries.items()
+                       if self.ttl_seconds and now - created > self.ttl_seconds]
+            for eid in expired:
+                del entries[eid]
+
+            return [(eid, emb, payload) for eid, (emb, payload, _) in entries.items()]
+
+    def add(self, scope_key: str, entry_id: str, embedding: np.ndarray, payload: Dict) -> None:
+        """Ajoute une entrée (LRU par portée et entre portées)"""
+        with self._lock:
+            entries = self._scopes.setdefault(scope_key, OrderedDict())
+            self._scopes.move_to_end(scope_key)
+            entries[entry_id] = (embedding, payload, time.time())
+
+            while len(entries) > self.max_entries_per_scope:
+                entries.popitem(last=False)
+            while len(self._scopes) > self.max_scopes:
+                self._scopes.popitem(last=False)
+
+    def touch(self, scope_key: str, entry_id: str) -> None:
+        """Marque une entrée comme récemment utilisée"""
+        with self._lock:
+            entries = self._scopes.get(scope_key)
+            if entries and entry_id in entries:
+                entries.move_to_end(entry_id)
+
+
+class RedisAnswerBackend:
+    """
+    Stockage Redis partagé entre workers
+
+    Par portée : un hash (entry_id -> JSON) et un sorted set (entry_id ->
+    dernier accès) pour l'éviction LRU. Les deux clés expirent avec le TTL.
+    """
+
+    KEY_PREFIX = "rag:answers:"
+
+    def __init__(self, redis_client, ttl_seconds: float, max_entries_per_scope: int):
+        self.redis = redis_client
+        self.ttl_seconds = int(ttl_seconds)
+        self.max_entries_per_scope = max_entries_per_scope
+
+    def _keys(self, scope_key: str) -> Tuple[str, str]:
+        return f"{self.KEY_PREFIX}{scope_key}", f"{self.KEY_PREFIX}{scope_key}:lru"
+
+    def load(self, scope_key: str) -> List[Tuple[str, np.ndarray, Dict]]:
+        entries_key, _ = self._keys(scope_key)
+        raw = self.redis.hgetall(entries_key)
+
+        entries = []
+        for eid, value in raw.items():
+            data = json.loads(value)
+            entries.append((eid.decode() if isinstance(eid, bytes) else eid,
+                            _decode_embedding(data["embedding"]), data["payload"]))
+        return entries
+
+    def add(self, scope_key: str, entry_id: str, embedding: np.ndarray, payload: Dict) -> None:
+        entries_key, lru_key = self._keys(scope_key)
+        value = json.dumps({"embedding": _encode_embedding(embedding), "payload": payload}, ensure_ascii=False)
+
+        pipe = self.redis.pipeline()
+        pipe.hset(entries_key, entry_id, value)
+        pipe.zadd(lru_key, {entry_id: time.time()})
+        if self.ttl_seconds:
+            pipe.expire(entries_key, self.ttl_seconds)
+            pipe.expire(lru_key, self.ttl_seconds)
+        pipe.zcard(lru_key)
+        size = pipe.execute()[-1]
+
+        # Éviction LRU des entrées les moins récemment utilisées
+        overflow = size - self.max_entries_per_scope
+        if overflow > 0:
+            evicted = [eid for eid, _ in self.redis.zpopmin(lru_key, overflow)]
+            if evicted:
+                self.redis.hdel(entries_key, *evicted)
+
+    def touch(self, scope_key: str, entry_id: str) -> None:
+        _, lru_key = self._keys(scope_key)
+        self.redis.zadd(lru_key, {entry_id: time.time()}, xx=True)
+
+
+class AnswerCache:
+    """
+    Cache sémantique des réponses RAG
+
+    Clé de portée = modèle LLM + filtres (organisation, utilisateur,
+    conversation) + versions du corpus de ces portées + empreinte de
+    l'historique. Dans une portée, une entrée est réutilisée si la similarité
+    cosine entre embeddings de questions dépasse `similarity_threshold`.
+    """
+
+    def __init__(self, backend, version_tracker, similarity_threshold: float = 0.95):
+        """
+        Args:
+            backend: MemoryAnswerBackend ou RedisAnswerBackend
+            version_tracker: CorpusVersionTracker (invalidation par portée)
+            similarity_threshold: Similarité cosine minimale pour un hit (0-1)
+        """
+        self.backend = backend
+        self.version_tracker = version_tracker
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def build_scope_key(
+        self,
+        model: str,
+        organization_id: Optional[str],
+        user_id: Optional[str],
+        conversation_id: Optional[str],
+        history: List = None,
+        temperature: Optional[float] = None,
+        retrieval: Optional[Dict] = None
+    ) -> str:
+        """
+        Construit la clé de portée (incluant les versions courantes du corpus)
+
+        Args:
+            retrieval: Paramètres de recherche (top_k, seuils, mode, rerank,
+                MMR...) : des chunks différents donnent une autre réponse
+        """
+        scope_keys = search_scope_keys(organization_id, user_id, conversation_id)
+        versions = self.version_tracker.get_versions(scope_keys)
+
+        history_items = []
+        for msg in history or []:
+            role = msg.role if hasattr(msg, "role") else msg.get("role")
+            content = msg.content if hasattr(msg, "content") else msg.get("content", "")
+            history_items.append([role, content])
+
+        material = json.dumps({
+            "model": model,
+            "versions": versions,
+            "history": history_items,
+            "temperature": temperature,
+            "retrieval": retrieval
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def lookup(self, scope_key: str, query_embedding: np.ndarray) -> Optional[Dict]:
+        """
+        Cherche une réponse pour une question similaire dans la portée
+
+        Returns:
+            Payload de la réponse en cache (None si aucun hit)
+        """
+        try:
+            entries = self.backend.load(scope_key)
+        except Exception as e:
+            logger.warning(f"⚠️ Lecture cache réponses impossible: {e}")
+            entries = []
+
+        best = None
+        if entries:
+            matrix = np.vstack([emb for _, emb, _ in entries]).astype(np.float32)
+            query = np.asarray(query_embedding, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+            similarities = matrix @ query / np.where(norms == 0, 1.0, norms)
+
+            idx = int(np.argmax(similarities))
+            if similarities[idx] >= self.similarity_threshold:
+                best = entries[idx]
+                logger.info(f"  ⚡ Cache réponses: hit (similarité {similarities[idx]:.3f})")
+                try:
+                    self.backend.touch(scope_key, best[0])
+                except Exception:
+                    pass
+
+        with self._lock:
+            if best is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return best[2] if best is not None else None
+
+    def store(self, scope_key: str, query_embedding: np.ndarray, payload: Dict) -> None:
+        """Enregistre une réponse générée"""
+        try:
+            self.backend.add(scope_key, uuid.uuid4().hex, np.asarray(query_embedding, dtype=np.float32), payload)
+        except Exception as e:
+            logger.warning(f"⚠️ Écriture cache réponses impossible: {e}")
+
+    def stats(self) -> Dict:
+        """Compteurs du cache de réponses"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "redis" if isinstance(self.backend, RedisAnswerBackend) else "memory",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+# Instance globale (False = désactivé)
+_answer_cache_instance = None
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Retourne l'instance singleton du cache de réponses (None si désactivé)"""
+    global _answer_cache_instance
+    if _answer_cache_instance is None:
+        from config import settings
+        from utils.redis_client import get_redis_client
+
+        if not settings.answer_cache_enabled:
+            _answer_cache_instance = False
+            return None
+
+        redis_client = get_redis_client() if settings.answer_cache_backend != "memory" else None
+        if redis_client is not None:
+            backend = RedisAnswerBackend(
+                redis_client,
+                ttl_seconds=settings.answer_cache_ttl_seconds,
+                max_entries_per_scope=settings.answer_cache_max_entries
+            )
+        else:
+            backend = MemoryAnswerBackend(
+                ttl_seconds=settings.answer_cache_ttl_seconds,
+                max_entries_per_scope=settings.answer_cache_max_entries
+            )
+
+        _answer_cache_instance = AnswerCache(
+            backend,
+            get_corpus_version_tracker(),
+            similarity_threshold=settings.answer_cache_similarity
+        )
+        logger.info(f"✅ Cache de réponses initialisé ({_answer_cache_instance.stats()['backend']})")
+
+    return _answer_cache_instance or None
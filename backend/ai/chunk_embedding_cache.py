@@ -0,0 +1,111 @@
+"""
+Cache persistant des embeddings de chunks (table chunk_embedding_cache)
+Un PDF réuploadé, ou des PDF partageant des sections (modèles, annexes,
+mentions légales), étaient ré-encodés chunk par chunk. Chaque chunk est
+identifié par le sha256 de son texte normalisé : un vecteur déjà calculé
+par le même modèle est relu en base au lieu de repasser par le transformer.
+Voir migrations/add_embedding_cache.sql.
+"""
+from typing import Dict, List, Optional
+import hashlib
+import threading
+import logging
+
+import numpy as np
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+def chunk_content_hash(content: str) -> str:
+    """sha256 du texte d'un chunk, espaces normalisés (mise en page du PDF ignorée)"""
+    return hashlib.sha256(" ".join(content.split()).encode("utf-8")).hexdigest()
+
+
+class ChunkEmbeddingCache:
+    """
+    Embeddings par (empreinte du chunk, modèle), dans PostgreSQL
+
+    Les requêtes passent par la session de l'appelant : les vecteurs ajoutés
+    sont validés avec le document qui les a produits.
+    """
+
+    def __init__(self, model_name: str):
+        """
+        Args:
+            model_name: Modèle d'embeddings (un changement de modèle invalide le cache)
+        """
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, db, content_hashes: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Vecteurs déjà calculés pour ces empreintes
+
+        Returns:
+            Embedding float32 de chaque empreinte trouvée
+        """
+        if not content_hashes:
+            return {}
+
+        rows = db.execute(text("""
+            SELECT content_hash, CAST(embedding AS real[])
+            FROM chunk_embedding_cache
+            WHERE model = :model AND content_hash = ANY(:hashes)
+        """), {"model": self.model_name, "hashes": list(content_hashes)})
+        found = {content_hash: np.asarray(embedding, dtype=np.float32) for content_hash, embedding in rows}
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(content_hashes) - len(found)
+        return found
+
+    def store_from_chunks(self, db, document_id: str, content_hashes: List[str]) -> None:
+        """
+        Ajoute au cache les vecteurs des chunks tout juste insérés
+
+        Copie côté serveur depuis document_chunks (même transaction) : les
+        vecteurs ne refont pas l'aller-retour.
+        """
+        if not content_hashes:
+            return
+
+        db.execute(text("""
+            INSERT INTO chunk_embedding_cache (content_hash, model, embedding)
+            SELECT DISTINCT ON (content_hash) content_hash, :model, embedding
+            FROM document_chunks
+            WHERE document_id = :document_id AND content_hash = ANY(:hashes)
+            ON CONFLICT DO NOTHING
+        """), {"model": self.model_name, "document_id": document_id, "hashes": list(content_hashes)})
+
+    def stats(self) -> Dict:
+        """Compteurs du cache (depuis le démarrage du processus)"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+# Instance globale (False = désactivé)
+_cache_instance = None
+
+def get_chunk_embedding_cache() -> Optional[ChunkEmbeddingCache]:
+    """Retourne l'instance singleton du cache d'embeddings de chunks (None si désactivé)"""
+    global _cache_instance
+    if _cache_instance is None:
+        from config import settings
+
+        if not settings.chunk_embedding_cache_enabled:
+            _cache_instance = False
+            return None
+
+        _cache_instance = ChunkEmbeddingCache(settings.embeddings_model)
+        logger.info(f"✅ Cache d'embeddings de chunks initialisé ({settings.embeddings_model})")
+
+    return _cache_instance or None
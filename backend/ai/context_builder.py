@@ -0,0 +1,236 @@
+"""
+Construction du contexte RAG sous budget de tokens
+Fusionne les chunks adjacents d'un même document (suppression de l'overlap
+du TextChunker), élimine les doublons, puis choisit le sous-ensemble de blocs
+le plus pertinent qui tient dans le budget de tokens du provider.
+"""
+from typing import Callable, Dict, List
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Overlap max recherché entre deux chunks adjacents (TextChunker: 200 par défaut)
+MAX_OVERLAP_CHARS = 500
+
+# Séparateur entre blocs de contexte
+CONTEXT_SEPARATOR = "\n---\n"
+
+
+def estimate_tokens(text: str, chars_per_token: float = 4.0) -> int:
+    """Estimation du nombre de tokens à partir du nombre de caractères"""
+    return max(1, math.ceil(len(text) / chars_per_token))
+
+
+def find_overlap(previous: str, following: str, max_overlap: int = MAX_OVERLAP_CHARS) -> int:
+    """
+    Longueur du plus long suffixe de `previous` qui est aussi un préfixe de `following`
+
+    Returns:
+        Nombre de caractères de recouvrement (0 si aucun)
+    """
+    limit = min(len(previous), len(following), max_overlap)
+    for size in range(limit, 0, -1):
+        if previous.endswith(following[:size]):
+            return size
+    return 0
+
+
+def merge_adjacent_chunks(chunks: List[Dict]) -> List[Dict]:
+    """
+    Fusionne les chunks consécutifs (chunk_index contigus) d'un même document
+
+    Le recouvrement textuel entre chunks adjacents n'est conservé qu'une fois.
+    Les chunks dont le contenu est déjà inclus dans un autre sont supprimés.
+
+    Returns:
+        Liste de blocs {'filename', 'document_id', 'content', 'similarity',
+        'chunks': [chunks d'origine]}, triée par similarité décroissante
+    """
+    # Regrouper par document (filename en fallback si document_id absent)
+    by_document: Dict[str, List[Dict]] = {}
+    for chunk in chunks:
+        key = str(chunk.get("document_id") or chunk["filename"])
+        by_document.setdefault(key, []).append(chunk)
+
+    blocks = []
+    for document_chunks in by_document.values():
+        document_chunks = sorted(document_chunks, key=lambda c: c["chunk_index"])
+
+        current = None
+        for chunk in document_chunks:
+            if current is not None and chunk["chunk_index"] == current["chunks"][-1]["chunk_index"] + 1:
+                overlap = find_overlap(current["content"], chunk["content"])
+                current["content"] += chunk["content"][overlap:]
+                current["similarity"] = max(current["similarity"], chunk["similarity"])
+                current["chunks"].append(chunk)
+                continue
+
+            if current is not None:
+                blocks.append(current)
+            current = {
+                "filename": chunk["filename"],
+                "document_id": chunk.get("document_id"),
+                "content": chunk["content"],
+                "similarity": chunk["similarity"],
+                "chunks": [chunk]
+            }
+
+        if current is not None:
+            blocks.append(current)
+
+    # Supprimer les blocs dont le contenu est déjà présent ailleurs (doublons)
+    blocks.sort(key=lambda b: len(b["content"]), reverse=True)
+    unique_blocks = []
+    for block in blocks:
+        text = block["content"].strip()
+        if any(text in kept["content"] for kept in unique_blocks):
+            continue
+        unique_blocks.append(block)
+
+    unique_blocks.sort(key=lambda b: b["similarity"], reverse=True)
+    return unique_blocks
+
+
+def merge_neighbor_spans(hits: List[Dict]) -> List[Dict]:
+    """
+    Remplace les hits étendus à leurs voisins par des passages contigus
+
+    Chaque hit porte 'neighbors' ([{'chunk_index', 'content'}], chunks voisins
+    du même document). Les hits et voisins d'un document sont regroupés en
+    suites de chunk_index contigus ; chaque suite devient un seul résultat,
+    recouvrement entre chunks supprimé. Deux hits proches partagent donc un
+    passage au lieu de répéter leurs voisins communs.
+
+    Returns:
+        Un résultat par passage : champs du meilleur hit du passage, content
+        fusionné, span [premier, dernier chunk_index], trié par similarité
+    """
+    by_document: Dict[str, Dict] = {}
+    for hit in hits:
+        document = by_document.setdefault(str(hit["document_id"]), {"hits": [], "contents": {}})
+        document["hits"].append(hit)
+        document["contents"][hit["chunk_index"]] = hit["content"]
+        for neighbor in hit.get("neighbors") or []:
+            document["contents"].setdefault(neighbor["chunk_index"], neighbor["content"])
+
+    spans = []
+    for document in by_document.values():
+        contents = document["contents"]
+        runs, run = [], []
+        for index in sorted(contents):
+            if run and index != run[-1] + 1:
+                runs.append(run)
+                run = []
+            run.append(index)
+        runs.append(run)
+
+        for run in runs:
+            run_hits = [hit for hit in document["hits"] if run[0] <= hit["chunk_index"] <= run[-1]]
+            if not run_hits:
+                continue
+            best = max(run_hits, key=lambda h: h["similarity"])
+
+            content = contents[run[0]]
+            for index in run[1:]:
+                overlap = find_overlap(content, contents[index])
+                content += contents[index][overlap:]
+
+            span = {k: v for k, v in best.items() if k != "neighbors"}
+            span.update({"content": content, "span": [run[0], run[-1]]})
+            spans.append(span)
+
+    spans.sort(key=lambda s: s["similarity"], reverse=True)
+    return spans
+
+
+def _format_block(block: Dict) -> str:
+    """Formate un bloc de contexte pour le prompt"""
+    return f"[Document: {block['filename']}, Score: {block['similarity']:.2f}]\n{block['content']}\n"
+
+
+def _select_blocks(costs: List[int], values: List[float], budget: int) -> List[int]:
+    """
+    Sac à dos 0/1 : indices des blocs maximisant la pertinence totale sous le budget
+
+    Les coûts sont regroupés par unités pour borner la taille de la table.
+    """
+    unit = max(1, budget // 512)
+    capacity = budget // unit
+    weights = [math.ceil(c / unit) for c in costs]
+
+    best = [0.0] * (capacity + 1)
+    keep = [[False] * (capacity + 1) for _ in costs]
+    for i, (weight, value) in enumerate(zip(weights, values)):
+        for cap in range(capacity, weight - 1, -1):
+            candidate = best[cap - weight] + value
+            if candidate > best[cap]:
+                best[cap] = candidate
+                keep[i][cap] = True
+
+    selected = []
+    cap = capacity
+    for i in range(len(costs) - 1, -1, -1):
+        if keep[i][cap]:
+            selected.append(i)
+            cap -= weights[i]
+    return sorted(selected)
+
+
+def build_context(
+    chunks: List[Dict],
+    max_tokens: int,
+    count_tokens: Callable[[str], int] = estimate_tokens
+) -> Dict:
+    """
+    Construit le contexte RAG sous un budget de tokens
+
+    Args:
+        chunks: Chunks récupérés (filename, chunk_index, content, similarity)
+        max_tokens: Budget de tokens pour le contexte
+        count_tokens: Compteur de tokens du provider
+
+    Returns:
+        Dict avec 'context', 'sources', 'context_used' (blocs), 'tokens_used'
+    """
+    if not chunks:
+        return {"context": "", "sources": [], "context_used": 0, "tokens_used": 0}
+
+    blocks = merge_adjacent_chunks(chunks)
+    texts = [_format_block(block) for block in blocks]
+    separator_cost = count_tokens(CONTEXT_SEPARATOR)
+    costs = [count_tokens(text) + separator_cost for text in texts]
+
+    selected = _select_blocks(costs, [block["similarity"] for block in blocks], max_tokens)
+
+    # Aucun bloc ne tient : tronquer le plus pertinent plutôt que renvoyer un contexte vide
+    if not selected:
+        ratio = max_tokens / costs[0]
+        blocks[0]["content"] = blocks[0]["content"][:int(len(blocks[0]["content"]) * ratio * 0.9)]
+        texts[0] = _format_block(blocks[0])
+        costs[0] = count_tokens(texts[0]) + separator_cost
+        selected = [0]
+
+    sources = []
+    for i in selected:
+        for chunk in blocks[i]["chunks"]:
+            sources.append({
+                "filename": chunk["filename"],
+                "chunk_index": chunk["chunk_index"],
+                "similarity": chunk["similarity"]
+            })
+
+    context = CONTEXT_SEPARATOR.join(texts[i] for i in selected)
+    tokens_used = sum(costs[i] for i in selected)
+
+    logger.info(
+        f"  🧩 Contexte: {len(chunks)} chunks → {len(blocks)} blocs fusionnés → "
+        f"{len(selected)} retenus ({tokens_used}/{max_tokens} tokens)"
+    )
+
+    return {
+        "context": context,
+        "sources": sources,
+        "context_used": len(selected),
+        "tokens_used": tokens_used
+    }
@@ -0,0 +1,280 @@
+"""
+Historique de conversation borné avec résumé glissant
+Les derniers échanges sont gardés mot pour mot sous un budget de tokens ; les
+plus anciens sont remplacés par un résumé par conversation_id, mis à jour de
+façon incrémentale en arrière-plan (hors chemin de requête). La taille du
+prompt reste ainsi à peu près constante quelle que soit la longueur de la
+conversation.
+"""
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+import asyncio
+import hashlib
+import json
+import threading
+import logging
+
+from ai.prompts import SUMMARY_ROLE, build_summary_prompt
+
+logger = logging.getLogger(__name__)
+
+
+def _message_fields(msg) -> Dict:
+    """Rôle et contenu d'un message (dict ou objet Pydantic)"""
+    role = msg.role if hasattr(msg, "role") else msg.get("role")
+    content = msg.content if hasattr(msg, "content") else msg.get("content", "")
+    return {"role": role, "content": content}
+
+
+def history_fingerprint(messages: List) -> str:
+    """Empreinte d'une suite de messages (détecte un historique réécrit côté client)"""
+    material = json.dumps([_message_fields(m) for m in messages], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class SummaryStore:
+    """
+    Résumés par conversation, dans Redis (partagés entre workers) ou en
+    mémoire (fallback mono-processus, LRU)
+    """
+
+    KEY_PREFIX = "rag:conv_summary:"
+
+    def __init__(self, redis_client=None, ttl_seconds: int = 86400, max_local_entries: int = 1000):
+        """
+        Args:
+            redis_client: Client Redis synchrone (None = stockage en mémoire)
+            ttl_seconds: Durée de vie d'un résumé dans Redis (0 = illimitée)
+            max_local_entries: Nombre max de conversations gardées en mémoire
+        """
+        self.redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.max_local_entries = max_local_entries
+        self._local: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: str) -> Optional[Dict]:
+        """Résumé courant {'summary', 'covered', 'fingerprint'} (None si absent)"""
+        if self.redis is not None:
+            try:
+                raw = self.redis.get(self.KEY_PREFIX + conversation_id)
+                return json.loads(raw) if raw else None
+            except Exception as e:
+                logger.warning(f"⚠️ Lecture résumé Redis impossible, fallback mémoire: {e}")
+
+        with self._lock:
+            entry = self._local.get(conversation_id)
+            if entry is not None:
+                self._local.move_to_end(conversation_id)
+            return entry
+
+    def set(self, conversation_id: str, entry: Dict) -> None:
+        """Enregistre le résumé d'une conversation"""
+        if self.redis is not None:
+            try:
+                self.redis.set(
+                    self.KEY_PREFIX + conversation_id,
+                    json.dumps(entry, ensure_ascii=False),
+                    ex=self.ttl_seconds or None
+                )
+                return
+            except Exception as e:
+                logger.warning(f"⚠️ Écriture résumé Redis impossible, fallback mémoire: {e}")
+
+        with self._lock:
+            self._local[conversation_id] = entry
+            self._local.move_to_end(conversation_id)
+            while len(self._local) > self.max_local_entries:
+                self._local.popitem(last=False)
+
+
+class ConversationMemory:
+    """
+    Compacte l'historique envoyé par le client avant construction du prompt
+
+    - Fenêtre récente : au plus `max_recent_turns` échanges, sous `token_budget`
+    - Messages plus anciens : remplacés par le résumé en cache de la conversation
+    - Le résumé est complété en tâche de fond avec les seuls messages qui ne
+      sont pas encore couverts ; la requête courante utilise le résumé
+      disponible sans l'attendre
+    """
+
+    def __init__(
+        self,
+        provider,
+        store: SummaryStore,
+        max_recent_turns: int = 4,
+        token_budget: int = 600,
+        summary_enabled: bool = True,
+        summary_max_tokens: int = 200,
+        count_tokens: Optional[Callable[[str], int]] = None
+    ):
+        """
+        Args:
+            provider: Provider LLM utilisé pour résumer (agenerate)
+            store: Stockage des résumés
+            max_recent_turns: Échanges (question + réponse) gardés mot pour mot
+            token_budget: Budget de tokens de la fenêtre récente
+            summary_enabled: Résumer les messages sortis de la fenêtre
+            summary_max_tokens: Longueur max du résumé (tokens générés)
+            count_tokens: Compteur de tokens (celui du provider par défaut)
+        """
+        self.provider = provider
+        self.store = store
+        self.max_recent_turns = max_recent_turns
+        self.token_budget = token_budget
+        self.summary_enabled = summary_enabled
+        self.summary_max_tokens = summary_max_tokens
+        self.count_tokens = count_tokens or provider.count_tokens
+
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    def split_history(self, history: List) -> int:
+        """
+        Indice de début de la fenêtre récente
+
+        Parcourt l'historique depuis la fin tant que le nombre de messages et
+        le budget de tokens le permettent.
+        """
+        max_messages = self.max_recent_turns * 2
+        used = 0
+        start = len(history)
+        while start > 0 and len(history) - start < max_messages:
+            cost = self.count_tokens(_message_fields(history[start - 1])["content"])
+            if used + cost > self.token_budget:
+                break
+            used += cost
+            start -= 1
+        return start
+
+    async def compact(self, conversation_id: Optional[str], history: List) -> List:
+        """
+        Historique borné à injecter dans le prompt
+
+        Args:
+            conversation_id: ID de la conversation (None = pas de résumé)
+            history: Historique complet envoyé par le client
+
+        Returns:
+            [message de résumé] + messages récents
+        """
+        history = list(history or [])
+        start = self.split_history(history)
+        if start == 0:
+            return history
+
+        older, recent = history[:start], history[start:]
+        if not (self.summary_enabled and conversation_id):
+            logger.info(f"  ✂️ Historique tronqué: {len(older)} anciens messages ignorés")
+            return recent
+
+        entry = await asyncio.to_thread(self.store.get, conversation_id)
+        if entry is not None and (
+            entry["covered"] > len(history)
+            or entry["fingerprint"] != history_fingerprint(history[:entry["covered"]])
+        ):
+            # Historique réécrit côté client : le résumé ne correspond plus
+            entry = None
+
+        # Préfixe stable : tant que les messages non résumés tiennent dans deux
+        # fenêtres, garder la frontière actuelle du résumé. Le début du prompt
+        # reste identique d'un tour à l'autre (cache KV du LLM réutilisable) et
+        # le résumé n'est régénéré qu'une fois toutes les `max_recent_turns` questions.
+        if entry is not None and self._fits(history[entry["covered"]:], factor=2):
+            return self._with_summary(entry, history[entry["covered"]:])
+
+        covered = entry["covered"] if entry else 0
+        if covered < len(older):
+            self._schedule_summary(conversation_id, older, entry)
+
+        logger.info(
+            f"  🗜️ Historique compacté: {len(older)} anciens messages "
+            f"({covered} résumés) + {len(recent)} récents"
+        )
+
+        if not entry:
+            return recent
+        return self._with_summary(entry, recent)
+
+    def _fits(self, messages: List, factor: int = 1) -> bool:
+        """Vérifie que des messages tiennent dans `factor` fenêtres récentes"""
+        if len(messages) > self.max_recent_turns * 2 * factor:
+            return False
+        used = sum(self.count_tokens(_message_fields(m)["content"]) for m in messages)
+        return used <= self.token_budget * factor
+
+    @staticmethod
+    def _with_summary(entry: Dict, messages: List) -> List:
+        """Message de résumé suivi des messages gardés mot pour mot"""
+        return [{"role": SUMMARY_ROLE, "content": entry["summary"]}] + list(messages)
+
+    def _schedule_summary(self, conversation_id: str, older: List, entry: Optional[Dict]) -> None:
+        """Lance la mise à jour du résumé en tâche de fond (une seule par conversation)"""
+        if conversation_id in self._pending:
+            return
+
+        task = asyncio.create_task(
+            self._update_summary(conversation_id, older, entry),
+            name=f"conversation-summary-{conversation_id}"
+        )
+        self._pending[conversation_id] = task
+        task.add_done_callback(lambda _: self._pending.pop(conversation_id, None))
+
+    async def _update_summary(self, conversation_id: str, older: List, entry: Optional[Dict]) -> None:
+        """Intègre au résumé les messages non encore couverts"""
+        previous = entry["summary"] if entry else ""
+        covered = entry["covered"] if entry else 0
+        prepared = build_summary_prompt(previous, older[covered:])
+
+        try:
+            summary = await self.provider.agenerate(
+                prompt=prepared["user_prompt"],
+                system_prompt=prepared["system_prompt"],
+                temperature=prepared["temperature"],
+                max_tokens=self.summary_max_tokens
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Résumé de conversation impossible ({conversation_id}): {e}")
+            return
+
+        new_entry = {
+            "summary": summary.strip(),
+            "covered": len(older),
+            "fingerprint": history_fingerprint(older)
+        }
+        await asyncio.to_thread(self.store.set, conversation_id, new_entry)
+        logger.info(f"  📝 Résumé mis à jour ({conversation_id}): {len(older)} messages couverts")
+
+    async def shutdown(self) -> None:
+        """Annule les résumés en cours (arrêt de l'application)"""
+        tasks = list(self._pending.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Instance globale
+_memory_instance = None
+
+def get_conversation_memory() -> ConversationMemory:
+    """Retourne l'instance singleton de gestion de l'historique"""
+    global _memory_instance
+    if _memory_instance is None:
+        from config import settings
+        from ai.llm_factory import get_llm_generator
+        from utils.redis_client import get_redis_client
+
+        store = SummaryStore(get_redis_client(), ttl_seconds=settings.history_summary_ttl_seconds)
+        _memory_instance = ConversationMemory(
+            get_llm_generator(),
+            store,
+            max_recent_turns=settings.history_max_turns,
+            token_budget=settings.history_token_budget,
+            summary_enabled=settings.history_summary_enabled,
+            summary_max_tokens=settings.history_summary_max_tokens
+        )
+        logger.info(
+            f"✅ Historique borné: {settings.history_max_turns} échanges, "
+            f"{settings.history_token_budget} tokens"
+        )
+    return _memory_instance
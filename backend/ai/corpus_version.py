@@ -0,0 +1,120 @@
+"""
+Compteurs de version du corpus par portée (organisation, utilisateur, conversation)
+Chaque ajout ou suppression de document incrémente la version des portées
+concernées : les caches qui incluent ces versions dans leur clé sont invalidés
+exactement, sans TTL.
+"""
+from typing import Dict, List, Optional
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Portée globale : toute recherche sans filtre dépend de l'ensemble du corpus
+GLOBAL_SCOPE = "all"
+
+
+def document_scope_keys(
+    scope: str,
+    organization_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    conversation_id: Optional[str] = None
+) -> List[str]:
+    """
+    Portées affectées par l'ajout/suppression d'un document
+
+    Reprend les règles de filtrage de VectorStore.search_similar :
+    documents d'organisation, personnels, et de conversation.
+    """
+    keys = [GLOBAL_SCOPE]
+    if scope == "organization" and organization_id:
+        keys.append(f"org:{organization_id}")
+    if scope == "user" and user_id:
+        keys.append(f"user:{user_id}")
+    if conversation_id:
+        keys.append(f"conv:{conversation_id}")
+    return keys
+
+
+def search_scope_keys(
+    organization_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    conversation_id: Optional[str] = None
+) -> List[str]:
+    """Portées dont dépend le résultat d'une recherche avec ces filtres"""
+    keys = []
+    if organization_id:
+        keys.append(f"org:{organization_id}")
+    if user_id:
+        keys.append(f"user:{user_id}")
+    if conversation_id:
+        keys.append(f"conv:{conversation_id}")
+    return keys or [GLOBAL_SCOPE]
+
+
+class CorpusVersionTracker:
+    """
+    Versions de corpus par portée, stockées dans Redis (partagées entre
+    workers) ou en mémoire (fallback mono-processus)
+    """
+
+    KEY_PREFIX = "rag:corpus_version:"
+
+    def __init__(self, redis_client=None):
+        """
+        Args:
+            redis_client: Client Redis synchrone (None = compteurs en mémoire)
+        """
+        self.redis = redis_client
+        self._local: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get_versions(self, scope_keys: List[str]) -> Dict[str, int]:
+        """Retourne la version courante de chaque portée (0 si jamais modifiée)"""
+        if self.redis is not None:
+            try:
+                values = self.redis.mget([self.KEY_PREFIX + k for k in scope_keys])
+                return {k: int(v) if v is not None else 0 for k, v in zip(scope_keys, values)}
+            except Exception as e:
+                logger.warning(f"⚠️ Lecture versions Redis impossible, fallback mémoire: {e}")
+
+        with self._lock:
+            return {k: self._local.get(k, 0) for k in scope_keys}
+
+    def bump(self, scope_keys: List[str]) -> Dict[str, int]:
+        """
+        Incrémente la version des portées (après ajout/suppression de document)
+
+        Returns:
+            Nouvelle version de chaque portée (permet aux caches locaux de
+            savoir si seule cette modification a eu lieu depuis leur chargement)
+        """
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                for k in scope_keys:
+                    pipe.incr(self.KEY_PREFIX + k)
+                versions = dict(zip(scope_keys, (int(v) for v in pipe.execute())))
+                logger.info(f"  🔄 Versions corpus incrémentées: {scope_keys}")
+                return versions
+            except Exception as e:
+                logger.warning(f"⚠️ Incrément versions Redis impossible, fallback mémoire: {e}")
+
+        with self._lock:
+            for k in scope_keys:
+                self._local[k] = self._local.get(k, 0) + 1
+            versions = {k: self._local[k] for k in scope_keys}
+        logger.info(f"  🔄 Versions corpus incrémentées (mémoire): {scope_keys}")
+        return versions
+
+
+# Instance globale
+_tracker_instance = None
+
+def get_corpus_version_tracker() -> CorpusVersionTracker:
+    """Retourne l'instance singleton du suivi de versions du corpus"""
+    global _tracker_instance
+    if _tracker_instance is None:
+        from utils.redis_client import get_redis_client
+        _tracker_instance = CorpusVersionTracker(get_redis_client())
+    return _tracker_instance
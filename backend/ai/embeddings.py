@@ -3,20 +3,236 @@ Module de génération d'embeddings vectoriels
 Utilise sentence-transformers pour convertir du texte en vecteurs
 """
 from sentence_transformers import SentenceTransformer
-from typing import List, Union
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, List, Dict, Optional, Tuple
 import numpy as np
+import threading
+import queue
+import unicodedata
 import logging
+import time
 import os
 
 logger = logging.getLogger(__name__)
 
 
+def normalize_query_text(text: str) -> str:
+    """
+    Normalise un texte de requête pour la clé de cache
+    (Unicode NFKC + espaces compactés). La casse est conservée car le
+    modèle multilingue est sensible à la casse.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class QueryEmbeddingCache:
+    """
+    Cache LRU thread-safe des embeddings de requêtes
+    
+    Clé: (nom du modèle, texte normalisé). Éviction par taille mémoire
+    totale (LRU) et par âge (TTL). Les vecteurs renvoyés sont en lecture seule.
+    """
+    
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, ttl_seconds: float = 3600.0):
+        """
+        Args:
+            max_bytes: Mémoire max occupée par les vecteurs en cache
+            ttl_seconds: Durée de vie d'une entrée (0 = pas d'expiration)
+        """
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[np.ndarray, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        """Retourne l'embedding en cache (None si absent ou expiré)"""
+        key = (model_name, text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            embedding, created_at = entry
+            if self.ttl_seconds and time.monotonic() - created_at > self.ttl_seconds:
+                self._remove(key)
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+    
+    def put(self, model_name: str, text: str, embedding: np.ndarray) -> np.ndarray:
+        """Ajoute un embedding au cache et le retourne (en lecture seule)"""
+        embedding = np.array(embedding, copy=True)
+        embedding.flags.writeable = False
+        if embedding.nbytes > self.max_bytes:
+            return embedding
+        
+        key = (model_name, text)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (embedding, time.monotonic())
+            self._bytes += embedding.nbytes
+            
+            # Éviction LRU jusqu'à repasser sous la limite mémoire
+            while self._bytes > self.max_bytes and self._entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+        
+        return embedding
+    
+    def _remove(self, key: Tuple[str, str]) -> None:
+        """Supprime une entrée (appelant doit détenir le verrou)"""
+        embedding, _ = self._entries.pop(key)
+        self._bytes -= embedding.nbytes
+    
+    def clear(self) -> None:
+        """Vide le cache (les compteurs sont conservés)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self) -> Dict:
+        """Compteurs du cache (hits, misses, taux de hit, taille)"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+class QueryBatcher:
+    """
+    Regroupe les encodages de requêtes concurrents en un seul appel batch
+    
+    Un thread unique collecte les requêtes pendant `max_wait_ms` (ou jusqu'à
+    `max_batch_size`), encode le lot en un appel, puis résout le Future de
+    chaque appelant. Un seul encodage tourne à la fois, ce qui évite aussi la
+    sur-souscription des threads torch.
+    """
+    
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], np.ndarray],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0
+    ):
+        """
+        Args:
+            encode_fn: Fonction d'encodage d'une liste de textes -> array (n, dim)
+            max_batch_size: Taille max d'un lot
+            max_wait_ms: Attente max pour compléter un lot (millisecondes)
+        """
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_observed_batch = 0
+        
+        self._thread = threading.Thread(target=self._run, name="embeddings-batcher", daemon=True)
+        self._thread.start()
+    
+    def submit(self, text: str) -> Future:
+        """Soumet un texte à encoder (non bloquant)"""
+        future = Future()
+        self._queue.put((text, future))
+        return future
+    
+    def close(self) -> None:
+        """Arrête le thread de batching après les lots en cours"""
+        self._queue.put(None)
+    
+    def _run(self) -> None:
+        """Boucle de collecte et d'encodage des lots"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            
+            self._process(batch)
+            if stop:
+                return
+    
+    def _process(self, batch: List[Tuple[str, Future]]) -> None:
+        """Encode un lot (textes dédupliqués) et distribue les résultats"""
+        pending = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not pending:
+            return
+        
+        unique_texts = list(dict.fromkeys(text for text, _ in pending))
+        try:
+            embeddings = self.encode_fn(unique_texts)
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        
+        by_text = dict(zip(unique_texts, embeddings))
+        for text, future in pending:
+            future.set_result(by_text[text])
+        
+        with self._stats_lock:
+            self.batches += 1
+            self.items += len(pending)
+            self.max_observed_batch = max(self.max_observed_batch, len(pending))
+    
+    def stats(self) -> Dict:
+        """Compteurs de batching (nombre de lots, taille moyenne)"""
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size_observed": self.max_observed_batch,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000
+            }
+
+
 class EmbeddingsGenerator:
     """
     Génère des embeddings vectoriels à partir de texte
     """
     
-    def __init__(self, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2"):
+    def __init__(
+        self,
+        model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
+        query_cache: Optional[QueryEmbeddingCache] = None
+    ):
         """
         Initialise le générateur d'embeddings
         
@@ -25,8 +241,11 @@ class EmbeddingsGenerator:
                 - paraphrase-multilingual-MiniLM-L12-v2: 384 dims, multilingue (recommandé pour français)
                 - all-MiniLM-L6-v2: 384 dims, léger, rapide (anglais)
                 - all-mpnet-base-v2: 768 dims, plus précis mais plus lourd
+            query_cache: Cache des embeddings de requêtes (None = désactivé)
         """
         self.model_name = model_name
+        self.query_cache = query_cache
+        self.batcher: Optional[QueryBatcher] = None
         
         logger.info(f"Chargement du modèle d'embeddings: {model_name}")
         
@@ -55,10 +274,122 @@ class EmbeddingsGenerator:
             logger.warning("Texte vide fourni pour embedding")
             return np.zeros(self.embedding_dim)
         
-        # Générer embedding
-        embedding = self.model.encode(text, convert_to_numpy=True)
+        # Le texte normalisé est encodé pour que toutes les variantes d'une
+        # même clé de cache obtiennent exactement le même vecteur
+        normalized = normalize_query_text(text)
+        if self.query_cache is not None:
+            cached = self.query_cache.get(self.model_name, normalized)
+            if cached is not None:
+                return cached
         
-        return embedding
+        # Générer embedding (regroupé avec les requêtes concurrentes si batching actif)
+        if self.batcher is not None:
+            embedding = self.batcher.submit(normalized).result()
+        else:
+            embedding = self.model.encode(normalized, convert_to_numpy=True)
+        
+        return self._cache_put(normalized, embedding)
+    
+    
+    def submit_embedding(self, text: str) -> Future:
+        """
+        Variante non bloquante de generate_embedding (nécessite le batching)
+        
+        Retourne un Future résolu immédiatement en cas de hit du cache, sinon
+        quand le lot contenant ce texte a été encodé. Les appelants asyncio
+        l'attendent via asyncio.wrap_future sans occuper de thread.
+        """
+        if self.batcher is None:
+            raise RuntimeError("Le batching des requêtes n'est pas activé (enable_batching)")
+        
+        result = Future()
+        if not text or not text.strip():
+            result.set_result(self.generate_embedding(text))
+            return result
+        
+        normalized = normalize_query_text(text)
+        if self.query_cache is not None:
+            cached = self.query_cache.get(self.model_name, normalized)
+            if cached is not None:
+                result.set_result(cached)
+                return result
+        
+        def _on_done(inner: Future) -> None:
+            try:
+                result.set_result(self._cache_put(normalized, inner.result()))
+            except Exception as e:
+                result.set_exception(e)
+        
+        self.batcher.submit(normalized).add_done_callback(_on_done)
+        return result
+    
+    
+    def generate_query_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode un lot de requêtes en un seul appel au modèle
+        
+        Même normalisation et même cache que generate_embedding : seules les
+        requêtes absentes du cache sont encodées, ensemble.
+        
+        Returns:
+            Array numpy de shape (len(texts), embedding_dim), dans l'ordre des textes
+        """
+        embeddings = np.zeros((len(texts), self.embedding_dim), dtype=np.float32)
+        
+        missing: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+            normalized = normalize_query_text(text)
+            cached = self.query_cache.get(self.model_name, normalized) if self.query_cache is not None else None
+            if cached is not None:
+                embeddings[i] = cached
+            else:
+                missing.setdefault(normalized, []).append(i)
+        
+        if missing:
+            to_encode = list(missing)
+            encoded = self.model.encode(to_encode, batch_size=min(len(to_encode), 64), convert_to_numpy=True)
+            for normalized, embedding in zip(to_encode, encoded):
+                embedding = self._cache_put(normalized, embedding)
+                embeddings[missing[normalized]] = embedding
+        
+        return embeddings
+    
+    
+    def _cache_put(self, normalized: str, embedding: np.ndarray) -> np.ndarray:
+        """Ajoute l'embedding au cache de requêtes s'il est actif"""
+        if self.query_cache is None:
+            return embedding
+        return self.query_cache.put(self.model_name, normalized, embedding)
+    
+    
+    def enable_batching(self, max_batch_size: int = 32, max_wait_ms: float = 5.0) -> None:
+        """
+        Active le regroupement des encodages de requêtes concurrents
+        
+        Args:
+            max_batch_size: Taille max d'un lot
+            max_wait_ms: Attente max pour compléter un lot (millisecondes)
+        """
+        if self.batcher is not None:
+            return
+        
+        def _encode_batch(texts: List[str]) -> np.ndarray:
+            return self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+        
+        self.batcher = QueryBatcher(_encode_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        logger.info(f"✅ Batching des requêtes activé (max {max_batch_size}, {max_wait_ms} ms)")
+    
+    
+    def batching_stats(self) -> Optional[Dict]:
+        """Compteurs du batching de requêtes (None si désactivé)"""
+        return self.batcher.stats() if self.batcher is not None else None
+    
+    
+    def cache_stats(self) -> Optional[Dict]:
+        """Compteurs du cache d'embeddings de requêtes (None si désactivé)"""
+        return self.query_cache.stats() if self.query_cache is not None else None
     
     
     def generate_embeddings(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
@@ -121,11 +452,27 @@ def get_embeddings_generator() -> EmbeddingsGenerator:
         try:
             from config import settings
             model_name = settings.embeddings_model
+            cache_max_mb = settings.embedding_cache_max_mb
+            cache_ttl = settings.embedding_cache_ttl_seconds
+            batching = settings.embedding_batching_enabled
+            batch_max_size = settings.embedding_batch_max_size
+            batch_max_wait_ms = settings.embedding_batch_max_wait_ms
         except ImportError:
             # Fallback pour tests isolés
             model_name = os.getenv("EMBEDDINGS_MODEL", "paraphrase-multilingual-MiniLM-L12-v2")
+            cache_max_mb, cache_ttl = 32.0, 3600.0
+            batching, batch_max_size, batch_max_wait_ms = False, 32, 5.0
+        
+        query_cache = None
+        if cache_max_mb > 0:
+            query_cache = QueryEmbeddingCache(
+                max_bytes=int(cache_max_mb * 1024 * 1024),
+                ttl_seconds=cache_ttl
+            )
         
-        _embeddings_instance = EmbeddingsGenerator(model_name)
+        _embeddings_instance = EmbeddingsGenerator(model_name, query_cache=query_cache)
+        if batching:
+            _embeddings_instance.enable_batching(batch_max_size, batch_max_wait_ms)
     return _embeddings_instance
 
 
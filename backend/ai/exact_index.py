@@ -0,0 +1,391 @@
+"""
+Recherche exacte en mémoire (NumPy) pour les petits et moyens tenants
+Pour une portée de quelques dizaines de milliers de chunks, un produit
+scalaire sur une matrice float32 contiguë est plus rapide qu'un aller-retour
+Postgres et exact (pas d'approximation HNSW). Les matrices sont chargées à la
+demande, évincées en LRU, mises à jour incrémentalement à l'ajout ou à la
+suppression d'un document, et validées par les versions du corpus.
+"""
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+import threading
+import hashlib
+import json
+import logging
+
+from sqlalchemy import text
+
+from ai.corpus_version import get_corpus_version_tracker
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Normalise les lignes (similarité cosine = produit scalaire)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+class TenantMatrix:
+    """
+    Embeddings normalisés d'une portée + métadonnées des chunks (même ordre)
+
+    Immuable : les mises à jour créent une nouvelle instance, les recherches
+    concurrentes n'ont pas besoin de verrou.
+    """
+
+    def __init__(self, matrix: np.ndarray, rows: List[Dict], version: int):
+        self.matrix = matrix
+        self.rows = rows
+        self.version = version
+        self._positions = None  # (document_id, chunk_index) -> ligne, construit à la demande
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        similarity_threshold: float,
+        with_embeddings: bool = False,
+        neighbors: int = 0
+    ) -> List[Dict]:
+        """Top-k exact par argpartition (O(n) au lieu d'un tri complet)"""
+        if not self.rows:
+            return []
+
+        similarities = self.matrix @ query
+        k = min(top_k, len(similarities))
+        candidates = np.argpartition(-similarities, k - 1)[:k]
+        candidates = candidates[np.argsort(-similarities[candidates])]
+
+        results = []
+        for i in candidates:
+            if similarities[i] < similarity_threshold:
+                continue
+            result = {**self.rows[i], "similarity": float(similarities[i])}
+            if with_embeddings:
+                result["embedding"] = self.matrix[i]
+            if neighbors:
+                result["neighbors"] = self._neighbors(self.rows[i], neighbors)
+            results.append(result)
+        return results
+
+    def _neighbors(self, row: Dict, count: int) -> List[Dict]:
+        """Chunks chunk_index ± count du même document (même portée, donc en mémoire)"""
+        if self._positions is None:
+            self._positions = {(r["document_id"], r["chunk_index"]): i for i, r in enumerate(self.rows)}
+        found = []
+        for index in range(row["chunk_index"] - count, row["chunk_index"] + count + 1):
+            position = self._positions.get((row["document_id"], index))
+            if index != row["chunk_index"] and position is not None:
+                found.append({"chunk_index": index, "content": self.rows[position]["content"]})
+        return found
+
+    def with_document(self, rows: List[Dict], embeddings: np.ndarray, version: int) -> "TenantMatrix":
+        """
+        Copie avec les chunks d'un document en plus (les lecteurs en cours gardent l'ancienne)
+
+        Le document peut déjà être chargé : les chunks sont validés avant la
+        montée de version, une portée chargée entre les deux les contient déjà
+        """
+        document_ids = {row["document_id"] for row in rows}
+        if any(row["document_id"] in document_ids for row in self.rows):
+            return TenantMatrix(self.matrix, self.rows, version)
+        added = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        return TenantMatrix(np.vstack([self.matrix, added]), self.rows + rows, version)
+
+    def without_document(self, document_id: str, version: int) -> "TenantMatrix":
+        """Copie sans les chunks d'un document"""
+        keep = [i for i, row in enumerate(self.rows) if row["document_id"] != document_id]
+        return TenantMatrix(self.matrix[keep], [self.rows[i] for i in keep], version)
+
+
+class ExactSearchIndex:
+    """
+    Matrices d'embeddings par portée (clés de corpus_version : org:, user:, conv:)
+
+    - Chargement à la première recherche de la portée, si elle compte au plus
+      `max_rows_per_tenant` chunks (sinon : None, l'appelant utilise pgvector)
+    - Éviction LRU quand le total dépasse `max_total_rows`
+    - Matrice invalidée si la version du corpus de la portée a changé sans
+      passer par add_document/remove_document (autre worker)
+    - Optionnel : embeddings persistés en .npy et relus en memory-map
+    """
+
+    def __init__(
+        self,
+        max_rows_per_tenant: int = 50000,
+        max_total_rows: int = 200000,
+        mmap_dir: Optional[str] = None,
+        version_tracker=None
+    ):
+        """
+        Args:
+            max_rows_per_tenant: Au-delà, la portée est servie par pgvector
+            max_total_rows: Nombre total de chunks gardés en mémoire (toutes portées)
+            mmap_dir: Répertoire des fichiers .npy (None = mémoire uniquement)
+            version_tracker: CorpusVersionTracker (singleton par défaut)
+        """
+        self.max_rows_per_tenant = max_rows_per_tenant
+        self.max_total_rows = max_total_rows
+        self.mmap_dir = Path(mmap_dir) if mmap_dir else None
+        self.version_tracker = version_tracker or get_corpus_version_tracker()
+
+        self._tenants: "OrderedDict[str, TenantMatrix]" = OrderedDict()
+        self._oversized: Dict[str, int] = {}  # portée -> version au moment du comptage
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fallbacks = 0
+
+        if self.mmap_dir:
+            self.mmap_dir.mkdir(parents=True, exist_ok=True)
+
+    def search(
+        self,
+        tenant_key: str,
+        scope_filter: str,
+        params: Dict,
+        query_embedding: np.ndarray,
+        top_k: int,
+        similarity_threshold: float,
+        with_embeddings: bool = False,
+        neighbors: int = 0
+    ) -> Optional[List[Dict]]:
+        """
+        Recherche exacte dans une portée (appel bloquant : DB au premier chargement)
+
+        Args:
+            tenant_key: Clé de portée (ex: "org:<id>")
+            scope_filter: Filtre SQL de la portée sur document_chunks (alias dc)
+            params: Paramètres du filtre
+            query_embedding: Embedding de la requête
+            top_k: Nombre de résultats
+            similarity_threshold: Similarité minimale
+            with_embeddings: Joindre l'embedding (normalisé) de chaque résultat
+            neighbors: Joindre les chunks voisins (chunk_index ± neighbors)
+
+        Returns:
+            Résultats au format VectorStore, ou None si la portée dépasse la taille max
+        """
+        version = self.version_tracker.get_versions([tenant_key])[tenant_key]
+        tenant = self._get_tenant(tenant_key, scope_filter, params, version)
+        if tenant is None:
+            with self._lock:
+                self.fallbacks += 1
+            return None
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        with self._lock:
+            self.hits += 1
+        return tenant.search(query, top_k, similarity_threshold, with_embeddings, neighbors)
+
+    def _get_tenant(self, tenant_key: str, scope_filter: str, params: Dict, version: int) -> Optional[TenantMatrix]:
+        """Matrice de la portée (chargée si absente ou périmée)"""
+        with self._lock:
+            tenant = self._tenants.get(tenant_key)
+            if tenant is not None and tenant.version == version:
+                self._tenants.move_to_end(tenant_key)
+                return tenant
+            if self._oversized.get(tenant_key) == version:
+                return None
+            load_lock = self._load_locks.setdefault(tenant_key, threading.Lock())
+
+        # Un seul chargement par portée, les recherches concurrentes l'attendent
+        with load_lock:
+            with self._lock:
+                tenant = self._tenants.get(tenant_key)
+                if tenant is not None and tenant.version == version:
+                    return tenant
+                if self._oversized.get(tenant_key) == version:
+                    return None
+            return self._load(tenant_key, scope_filter, params, version)
+
+    def _load(self, tenant_key: str, scope_filter: str, params: Dict, version: int) -> Optional[TenantMatrix]:
+        """Charge les chunks et embeddings d'une portée depuis Postgres (ou le .npy)"""
+        from utils.database import SessionLocal
+
+        with SessionLocal() as db:
+            count = db.execute(
+                text(f"SELECT count(*) FROM document_chunks dc WHERE {scope_filter}"), params
+            ).scalar()
+
+            if count > self.max_rows_per_tenant:
+                logger.info(f"  📐 {tenant_key}: {count} chunks > {self.max_rows_per_tenant}, recherche pgvector")
+                with self._lock:
+                    self._tenants.pop(tenant_key, None)
+                    self._oversized[tenant_key] = version
+                return None
+
+            cached_matrix, cached_ids = self._read_mmap(tenant_key, version, count)
+            rows, embeddings = self._select_rows(db, scope_filter, params, with_embeddings=cached_matrix is None)
+
+            # Versions en compteurs locaux (sans Redis) : après un redémarrage, un
+            # ancien fichier peut porter le même numéro de version et le même
+            # nombre de lignes pour d'autres chunks
+            if cached_matrix is not None and set(cached_ids) != {row["chunk_id"] for row in rows}:
+                logger.warning(f"  ⚠️ {tenant_key}: fichier v{version} périmé (chunks différents), rechargement depuis Postgres")
+                cached_matrix = None
+                rows, embeddings = self._select_rows(db, scope_filter, params, with_embeddings=True)
+
+        if cached_matrix is not None:
+            # Réordonner les métadonnées dans l'ordre des lignes du fichier
+            by_id = {row["chunk_id"]: row for row in rows}
+            rows = [by_id[chunk_id] for chunk_id in cached_ids]
+            matrix = cached_matrix
+        else:
+            matrix = _normalize_rows(np.array(embeddings, dtype=np.float32).reshape(len(rows), -1))
+            self._write_mmap(tenant_key, version, matrix, [row["chunk_id"] for row in rows])
+
+        tenant = TenantMatrix(matrix, rows, version)
+        with self._lock:
+            self._oversized.pop(tenant_key, None)
+            self._tenants[tenant_key] = tenant
+            self._tenants.move_to_end(tenant_key)
+            self._evict()
+
+        logger.info(f"  📥 {tenant_key}: {len(tenant)} chunks chargés pour la recherche exacte")
+        return tenant
+
+    @staticmethod
+    def _select_rows(db, scope_filter: str, params: Dict, with_embeddings: bool):
+        """Métadonnées des chunks d'une portée, et leurs embeddings si demandés"""
+        result = db.execute(text(f"""
+            SELECT dc.id, dc.document_id, dc.chunk_index, dc.content,
+                   d.filename, d.file_type, d.scope
+                   {", CAST(dc.embedding AS real[])" if with_embeddings else ""}
+            FROM document_chunks dc
+            JOIN documents d ON dc.document_id = d.id
+            WHERE {scope_filter}
+        """), params)
+
+        rows, embeddings = [], []
+        for row in result:
+            rows.append({
+                "chunk_id": str(row[0]),
+                "document_id": str(row[1]),
+                "chunk_index": row[2],
+                "content": row[3],
+                "filename": row[4],
+                "file_type": row[5],
+                "scope": row[6]
+            })
+            if with_embeddings:
+                embeddings.append(row[7])
+        return rows, embeddings
+
+    def _evict(self) -> None:
+        """Éviction LRU au-delà de max_total_rows (appelé sous verrou)"""
+        total = sum(len(t) for t in self._tenants.values())
+        while total > self.max_total_rows and len(self._tenants) > 1:
+            key, evicted = self._tenants.popitem(last=False)
+            total -= len(evicted)
+            logger.info(f"  🗑️ {key}: matrice évincée ({len(evicted)} chunks)")
+
+    def _mmap_paths(self, tenant_key: str, version: int):
+        digest = hashlib.sha256(tenant_key.encode("utf-8")).hexdigest()[:24]
+        base = self.mmap_dir / f"{digest}-v{version}"
+        return base.with_suffix(".npy"), base.with_suffix(".ids.json"), digest
+
+    def _read_mmap(self, tenant_key: str, version: int, expected_rows: int):
+        """Embeddings persistés pour cette version (None si absents ou incohérents)"""
+        if not self.mmap_dir:
+            return None, None
+        matrix_path, ids_path, _ = self._mmap_paths(tenant_key, version)
+        if not (matrix_path.exists() and ids_path.exists()):
+            return None, None
+        try:
+            ids = json.loads(ids_path.read_text())
+            if len(ids) != expected_rows:
+                return None, None
+            return np.load(matrix_path, mmap_mode="r"), ids
+        except Exception as e:
+            logger.warning(f"⚠️ Lecture {matrix_path.name} impossible: {e}")
+            return None, None
+
+    def _write_mmap(self, tenant_key: str, version: int, matrix: np.ndarray, ids: List[str]) -> None:
+        """Persiste les embeddings d'une portée et supprime les versions précédentes"""
+        if not self.mmap_dir:
+            return
+        matrix_path, ids_path, digest = self._mmap_paths(tenant_key, version)
+        try:
+            for old in self.mmap_dir.glob(f"{digest}-v*"):
+                old.unlink()
+            np.save(matrix_path, matrix)
+            ids_path.write_text(json.dumps(ids))
+        except Exception as e:
+            logger.warning(f"⚠️ Écriture {matrix_path.name} impossible: {e}")
+
+    def add_document(self, new_versions: Dict[str, int], rows: List[Dict], embeddings: np.ndarray) -> None:
+        """
+        Ajoute les chunks d'un nouveau document aux portées chargées
+
+        Args:
+            new_versions: Versions renvoyées par CorpusVersionTracker.bump
+            rows: Métadonnées des chunks (chunk_id, document_id, chunk_index, content, filename, file_type, scope)
+            embeddings: Embeddings des chunks (même ordre)
+        """
+        self._apply(new_versions, lambda tenant, version: tenant.with_document(rows, embeddings, version))
+
+    def remove_document(self, new_versions: Dict[str, int], document_id: str) -> None:
+        """Retire un document supprimé des portées chargées"""
+        self._apply(new_versions, lambda tenant, version: tenant.without_document(document_id, version))
+
+    def _apply(self, new_versions: Dict[str, int], update) -> None:
+        """
+        Mise à jour incrémentale si la matrice était à jour juste avant cette
+        modification ; sinon elle est abandonnée (rechargée à la demande)
+        """
+        with self._lock:
+            for key, version in new_versions.items():
+                self._oversized.pop(key, None)
+                tenant = self._tenants.get(key)
+                if tenant is None:
+                    continue
+                if tenant.version == version - 1:
+                    self._tenants[key] = update(tenant, version)
+                else:
+                    del self._tenants[key]
+            self._evict()
+
+    def stats(self) -> Dict:
+        """État du tier de recherche exacte"""
+        with self._lock:
+            return {
+                "tenants_loaded": len(self._tenants),
+                "rows_loaded": sum(len(t) for t in self._tenants.values()),
+                "memory_mb": round(sum(t.matrix.nbytes for t in self._tenants.values()) / (1024 * 1024), 2),
+                "hits": self.hits,
+                "fallbacks": self.fallbacks
+            }
+
+
+# Instance globale (False = désactivé)
+_exact_index_instance = None
+
+def get_exact_index() -> Optional[ExactSearchIndex]:
+    """Retourne l'instance singleton du tier de recherche exacte (None si désactivé)"""
+    global _exact_index_instance
+    if _exact_index_instance is None:
+        from config import settings
+
+        if not settings.exact_search_enabled:
+            _exact_index_instance = False
+            return None
+
+        _exact_index_instance = ExactSearchIndex(
+            max_rows_per_tenant=settings.exact_search_max_rows,
+            max_total_rows=settings.exact_search_max_total_rows,
+            mmap_dir=settings.exact_search_mmap_dir or None
+        )
+        logger.info(
+            f"✅ Recherche exacte en mémoire activée (≤ {settings.exact_search_max_rows} chunks par portée)"
+        )
+
+    return _exact_index_instance or None
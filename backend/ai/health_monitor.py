@@ -0,0 +1,188 @@
+"""
+Surveillance en arrière-plan de la disponibilité du provider LLM
+Les requêtes lisent un état en cache au lieu de payer une sonde à chaque appel
+"""
+from datetime import datetime, timezone
+from typing import Dict, Optional
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LLMHealthMonitor:
+    """
+    Sonde périodiquement le provider LLM et expose l'état en cache
+
+    - Sonde toutes les `interval` secondes quand le service est disponible
+    - Re-sonde plus vite (`retry_interval`, avec backoff) après un échec
+    - Re-sonde immédiatement quand une génération échoue (report_failure)
+    """
+
+    def __init__(
+        self,
+        provider,
+        interval: float = 30.0,
+        retry_interval: float = 5.0,
+        timeout: float = 10.0
+    ):
+        """
+        Initialise le moniteur
+
+        Args:
+            provider: Provider LLM (doit exposer acheck_health())
+            interval: Délai entre deux sondes quand le service est disponible (secondes)
+            retry_interval: Délai initial entre deux sondes après un échec (secondes)
+            timeout: Durée max d'une sonde (secondes)
+        """
+        self.provider = provider
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+
+        # État en cache (None = pas encore sondé)
+        self.available: Optional[bool] = None
+        self.last_checked_at: Optional[datetime] = None
+        self.last_success_at: Optional[datetime] = None
+        self.last_failure_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.last_latency_ms: Optional[float] = None
+        self.consecutive_failures = 0
+
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+        # Les échecs de génération déclenchent une re-sonde immédiate
+        provider.failure_callback = self.report_failure
+
+    async def start(self) -> None:
+        """Démarre la boucle de surveillance (idempotent)"""
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="llm-health-monitor")
+        logger.info(f"🩺 Moniteur LLM démarré (intervalle {self.interval}s, retry {self.retry_interval}s)")
+
+    async def stop(self) -> None:
+        """Arrête la boucle de surveillance"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("🩺 Moniteur LLM arrêté")
+
+    async def _run(self) -> None:
+        """Boucle de surveillance"""
+        while True:
+            await self.probe()
+
+            if self.available:
+                delay = self.interval
+            else:
+                # Backoff exponentiel plafonné à l'intervalle normal
+                delay = min(self.retry_interval * (2 ** max(self.consecutive_failures - 1, 0)), self.interval)
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def probe(self) -> bool:
+        """Exécute une sonde et met à jour l'état en cache"""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        error = None
+
+        try:
+            healthy = await asyncio.wait_for(self.provider.acheck_health(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            healthy = False
+            error = f"Timeout après {self.timeout}s"
+        except Exception as e:
+            healthy = False
+            error = str(e)
+
+        now = datetime.now(timezone.utc)
+        self.last_checked_at = now
+        self.last_latency_ms = round((loop.time() - start) * 1000, 1)
+
+        if healthy:
+            if self.available is False:
+                logger.info("✅ Provider LLM de nouveau disponible")
+            self.available = True
+            self.last_success_at = now
+            self.consecutive_failures = 0
+        else:
+            self._mark_failure(error or "Sonde de santé négative", now)
+
+        return healthy
+
+    def _mark_failure(self, error: str, when: datetime) -> None:
+        """Enregistre un échec (sonde ou génération)"""
+        if self.available is not False:
+            logger.warning(f"⚠️ Provider LLM indisponible: {error}")
+        self.available = False
+        self.last_failure_at = when
+        self.last_error = error
+        self.consecutive_failures += 1
+
+    def report_failure(self, error: Exception) -> None:
+        """
+        Signale un échec de génération constaté sur le chemin de requête
+        Marque le provider comme dégradé et déclenche une re-sonde immédiate
+        """
+        self._mark_failure(str(error), datetime.now(timezone.utc))
+        if self._wake is not None:
+            self._wake.set()
+
+    def is_available(self) -> bool:
+        """
+        État en cache, sans appel réseau
+        Optimiste tant qu'aucune sonde n'a abouti (démarrage)
+        """
+        return self.available is not False
+
+    def snapshot(self) -> Dict:
+        """État courant sérialisable (pour /api/chat/health)"""
+        def _iso(value: Optional[datetime]) -> Optional[str]:
+            return value.isoformat() if value else None
+
+        return {
+            "available": self.available,
+            "running": self._task is not None,
+            "last_checked_at": _iso(self.last_checked_at),
+            "last_success_at": _iso(self.last_success_at),
+            "last_failure_at": _iso(self.last_failure_at),
+            "last_error": self.last_error,
+            "last_latency_ms": self.last_latency_ms,
+            "consecutive_failures": self.consecutive_failures
+        }
+
+
+# Instance globale
+_monitor_instance = None
+
+def get_llm_health_monitor() -> LLMHealthMonitor:
+    """Retourne l'instance singleton du moniteur de santé LLM"""
+    global _monitor_instance
+    if _monitor_instance is None:
+        from ai.llm_factory import get_llm_generator
+
+        try:
+            from config import settings
+            interval = settings.llm_health_interval
+            retry_interval = settings.llm_health_retry_interval
+        except ImportError:
+            interval, retry_interval = 30.0, 5.0
+
+        _monitor_instance = LLMHealthMonitor(
+            get_llm_generator(),
+            interval=interval,
+            retry_interval=retry_interval
+        )
+    return _monitor_instance
@@ -0,0 +1,283 @@
+"""
+File d'ingestion des documents en arrière-plan
+L'upload parsait, découpait, encodait et insérait le document dans la
+requête HTTP : un gros PDF gardait la connexion ouverte plusieurs minutes.
+L'upload enregistre désormais le fichier et rend un identifiant de job ;
+un nombre borné de workers exécute parsing → chunking → embeddings →
+stockage, et l'avancement de chaque étape est consultable.
+"""
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+import asyncio
+import json
+import threading
+import time
+import uuid
+import logging
+
+from utils.concurrency import get_document_executor, run_in_executor
+
+logger = logging.getLogger(__name__)
+
+# Étapes d'une ingestion, dans l'ordre d'exécution
+STAGES = ("parsing", "chunking", "embedding", "storing")
+
+
+class QueueFullError(Exception):
+    """Trop de jobs en attente (l'appelant répond 503)"""
+
+
+class JobStore:
+    """
+    État des jobs, dans Redis (consultable depuis tous les workers uvicorn)
+    ou en mémoire (fallback mono-processus, LRU)
+    """
+
+    KEY_PREFIX = "rag:ingestion_job:"
+
+    def __init__(self, redis_client=None, ttl_seconds: int = 86400, max_local_entries: int = 1000):
+        """
+        Args:
+            redis_client: Client Redis synchrone (None = stockage en mémoire)
+            ttl_seconds: Durée de conservation d'un job dans Redis (0 = illimitée)
+            max_local_entries: Nombre max de jobs gardés en mémoire
+        """
+        self.redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.max_local_entries = max_local_entries
+        self._local: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """État d'un job (None si inconnu ou expiré)"""
+        if self.redis is not None:
+            try:
+                raw = self.redis.get(self.KEY_PREFIX + job_id)
+                if raw:
+                    return json.loads(raw)
+            except Exception as e:
+                logger.warning(f"⚠️ Lecture job Redis impossible, fallback mémoire: {e}")
+
+        with self._lock:
+            job = self._local.get(job_id)
+            return json.loads(json.dumps(job)) if job is not None else None
+
+    def set(self, job: Dict) -> None:
+        """Enregistre l'état d'un job"""
+        if self.redis is not None:
+            try:
+                self.redis.set(
+                    self.KEY_PREFIX + job["job_id"],
+                    json.dumps(job, ensure_ascii=False),
+                    ex=self.ttl_seconds or None
+                )
+                return
+            except Exception as e:
+                logger.warning(f"⚠️ Écriture job Redis impossible, fallback mémoire: {e}")
+
+        with self._lock:
+            self._local[job["job_id"]] = json.loads(json.dumps(job))
+            self._local.move_to_end(job["job_id"])
+            while len(self._local) > self.max_local_entries:
+                self._local.popitem(last=False)
+
+
+class JobProgress:
+    """
+    Rapporteur d'avancement passé à la fonction d'ingestion (appelé depuis
+    le thread de l'executor documents)
+
+    Usage: progress("embedding", done=256, total=1200)
+    Les autres arguments nommés (taux de réutilisation des embeddings...)
+    sont ajoutés à l'état de l'étape.
+    """
+
+    def __init__(self, job: Dict, store: JobStore):
+        self.job = job
+        self.store = store
+
+    def __call__(self, stage: str, done: Optional[int] = None, total: Optional[int] = None, **details) -> None:
+        now = time.time()
+        stages = self.job["stages"]
+        # Les étapes précédentes sont terminées dès qu'une étape suivante démarre
+        for name in STAGES[:STAGES.index(stage)]:
+            if stages[name]["status"] != "completed":
+                stages[name]["status"] = "completed"
+                stages[name]["finished_at"] = stages[name]["finished_at"] or now
+        current = stages[stage]
+        if current["status"] == "pending":
+            current["status"] = "running"
+            current["started_at"] = now
+        if done is not None:
+            current["done"] = done
+        if total is not None:
+            current["total"] = total
+        current.update(details)
+        self.job["stage"] = stage
+        self.store.set(self.job)
+
+
+class IngestionQueue:
+    """
+    File bornée de jobs d'ingestion
+
+    - `workers` jobs au plus s'exécutent en même temps (dans l'executor
+      documents) : l'ingestion ne monopolise pas le CPU utilisé par le chat
+    - Au-delà de `max_pending` jobs en attente, submit lève QueueFullError
+    """
+
+    def __init__(self, store: JobStore, workers: int = 1, max_pending: int = 100):
+        """
+        Args:
+            store: Stockage de l'état des jobs
+            workers: Jobs exécutés simultanément
+            max_pending: Jobs max en attente d'un worker
+        """
+        self.store = store
+        self.workers = workers
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._done: Dict[str, asyncio.Future] = {}
+
+    def _ensure_workers(self) -> None:
+        """Démarre les workers dans la boucle courante (au premier job)"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._worker(), name=f"ingestion-worker-{i}")
+                for i in range(self.workers)
+            ]
+            logger.info(f"✅ File d'ingestion démarrée ({self.workers} workers)")
+
+    def is_full(self) -> bool:
+        """Vrai si un nouveau job serait refusé"""
+        return self._queue is not None and self._queue.full()
+
+    async def submit(self, filename: str, ingest: Callable[[JobProgress], Dict]) -> Dict:
+        """
+        Met un document en file d'ingestion
+
+        Args:
+            filename: Nom du fichier (affiché dans l'état du job)
+            ingest: Fonction bloquante exécutant l'ingestion ; reçoit le
+                rapporteur d'avancement et retourne le résultat du job
+                (document_id, page_count...)
+
+        Returns:
+            État initial du job (status 'queued')
+
+        Raises:
+            QueueFullError: Trop de jobs en attente
+        """
+        self._ensure_workers()
+        if self.is_full():
+            raise QueueFullError(f"{self.max_pending} documents déjà en attente d'indexation")
+
+        now = time.time()
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "filename": filename,
+            "status": "queued",
+            "stage": None,
+            "stages": {
+                name: {"status": "pending", "started_at": None, "finished_at": None, "done": None, "total": None}
+                for name in STAGES
+            },
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None
+        }
+        await asyncio.to_thread(self.store.set, job)
+        self._done[job["job_id"]] = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((job, ingest))
+        except asyncio.QueueFull:
+            # File remplie pendant l'enregistrement de l'état initial
+            self._done.pop(job["job_id"])
+            raise QueueFullError(f"{self.max_pending} documents déjà en attente d'indexation")
+        logger.info(f"📥 Job d'ingestion {job['job_id'][:8]}... en file: {filename} ({self._queue.qsize()} en attente)")
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        """État courant d'un job (None si inconnu)"""
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def wait(self, job_id: str) -> Dict:
+        """Attend la fin d'un job soumis par ce processus et retourne son état final"""
+        done = self._done.get(job_id)
+        if done is None:
+            return await self.get(job_id)
+        return await asyncio.shield(done)
+
+    async def _worker(self) -> None:
+        """Exécute les jobs de la file un par un"""
+        while True:
+            job, ingest = await self._queue.get()
+            try:
+                await self._run(job, ingest)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Dict, ingest: Callable[[JobProgress], Dict]) -> None:
+        """Exécute un job et enregistre son état final"""
+        job["status"] = "running"
+        job["started_at"] = time.time()
+        progress = JobProgress(job, self.store)
+
+        try:
+            job["result"] = await run_in_executor(get_document_executor(), ingest, progress)
+            job["status"] = "completed"
+            for stage in job["stages"].values():
+                stage["status"] = "completed"
+                stage["finished_at"] = stage["finished_at"] or time.time()
+            logger.info(f"✅ Job d'ingestion {job['job_id'][:8]}... terminé: {job['filename']}")
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(getattr(e, "detail", e))
+            if job["stage"]:
+                job["stages"][job["stage"]]["status"] = "failed"
+            logger.error(f"❌ Job d'ingestion {job['job_id'][:8]}... échoué ({job['stage']}): {e}")
+        finally:
+            job["finished_at"] = time.time()
+            await asyncio.to_thread(self.store.set, job)
+            done = self._done.pop(job["job_id"], None)
+            if done is not None and not done.done():
+                done.set_result(job)
+
+    def stats(self) -> Dict:
+        """État de la file"""
+        return {
+            "workers": self.workers,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "max_pending": self.max_pending
+        }
+
+    async def shutdown(self) -> None:
+        """Arrête les workers (les jobs en cours sont interrompus, arrêt de l'application)"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+# Instance globale
+_queue_instance = None
+
+def get_ingestion_queue() -> IngestionQueue:
+    """Retourne l'instance singleton de la file d'ingestion"""
+    global _queue_instance
+    if _queue_instance is None:
+        from config import settings
+        from utils.redis_client import get_redis_client
+
+        store = JobStore(get_redis_client(), ttl_seconds=settings.ingestion_job_ttl_seconds)
+        _queue_instance = IngestionQueue(
+            store,
+            workers=settings.ingestion_workers,
+            max_pending=settings.ingestion_max_pending
+        )
+    return _queue_instance
@@ -3,23 +3,121 @@ Service de génération de texte avec LLM local via Ollama
 Alternative simple à llama-cpp-python pour Windows
 """
 import httpx
+import json
+import threading
 import logging
-from typing import List, Dict, Optional
+from collections import OrderedDict
+from typing import Dict, List, Optional, Iterator, AsyncIterator
+from ai.llm_factory import BaseLLMProvider
 
 logger = logging.getLogger(__name__)
 
 
-class LLMGenerator:
+class PrefixCacheTracker:
+    """
+    Suivi par conversation de la dernière séquence de messages envoyée à Ollama
+    
+    Ollama garde en cache KV le prompt déjà traité : si le nouveau tour commence
+    par les mêmes messages (système + historique), seuls les nouveaux tokens
+    sont évalués. Le tracker estime ce préfixe commun et agrège les métriques
+    de prefill renvoyées par Ollama (premier tour vs tours suivants).
+    """
+    
+    def __init__(self, max_conversations: int = 500):
+        self.max_conversations = max_conversations
+        self._conversations: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        self._totals = {
+            "cold": {"requests": 0, "prompt_tokens": 0, "prefill_ms": 0.0},
+            "warm": {"requests": 0, "prompt_tokens": 0, "prefill_ms": 0.0}
+        }
+        self._lock = threading.Lock()
+    
+    def reused_prefix(self, conversation_id: Optional[str], messages: List[Dict]) -> int:
+        """Nombre de messages en tête identiques au tour précédent de la conversation"""
+        if not conversation_id:
+            return 0
+        with self._lock:
+            previous = self._conversations.get(conversation_id)
+        if not previous:
+            return 0
+        
+        common = 0
+        for old, new in zip(previous, messages):
+            if old != new:
+                break
+            common += 1
+        return common
+    
+    def record(
+        self,
+        conversation_id: Optional[str],
+        messages: List[Dict],
+        answer: str,
+        reused_messages: int,
+        response_data: Dict
+    ) -> Dict:
+        """
+        Mémorise la séquence du tour et enregistre ses métriques de prefill
+        
+        Returns:
+            Métriques du tour (tokens évalués, durée de prefill, messages réutilisés)
+        """
+        prompt_tokens = response_data.get("prompt_eval_count", 0) or 0
+        prefill_ms = (response_data.get("prompt_eval_duration", 0) or 0) / 1e6
+        kind = "warm" if reused_messages > 0 else "cold"
+        
+        with self._lock:
+            if conversation_id:
+                # Réponse telle que le client la renverra dans l'historique (strip)
+                self._conversations[conversation_id] = messages + [{"role": "assistant", "content": answer.strip()}]
+                self._conversations.move_to_end(conversation_id)
+                while len(self._conversations) > self.max_conversations:
+                    self._conversations.popitem(last=False)
+            
+            totals = self._totals[kind]
+            totals["requests"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["prefill_ms"] += prefill_ms
+        
+        return {
+            "prompt_tokens_evaluated": prompt_tokens,
+            "prefill_ms": round(prefill_ms, 1),
+            "load_ms": round((response_data.get("load_duration", 0) or 0) / 1e6, 1),
+            "reused_messages": reused_messages
+        }
+    
+    def stats(self) -> Dict:
+        """Moyennes de prefill : premier tour (cold) vs tours avec préfixe réutilisé (warm)"""
+        with self._lock:
+            result = {"conversations_tracked": len(self._conversations)}
+            for kind, totals in self._totals.items():
+                n = totals["requests"]
+                result[kind] = {
+                    "requests": n,
+                    "avg_prompt_tokens_evaluated": round(totals["prompt_tokens"] / n, 1) if n else 0.0,
+                    "avg_prefill_ms": round(totals["prefill_ms"] / n, 1) if n else 0.0
+                }
+            return result
+
+
+class LLMGenerator(BaseLLMProvider):
     """
     Génère des réponses avec un LLM local via Ollama API
     """
     
+    # Tokenizers Mistral/Llama 2 (vocabulaire 32k) : ~3.2 caractères/token en français
+    chars_per_token = 3.2
+    
     def __init__(
         self,
         base_url: str = "http://localhost:11434",
         model: str = None,
         temperature: float = 0.7,
-        max_tokens: int = 2048
+        max_tokens: int = 2048,
+        context_token_budget: int = 1024,
+        keep_alive: Optional[str] = "30m",
+        num_ctx: Optional[int] = 4096,
+        use_chat_api: bool = True
     ):
         """
         Initialise le générateur LLM
@@ -29,11 +127,21 @@ class LLMGenerator:
             model: Nom du modèle (auto-détecté si None)
             temperature: Contrôle la créativité (0.0-1.0)
             max_tokens: Nombre maximum de tokens générés
+            context_token_budget: Budget de tokens pour le contexte (le prefill CPU est coûteux)
+            keep_alive: Durée de maintien du modèle (et de son cache KV) en mémoire
+            num_ctx: Taille de la fenêtre de contexte (fixe pour éviter les rechargements)
+            use_chat_api: Utiliser /api/chat (préfixe stable réutilisable entre les tours)
         """
         self.base_url = base_url
+        self.context_token_budget = context_token_budget
+        self.keep_alive = keep_alive
+        self.num_ctx = num_ctx
+        self.use_chat_api = use_chat_api
+        self.prefix_tracker = PrefixCacheTracker()
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.client = httpx.Client(timeout=120.0)  # 2 min timeout pour génération
+        self.async_client = httpx.AsyncClient(timeout=120.0)  # Client non bloquant pour les routes FastAPI
         
         # Auto-détection du modèle si non spécifié
         if model is None:
@@ -84,6 +192,100 @@ class LLMGenerator:
             return False
     
     
+    async def acheck_health(self) -> bool:
+        """Vérifie si Ollama est disponible (asynchrone)"""
+        try:
+            response = await self.async_client.get(f"{self.base_url}/api/tags")
+            return response.status_code == 200
+        except Exception as e:
+            logger.error(f"Ollama non disponible: {e}")
+            return False
+    
+    
+    def _build_payload(
+        self,
+        prompt: str,
+        system_prompt: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        stream: bool
+    ) -> Dict:
+        """Construit le payload de /api/generate"""
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": self._build_options(temperature, max_tokens)
+        }
+        
+        if system_prompt:
+            payload["system"] = system_prompt
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        
+        return payload
+    
+    
+    def _build_options(self, temperature: Optional[float], max_tokens: Optional[int]) -> Dict:
+        """Options de génération Ollama (num_ctx constant : un changement recharge le modèle)"""
+        options = {
+            "temperature": temperature or self.temperature,
+            "num_predict": max_tokens or self.max_tokens
+        }
+        if self.num_ctx:
+            options["num_ctx"] = self.num_ctx
+        return options
+    
+    
+    def _build_chat_payload(self, prepared: Dict, stream: bool) -> Dict:
+        """Construit le payload de /api/chat à partir d'un prompt préparé"""
+        payload = {
+            "model": self.model,
+            "messages": prepared["messages"],
+            "stream": stream,
+            "options": self._build_options(prepared["temperature"], None)
+        }
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+    
+    
+    def _record_chat_metrics(
+        self,
+        prepared: Dict,
+        answer: str,
+        reused_messages: int,
+        response_data: Dict,
+        metrics: Optional[Dict]
+    ) -> None:
+        """Enregistre l'état de la conversation et les métriques de prefill du tour"""
+        turn_metrics = self.prefix_tracker.record(
+            prepared.get("conversation_id"),
+            prepared["messages"],
+            answer,
+            reused_messages,
+            response_data
+        )
+        logger.info(
+            f"  🧮 Prefill: {turn_metrics['prompt_tokens_evaluated']} tokens évalués en "
+            f"{turn_metrics['prefill_ms']:.0f} ms ({reused_messages} messages de préfixe réutilisés)"
+        )
+        if metrics is not None:
+            metrics.update(turn_metrics)
+    
+    
+    @staticmethod
+    def _parse_stream_line(line: str) -> Optional[Dict]:
+        """Décode une ligne NDJSON du streaming Ollama (None si ligne vide)"""
+        if not line:
+            return None
+        
+        data = json.loads(line)
+        if data.get("error"):
+            raise RuntimeError(data["error"])
+        return data
+    
+    
     def generate(
         self,
         prompt: str,
@@ -103,18 +305,7 @@ class LLMGenerator:
         Returns:
             Texte généré par le LLM
         """
-        payload = {
-            "model": self.model,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "temperature": temperature or self.temperature,
-                "num_predict": max_tokens or self.max_tokens
-            }
-        }
-        
-        if system_prompt:
-            payload["system"] = system_prompt
+        payload = self._build_payload(prompt, system_prompt, temperature, max_tokens, stream=False)
         
         try:
             logger.info(f"🤖 Génération avec {self.model}...")
@@ -137,196 +328,216 @@ class LLMGenerator:
             raise
     
     
-    def generate_rag_response(
+    async def agenerate(
         self,
-        query: str,
-        context_chunks: List[Dict],
-        max_context_length: int = 3000,
-        conversation_history: List[Dict] = None
-    ) -> Dict:
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> str:
         """
-        Génère une réponse RAG (Retrieval Augmented Generation)
+        Génère une réponse à partir d'un prompt sans bloquer la boucle asyncio
         
         Args:
-            query: Question utilisateur
-            context_chunks: Chunks récupérés de la recherche vectorielle
-            max_context_length: Longueur max du contexte (en caractères)
-            conversation_history: Historique des messages précédents
+            prompt: Question ou instruction utilisateur
+            system_prompt: Instructions système optionnelles
+            temperature: Override température par défaut
+            max_tokens: Override max_tokens par défaut
         
         Returns:
-            Dict avec 'answer', 'sources', 'confidence'
+            Texte généré par le LLM
         """
-        # 1. Construire le contexte à partir des chunks
-        context_parts = []
-        sources = []
-        total_length = 0
+        payload = self._build_payload(prompt, system_prompt, temperature, max_tokens, stream=False)
         
-        for chunk in context_chunks:
-            chunk_text = f"[Document: {chunk['filename']}, Score: {chunk['similarity']:.2f}]\n{chunk['content']}\n"
-            
-            if total_length + len(chunk_text) > max_context_length:
-                break
-            
-            context_parts.append(chunk_text)
-            sources.append({
-                "filename": chunk["filename"],
-                "chunk_index": chunk["chunk_index"],
-                "similarity": chunk["similarity"]
-            })
-            total_length += len(chunk_text)
-        
-        context = "\n---\n".join(context_parts)
-        
-        # 2. Construire l'historique de conversation si disponible
-        history_text = ""
-        if conversation_history:
-            history_lines = []
-            for msg in conversation_history:
-                # Supporter à la fois dict et objet Pydantic
-                role = msg.role if hasattr(msg, 'role') else msg.get("role")
-                content = msg.content if hasattr(msg, 'content') else msg.get('content', '')
-                role_label = "Utilisateur" if role == "user" else "Assistant"
-                history_lines.append(f"{role_label}: {content}")
-            history_text = "\n".join(history_lines)
-        
-        # 3. Construire le prompt RAG
-        system_prompt = """Tu es un assistant IA expert qui répond aux questions en te basant UNIQUEMENT sur le contexte fourni.
-
-Règles importantes:
-- Réponds UNIQUEMENT avec les informations présentes dans le contexte
-- Si l'information n'est pas dans le contexte, dis "Je n'ai pas cette information dans les documents fournis"
-- Cite toujours tes sources en mentionnant le document utilisé
-- Sois précis, concis et structuré dans tes réponses
-- Utilise un ton professionnel mais accessible
-- Utilise l'historique de la conversation pour comprendre le contexte des questions de suivi"""
-
-        if history_text:
-            user_prompt = f"""Historique de la conversation:
-{history_text}
-
-Contexte (documents de l'entreprise):
-{context}
-
-Question de l'utilisateur:
-{query}
-
-Réponds à la question en tenant compte de l'historique de conversation et du contexte fourni. Structure ta réponse clairement et cite tes sources."""
-        else:
-            user_prompt = f"""Contexte (documents de l'entreprise):
-{context}
-
-Question de l'utilisateur:
-{query}
-
-Réponds à la question en te basant sur le contexte ci-dessus. Structure ta réponse clairement et cite tes sources."""
-
-        # 4. Générer la réponse
         try:
-            answer = self.generate(
-                prompt=user_prompt,
-                system_prompt=system_prompt,
-                temperature=0.3  # Faible température pour réponses factuelles
+            logger.info(f"🤖 Génération avec {self.model}...")
+            
+            response = await self.async_client.post(
+                f"{self.base_url}/api/generate",
+                json=payload
             )
+            response.raise_for_status()
             
-            # 5. Estimer la confiance basée sur les scores de similarité
-            if context_chunks:
-                avg_similarity = sum(c["similarity"] for c in context_chunks[:3]) / min(3, len(context_chunks))
-                confidence = min(avg_similarity * 100, 95)  # Cap à 95%
-            else:
-                confidence = 0.0
+            result = response.json()
+            generated_text = result.get("response", "")
             
-            return {
-                "answer": answer.strip(),
-                "sources": sources,
-                "confidence": round(confidence, 1),
-                "context_used": len(context_parts)
-            }
+            logger.info(f"✅ Réponse générée: {len(generated_text)} caractères")
+            
+            return generated_text
         
         except Exception as e:
-            logger.error(f"❌ Erreur génération RAG: {e}")
-            return {
-                "answer": f"Erreur lors de la génération de la réponse: {str(e)}",
-                "sources": [],
-                "confidence": 0.0,
-                "context_used": 0
-            }
+            logger.error(f"❌ Erreur génération LLM: {e}")
+            raise
     
     
-    def generate_general_response(
+    def generate_stream(
         self,
-        query: str,
-        conversation_history: List[Dict] = None
-    ) -> Dict:
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> Iterator[str]:
         """
-        Génère une réponse avec la connaissance générale du modèle (sans RAG)
-        Utilisé quand aucun document pertinent n'est trouvé
+        Génère une réponse en streaming (tokens au fil de l'eau)
         
         Args:
-            query: Question utilisateur
-            conversation_history: Historique des messages précédents
+            prompt: Question ou instruction utilisateur
+            system_prompt: Instructions système optionnelles
+            temperature: Override température par défaut
+            max_tokens: Override max_tokens par défaut
         
-        Returns:
-            Dict avec 'answer', 'sources', 'confidence'
+        Yields:
+            Fragments de texte dans l'ordre de génération
         """
-        # Construire l'historique si disponible
-        history_text = ""
-        if conversation_history:
-            history_lines = []
-            for msg in conversation_history:
-                # Supporter à la fois dict et objet Pydantic
-                role = msg.role if hasattr(msg, 'role') else msg.get("role")
-                content = msg.content if hasattr(msg, 'content') else msg.get('content', '')
-                role_label = "Utilisateur" if role == "user" else "Assistant"
-                history_lines.append(f"{role_label}: {content}")
-            history_text = "\n".join(history_lines)
-        
-        system_prompt = """Tu es un assistant IA intelligent et serviable.
-
-Règles importantes:
-- Réponds avec ta connaissance générale
-- Si la question nécessite des informations en temps réel (météo, actualités récentes, bourse), 
-  explique clairement que tu n'as pas accès à ces données
-- Si tu n'es pas sûr d'une information, dis-le honnêtement
-- Sois précis, concis et structuré dans tes réponses
-- Utilise un ton professionnel mais accessible
-- Utilise l'historique de la conversation pour comprendre le contexte des questions de suivi"""
-
-        if history_text:
-            user_prompt = f"""Historique de la conversation:
-{history_text}
-
-Question:
-{query}
-
-Réponds à cette question en tenant compte de l'historique de conversation et avec ta connaissance générale."""
-        else:
-            user_prompt = f"""Question:
-{query}
-
-Réponds à cette question avec ta connaissance générale."""
+        payload = self._build_payload(prompt, system_prompt, temperature, max_tokens, stream=True)
+        
+        logger.info(f"🤖 Génération streaming avec {self.model}...")
+        
+        total_length = 0
+        with self.client.stream("POST", f"{self.base_url}/api/generate", json=payload) as response:
+            response.raise_for_status()
+            
+            # Ollama renvoie un objet JSON par ligne (NDJSON)
+            for line in response.iter_lines():
+                data = self._parse_stream_line(line)
+                if data is None:
+                    continue
+                
+                token = data.get("response", "")
+                if token:
+                    total_length += len(token)
+                    yield token
+                
+                if data.get("done"):
+                    break
+        
+        logger.info(f"✅ Streaming terminé: {total_length} caractères")
+    
+    
+    async def agenerate_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """Génère une réponse en streaming (client asynchrone)"""
+        payload = self._build_payload(prompt, system_prompt, temperature, max_tokens, stream=True)
+        
+        logger.info(f"🤖 Génération streaming avec {self.model}...")
+        
+        total_length = 0
+        async with self.async_client.stream("POST", f"{self.base_url}/api/generate", json=payload) as response:
+            response.raise_for_status()
+            
+            async for line in response.aiter_lines():
+                data = self._parse_stream_line(line)
+                if data is None:
+                    continue
+                
+                token = data.get("response", "")
+                if token:
+                    total_length += len(token)
+                    yield token
+                
+                if data.get("done"):
+                    break
+        
+        logger.info(f"✅ Streaming terminé: {total_length} caractères")
 
+    
+    
+    def generate_prepared(self, prepared: Dict, metrics: Optional[Dict] = None) -> str:
+        """
+        Génère la réponse d'un prompt préparé via /api/chat
+        
+        Le préfixe (système + historique) est identique au tour précédent de la
+        conversation : Ollama ne re-traite que les nouveaux tokens.
+        """
+        if not self.use_chat_api:
+            return super().generate_prepared(prepared, metrics)
+        
+        payload = self._build_chat_payload(prepared, stream=False)
+        reused = self.prefix_tracker.reused_prefix(prepared.get("conversation_id"), prepared["messages"])
+        
         try:
-            answer = self.generate(
-                prompt=user_prompt,
-                system_prompt=system_prompt,
-                temperature=0.7  # Température normale pour réponses générales
-            )
+            logger.info(f"🤖 Génération (chat) avec {self.model}...")
+            
+            response = self.client.post(f"{self.base_url}/api/chat", json=payload)
+            response.raise_for_status()
             
-            return {
-                "answer": answer.strip(),
-                "sources": [],  # Pas de sources pour la connaissance générale
-                "confidence": 80.0,  # Confiance modérée (pas de docs pour vérifier)
-                "context_used": 0
-            }
+            result = response.json()
+            generated_text = result.get("message", {}).get("content", "")
+            
+            logger.info(f"✅ Réponse générée: {len(generated_text)} caractères")
+            self._record_chat_metrics(prepared, generated_text, reused, result, metrics)
+            
+            return generated_text
         
         except Exception as e:
-            logger.error(f"❌ Erreur génération réponse générale: {e}")
-            return {
-                "answer": f"Erreur lors de la génération de la réponse: {str(e)}",
-                "sources": [],
-                "confidence": 0.0,
-                "context_used": 0
-            }
+            logger.error(f"❌ Erreur génération LLM: {e}")
+            raise
+    
+    
+    async def agenerate_prepared(self, prepared: Dict, metrics: Optional[Dict] = None) -> str:
+        """Génère la réponse d'un prompt préparé via /api/chat (asynchrone)"""
+        if not self.use_chat_api:
+            return await super().agenerate_prepared(prepared, metrics)
+        
+        payload = self._build_chat_payload(prepared, stream=False)
+        reused = self.prefix_tracker.reused_prefix(prepared.get("conversation_id"), prepared["messages"])
+        
+        try:
+            logger.info(f"🤖 Génération (chat) avec {self.model}...")
+            
+            response = await self.async_client.post(f"{self.base_url}/api/chat", json=payload)
+            response.raise_for_status()
+            
+            result = response.json()
+            generated_text = result.get("message", {}).get("content", "")
+            
+            logger.info(f"✅ Réponse générée: {len(generated_text)} caractères")
+            self._record_chat_metrics(prepared, generated_text, reused, result, metrics)
+            
+            return generated_text
+        
+        except Exception as e:
+            logger.error(f"❌ Erreur génération LLM: {e}")
+            raise
+    
+    
+    async def agenerate_stream_prepared(self, prepared: Dict, metrics: Optional[Dict] = None) -> AsyncIterator[str]:
+        """Génère la réponse d'un prompt préparé en streaming via /api/chat"""
+        if not self.use_chat_api:
+            async for token in super().agenerate_stream_prepared(prepared, metrics):
+                yield token
+            return
+        
+        payload = self._build_chat_payload(prepared, stream=True)
+        reused = self.prefix_tracker.reused_prefix(prepared.get("conversation_id"), prepared["messages"])
+        
+        logger.info(f"🤖 Génération streaming (chat) avec {self.model}...")
+        
+        parts = []
+        async with self.async_client.stream("POST", f"{self.base_url}/api/chat", json=payload) as response:
+            response.raise_for_status()
+            
+            async for line in response.aiter_lines():
+                data = self._parse_stream_line(line)
+                if data is None:
+                    continue
+                
+                token = data.get("message", {}).get("content", "")
+                if token:
+                    parts.append(token)
+                    yield token
+                
+                if data.get("done"):
+                    # Le dernier objet contient les statistiques (prompt_eval_count...)
+                    self._record_chat_metrics(prepared, "".join(parts), reused, data, metrics)
+                    break
+        
+        logger.info(f"✅ Streaming terminé: {sum(len(p) for p in parts)} caractères")
 
 
 # Instance globale
@@ -3,16 +3,99 @@ Factory pour créer le bon provider LLM selon la configuration
 Supporte Ollama (local) et Groq (cloud)
 """
 import os
-from typing import Dict, Optional
+from typing import Dict, Optional, Iterator, AsyncIterator
 from dotenv import load_dotenv
 import logging
+from ai.prompts import build_rag_prompt, build_general_prompt
+from ai.context_builder import estimate_tokens
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
 
 class BaseLLMProvider:
-    """Classe de base pour tous les providers LLM"""
+    """
+    Classe de base pour tous les providers LLM
+    
+    Les providers implémentent generate/agenerate (+ streaming et health check).
+    Les réponses RAG et générales sont construites ici à partir de ai.prompts.
+    """
+    
+    # Appelé lors d'un échec de génération (branché par LLMHealthMonitor)
+    failure_callback = None
+    
+    # Estimation des tokens (caractères par token du tokenizer du modèle)
+    chars_per_token = 4.0
+    
+    # Budget de tokens alloué au contexte documentaire
+    context_token_budget = 2048
+    
+    def count_tokens(self, text: str) -> int:
+        """Estime le nombre de tokens d'un texte pour ce provider"""
+        return estimate_tokens(text, self.chars_per_token)
+    
+    def prepare_rag_prompt(
+        self,
+        query: str,
+        context_chunks: list,
+        max_context_tokens: Optional[int] = None,
+        conversation_history: list = None,
+        conversation_id: Optional[str] = None
+    ) -> Dict:
+        """Construit le prompt RAG avec le budget de tokens de ce provider"""
+        prepared = build_rag_prompt(
+            query,
+            context_chunks,
+            max_context_tokens or self.context_token_budget,
+            conversation_history,
+            count_tokens=self.count_tokens
+        )
+        prepared["conversation_id"] = conversation_id
+        return prepared
+    
+    def prepare_general_prompt(
+        self,
+        query: str,
+        conversation_history: list = None,
+        conversation_id: Optional[str] = None
+    ) -> Dict:
+        """Construit le prompt en connaissance générale"""
+        prepared = build_general_prompt(query, conversation_history)
+        prepared["conversation_id"] = conversation_id
+        return prepared
+    
+    def generate_prepared(self, prepared: Dict, metrics: Optional[Dict] = None) -> str:
+        """
+        Génère la réponse d'un prompt préparé (prepare_rag_prompt/prepare_general_prompt)
+        
+        Par défaut : prompt aplati via generate(). Les providers qui gèrent
+        une API chat surchargent ces méthodes pour exploiter prepared['messages'].
+        
+        Args:
+            prepared: Prompt préparé
+            metrics: Dict complété avec les métriques du provider (optionnel)
+        """
+        return self.generate(
+            prompt=prepared["user_prompt"],
+            system_prompt=prepared["system_prompt"],
+            temperature=prepared["temperature"]
+        )
+    
+    async def agenerate_prepared(self, prepared: Dict, metrics: Optional[Dict] = None) -> str:
+        """Génère la réponse d'un prompt préparé (asynchrone)"""
+        return await self.agenerate(
+            prompt=prepared["user_prompt"],
+            system_prompt=prepared["system_prompt"],
+            temperature=prepared["temperature"]
+        )
+    
+    def agenerate_stream_prepared(self, prepared: Dict, metrics: Optional[Dict] = None) -> AsyncIterator[str]:
+        """Génère la réponse d'un prompt préparé en streaming (asynchrone)"""
+        return self.agenerate_stream(
+            prompt=prepared["user_prompt"],
+            system_prompt=prepared["system_prompt"],
+            temperature=prepared["temperature"]
+        )
     
     def generate(
         self,
@@ -24,23 +107,133 @@ class BaseLLMProvider:
         """Génère une réponse à partir d'un prompt"""
         raise NotImplementedError
     
+    async def agenerate(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """Génère une réponse à partir d'un prompt (asynchrone)"""
+        raise NotImplementedError
+    
+    def generate_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> Iterator[str]:
+        """Génère une réponse en streaming (fragments de texte)"""
+        raise NotImplementedError
+    
+    def agenerate_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """Génère une réponse en streaming (asynchrone)"""
+        raise NotImplementedError
+    
     def check_health(self) -> bool:
         """Vérifie si le service est disponible"""
         raise NotImplementedError
     
+    async def acheck_health(self) -> bool:
+        """Vérifie si le service est disponible (asynchrone)"""
+        raise NotImplementedError
+    
+    def generate_response(self, prepared: Dict) -> Dict:
+        """Génère et formate la réponse d'un prompt préparé (erreurs converties en réponse)"""
+        try:
+            answer = self.generate_prepared(prepared)
+            return self._format_response(prepared, answer)
+        except Exception as e:
+            logger.error(f"❌ Erreur génération ({self.__class__.__name__}): {e}")
+            self.notify_failure(e)
+            return self._error_response(e)
+    
+    async def agenerate_response(self, prepared: Dict) -> Dict:
+        """Génère et formate la réponse d'un prompt préparé (asynchrone)"""
+        try:
+            answer = await self.agenerate_prepared(prepared)
+            return self._format_response(prepared, answer)
+        except Exception as e:
+            logger.error(f"❌ Erreur génération ({self.__class__.__name__}): {e}")
+            self.notify_failure(e)
+            return self._error_response(e)
+    
     def generate_rag_response(
         self,
         query: str,
         context_chunks: list,
-        max_context_length: int = 3000,
-        conversation_history: list = None
+        max_context_tokens: Optional[int] = None,
+        conversation_history: list = None,
+        conversation_id: Optional[str] = None
     ) -> Dict:
         """Génère une réponse RAG"""
-        raise NotImplementedError
+        return self.generate_response(self.prepare_rag_prompt(
+            query, context_chunks, max_context_tokens, conversation_history, conversation_id
+        ))
+    
+    async def agenerate_rag_response(
+        self,
+        query: str,
+        context_chunks: list,
+        max_context_tokens: Optional[int] = None,
+        conversation_history: list = None,
+        conversation_id: Optional[str] = None
+    ) -> Dict:
+        """Génère une réponse RAG (asynchrone)"""
+        return await self.agenerate_response(self.prepare_rag_prompt(
+            query, context_chunks, max_context_tokens, conversation_history, conversation_id
+        ))
     
-    def generate_general_response(self, query: str, conversation_history: list = None) -> Dict:
+    def generate_general_response(
+        self,
+        query: str,
+        conversation_history: list = None,
+        conversation_id: Optional[str] = None
+    ) -> Dict:
         """Génère une réponse générale sans contexte"""
-        raise NotImplementedError
+        return self.generate_response(self.prepare_general_prompt(query, conversation_history, conversation_id))
+    
+    async def agenerate_general_response(
+        self,
+        query: str,
+        conversation_history: list = None,
+        conversation_id: Optional[str] = None
+    ) -> Dict:
+        """Génère une réponse générale sans contexte (asynchrone)"""
+        return await self.agenerate_response(self.prepare_general_prompt(query, conversation_history, conversation_id))
+    
+    def notify_failure(self, error: Exception) -> None:
+        """Signale un échec de génération au moniteur de santé éventuel"""
+        if self.failure_callback is not None:
+            self.failure_callback(error)
+    
+    @staticmethod
+    def _format_response(prepared: Dict, answer: str) -> Dict:
+        """Assemble la réponse finale à partir du prompt préparé"""
+        return {
+            "answer": answer.strip(),
+            "sources": prepared["sources"],
+            "confidence": prepared["confidence"],
+            "context_used": prepared["context_used"]
+        }
+    
+    @staticmethod
+    def _error_response(error: Exception) -> Dict:
+        """Réponse renvoyée quand la génération échoue"""
+        return {
+            "answer": f"Erreur lors de la génération de la réponse: {str(error)}",
+            "sources": [],
+            "confidence": 0.0,
+            "context_used": 0,
+            "failed": True  # Ne pas mettre en cache
+        }
 
 
 class GroqProvider(BaseLLMProvider):
@@ -51,7 +244,8 @@ class GroqProvider(BaseLLMProvider):
         api_key: str,
         model: str = "mixtral-8x7b-32768",
         temperature: float = 0.7,
-        max_tokens: int = 2048
+        max_tokens: int = 2048,
+        context_token_budget: int = 3000
     ):
         """
         Initialise le provider Groq
@@ -61,9 +255,10 @@ class GroqProvider(BaseLLMProvider):
             model: Modèle à utiliser (mixtral-8x7b-32768, llama-3.1-70b-versatile)
             temperature: Contrôle la créativité (0.0-1.0)
             max_tokens: Nombre maximum de tokens générés
+            context_token_budget: Budget de tokens pour le contexte documentaire
         """
         try:
-            from groq import Groq
+            from groq import Groq, AsyncGroq
         except ImportError:
             raise ImportError(
                 "Le package 'groq' n'est pas installé. "
@@ -71,26 +266,57 @@ class GroqProvider(BaseLLMProvider):
             )
         
         self.client = Groq(api_key=api_key)
+        self.async_client = AsyncGroq(api_key=api_key)
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.context_token_budget = context_token_budget
         
         logger.info(f"✅ GroqProvider initialisé: {model}")
     
     def check_health(self) -> bool:
-        """Vérifie si Groq API est disponible"""
+        """
+        Vérifie si Groq API est disponible
+        Interroge l'endpoint models (ne consomme pas de quota de tokens)
+        """
         try:
-            # Test simple avec un prompt court
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": "ping"}],
-                max_tokens=5
-            )
+            self.client.models.retrieve(self.model)
             return True
         except Exception as e:
             logger.error(f"❌ Groq non disponible: {e}")
             return False
     
+    async def acheck_health(self) -> bool:
+        """Vérifie si Groq API est disponible (asynchrone)"""
+        try:
+            await self.async_client.models.retrieve(self.model)
+            return True
+        except Exception as e:
+            logger.error(f"❌ Groq non disponible: {e}")
+            return False
+    
+    def _build_request(
+        self,
+        prompt: str,
+        system_prompt: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int]
+    ) -> Dict:
+        """Construit les paramètres de chat.completions.create"""
+        messages = []
+        
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        
+        messages.append({"role": "user", "content": prompt})
+        
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature or self.temperature,
+            "max_tokens": max_tokens or self.max_tokens
+        }
+    
     def generate(
         self,
         prompt: str,
@@ -110,19 +336,9 @@ class GroqProvider(BaseLLMProvider):
         Returns:
             Texte généré
         """
-        messages = []
-        
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        
-        messages.append({"role": "user", "content": prompt})
-        
         try:
             response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature or self.temperature,
-                max_tokens=max_tokens or self.max_tokens
+                **self._build_request(prompt, system_prompt, temperature, max_tokens)
             )
             
             generated_text = response.choices[0].message.content
@@ -134,172 +350,80 @@ class GroqProvider(BaseLLMProvider):
             logger.error(f"❌ Erreur génération Groq: {e}")
             raise
     
-    def generate_rag_response(
+    async def agenerate(
         self,
-        query: str,
-        context_chunks: list,
-        max_context_length: int = 3000,
-        conversation_history: list = None
-    ) -> Dict:
-        """
-        Génère une réponse RAG avec Groq
-        """
-        # 1. Construire le contexte
-        context_parts = []
-        sources = []
-        total_length = 0
-        
-        for chunk in context_chunks:
-            chunk_text = f"[Document: {chunk['filename']}, Score: {chunk['similarity']:.2f}]\n{chunk['content']}\n"
-            
-            if total_length + len(chunk_text) > max_context_length:
-                break
-            
-            context_parts.append(chunk_text)
-            sources.append({
-                "filename": chunk["filename"],
-                "chunk_index": chunk["chunk_index"],
-                "similarity": chunk["similarity"]
-            })
-            total_length += len(chunk_text)
-        
-        context = "\n---\n".join(context_parts)
-        
-        # 2. Construire l'historique si disponible
-        history_text = ""
-        if conversation_history:
-            history_lines = []
-            for msg in conversation_history:
-                # Supporter à la fois dict et objet Pydantic
-                role = msg.role if hasattr(msg, 'role') else msg.get("role")
-                content = msg.content if hasattr(msg, 'content') else msg.get('content', '')
-                role_label = "Utilisateur" if role == "user" else "Assistant"
-                history_lines.append(f"{role_label}: {content}")
-            history_text = "\n".join(history_lines)
-        
-        # 3. Prompt RAG
-        system_prompt = """Tu es un assistant IA expert qui répond aux questions en te basant UNIQUEMENT sur le contexte fourni.
-
-Règles importantes:
-- Réponds UNIQUEMENT avec les informations présentes dans le contexte
-- Si l'information n'est pas dans le contexte, dis "Je n'ai pas cette information dans les documents fournis"
-- Cite toujours tes sources en mentionnant le document utilisé
-- Sois précis, concis et structuré dans tes réponses
-- Utilise un ton professionnel mais accessible
-- Utilise l'historique de la conversation pour comprendre le contexte des questions de suivi"""
-
-        if history_text:
-            user_prompt = f"""Historique de la conversation:
-{history_text}
-
-Contexte (documents de l'entreprise):
-{context}
-
-Question de l'utilisateur:
-{query}
-
-Réponds à la question en tenant compte de l'historique de conversation et du contexte fourni. Structure ta réponse clairement et cite tes sources."""
-        else:
-            user_prompt = f"""Contexte (documents de l'entreprise):
-{context}
-
-Question de l'utilisateur:
-{query}
-
-Réponds à la question en te basant sur le contexte ci-dessus. Structure ta réponse clairement et cite tes sources."""
-
-        # 4. Générer la réponse
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """Génère une réponse avec Groq (client asynchrone)"""
         try:
-            answer = self.generate(
-                prompt=user_prompt,
-                system_prompt=system_prompt,
-                temperature=0.3
+            response = await self.async_client.chat.completions.create(
+                **self._build_request(prompt, system_prompt, temperature, max_tokens)
             )
             
-            # 4. Calculer confiance
-            if context_chunks:
-                avg_similarity = sum(c["similarity"] for c in context_chunks[:3]) / min(3, len(context_chunks))
-                confidence = min(avg_similarity * 100, 95)
-            else:
-                confidence = 0.0
+            generated_text = response.choices[0].message.content
+            logger.info(f"✅ Réponse Groq générée: {len(generated_text)} caractères")
             
-            return {
-                "answer": answer.strip(),
-                "sources": sources,
-                "confidence": round(confidence, 1),
-                "context_used": len(context_parts)
-            }
+            return generated_text
         
         except Exception as e:
-            logger.error(f"❌ Erreur génération RAG Groq: {e}")
-            return {
-                "answer": f"Erreur lors de la génération de la réponse: {str(e)}",
-                "sources": [],
-                "confidence": 0.0,
-                "context_used": 0
-            }
-    
-    def generate_general_response(self, query: str, conversation_history: list = None) -> Dict:
-        """Génère une réponse générale avec Groq"""
-        # Construire l'historique si disponible
-        history_text = ""
-        if conversation_history:
-            history_lines = []
-            for msg in conversation_history:
-                # Supporter à la fois dict et objet Pydantic
-                role = msg.role if hasattr(msg, 'role') else msg.get("role")
-                content = msg.content if hasattr(msg, 'content') else msg.get('content', '')
-                role_label = "Utilisateur" if role == "user" else "Assistant"
-                history_lines.append(f"{role_label}: {content}")
-            history_text = "\n".join(history_lines)
+            logger.error(f"❌ Erreur génération Groq: {e}")
+            raise
+    
+    def generate_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> Iterator[str]:
+        """
+        Génère une réponse en streaming avec Groq
         
-        system_prompt = """Tu es un assistant IA intelligent et serviable.
-
-Règles importantes:
-- Réponds avec ta connaissance générale
-- Si la question nécessite des informations en temps réel (météo, actualités récentes, bourse), 
-  explique clairement que tu n'as pas accès à ces données
-- Si tu n'es pas sûr d'une information, dis-le honnêtement
-- Sois précis, concis et structuré dans tes réponses
-- Utilise un ton professionnel mais accessible
-- Utilise l'historique de la conversation pour comprendre le contexte des questions de suivi"""
-
-        if history_text:
-            user_prompt = f"""Historique de la conversation:
-{history_text}
-
-Question:
-{query}
-
-Réponds à cette question en tenant compte de l'historique de conversation et avec ta connaissance générale."""
-        else:
-            user_prompt = f"""Question:
-{query}
-
-Réponds à cette question avec ta connaissance générale."""
-
-        try:
-            answer = self.generate(
-                prompt=user_prompt,
-                system_prompt=system_prompt,
-                temperature=0.7
-            )
-            
-            return {
-                "answer": answer.strip(),
-                "sources": [],
-                "confidence": 80.0,
-                "context_used": 0
-            }
+        Yields:
+            Fragments de texte dans l'ordre de génération
+        """
+        stream = self.client.chat.completions.create(
+            **self._build_request(prompt, system_prompt, temperature, max_tokens),
+            stream=True
+        )
         
-        except Exception as e:
-            logger.error(f"❌ Erreur génération réponse générale Groq: {e}")
-            return {
-                "answer": f"Erreur lors de la génération de la réponse: {str(e)}",
-                "sources": [],
-                "confidence": 0.0,
-                "context_used": 0
-            }
+        total_length = 0
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                total_length += len(token)
+                yield token
+        
+        logger.info(f"✅ Streaming Groq terminé: {total_length} caractères")
+    
+    async def agenerate_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """Génère une réponse en streaming avec Groq (client asynchrone)"""
+        stream = await self.async_client.chat.completions.create(
+            **self._build_request(prompt, system_prompt, temperature, max_tokens),
+            stream=True
+        )
+        
+        total_length = 0
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                total_length += len(token)
+                yield token
+        
+        logger.info(f"✅ Streaming Groq terminé: {total_length} caractères")
 
 
 def get_llm_provider() -> BaseLLMProvider:
@@ -322,9 +446,11 @@ def get_llm_provider() -> BaseLLMProvider:
             from config import settings
             api_key = settings.groq_api_key
             model = settings.groq_model
+            context_tokens = settings.groq_context_tokens
         except ImportError:
             api_key = os.getenv("GROQ_API_KEY")
             model = os.getenv("GROQ_MODEL", "mixtral-8x7b-32768")
+            context_tokens = 3000
         
         if not api_key:
             raise ValueError(
@@ -333,7 +459,7 @@ def get_llm_provider() -> BaseLLMProvider:
             )
         
         logger.info(f"🚀 Utilisation de Groq ({model})")
-        return GroqProvider(api_key=api_key, model=model)
+        return GroqProvider(api_key=api_key, model=model, context_token_budget=context_tokens)
     
     else:  # ollama par défaut
         from ai.llm import LLMGenerator
@@ -342,12 +468,27 @@ def get_llm_provider() -> BaseLLMProvider:
             from config import settings
             base_url = settings.ollama_base_url
             model = settings.ollama_model
+            context_tokens = settings.ollama_context_tokens
+            keep_alive = settings.ollama_keep_alive
+            num_ctx = settings.ollama_num_ctx
+            use_chat_api = settings.ollama_chat_api
         except ImportError:
             base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
             model = os.getenv("OLLAMA_MODEL")
+            context_tokens = 1024
+            keep_alive = "30m"
+            num_ctx = 4096
+            use_chat_api = True
         
         logger.info(f"🏠 Utilisation d'Ollama local ({base_url})")
-        return LLMGenerator(base_url=base_url, model=model)
+        return LLMGenerator(
+            base_url=base_url,
+            model=model,
+            context_token_budget=context_tokens,
+            keep_alive=keep_alive,
+            num_ctx=num_ctx,
+            use_chat_api=use_chat_api
+        )
 
 
 # Instance globale
@@ -0,0 +1,65 @@
+"""
+Diversification des résultats par Maximal Marginal Relevance (MMR)
+Le chevauchement des chunks (overlap du TextChunker) et les passages répétés
+d'un document à l'autre remplissent le top-k de quasi-doublons. MMR choisit
+chaque résultat en arbitrant entre pertinence pour la requête et
+ressemblance avec les résultats déjà retenus.
+"""
+from typing import List
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Normalise les vecteurs (similarité cosine = produit scalaire)"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def maximal_marginal_relevance(
+    query_embedding: np.ndarray,
+    embeddings: np.ndarray,
+    top_k: int,
+    lambda_mult: float = 0.5
+) -> List[int]:
+    """
+    Sélection MMR gloutonne, entièrement vectorisée
+
+    score(i) = λ · sim(requête, i) − (1 − λ) · max sim(i, déjà retenus)
+
+    La matrice des similarités entre candidats est calculée une fois ; à
+    chaque sélection, seule la similarité max aux retenus est mise à jour
+    (une opération vectorielle sur n candidats).
+
+    Args:
+        query_embedding: Embedding de la requête (dim,)
+        embeddings: Embeddings des candidats (n, dim)
+        top_k: Nombre de résultats à retenir
+        lambda_mult: 1 = pertinence seule, 0 = diversité seule
+
+    Returns:
+        Indices des candidats retenus, dans l'ordre de sélection
+    """
+    n = len(embeddings)
+    if n == 0 or top_k <= 0:
+        return []
+
+    candidates = _normalize(np.asarray(embeddings, dtype=np.float32))
+    query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+    relevance = candidates @ query
+    pairwise = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = pairwise[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < min(top_k, n):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, pairwise[best], out=max_similarity)
+
+    return selected
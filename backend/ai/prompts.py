@@ -0,0 +1,244 @@
+"""
+Construction des prompts RAG et généraux
+Partagé par tous les providers LLM (Ollama, Groq) et par le mode streaming
+"""
+from typing import Callable, List, Dict
+from ai.context_builder import build_context, estimate_tokens
+
+
+RAG_SYSTEM_PROMPT = """Tu es un assistant IA expert qui répond aux questions en te basant UNIQUEMENT sur le contexte fourni.
+
+Règles importantes:
+- Réponds UNIQUEMENT avec les informations présentes dans le contexte
+- Si l'information n'est pas dans le contexte, dis "Je n'ai pas cette information dans les documents fournis"
+- Cite toujours tes sources en mentionnant le document utilisé
+- Sois précis, concis et structuré dans tes réponses
+- Utilise un ton professionnel mais accessible
+- Utilise l'historique de la conversation pour comprendre le contexte des questions de suivi"""
+
+GENERAL_SYSTEM_PROMPT = """Tu es un assistant IA intelligent et serviable.
+
+Règles importantes:
+- Réponds avec ta connaissance générale
+- Si la question nécessite des informations en temps réel (météo, actualités récentes, bourse),
+  explique clairement que tu n'as pas accès à ces données
+- Si tu n'es pas sûr d'une information, dis-le honnêtement
+- Sois précis, concis et structuré dans tes réponses
+- Utilise un ton professionnel mais accessible
+- Utilise l'historique de la conversation pour comprendre le contexte des questions de suivi"""
+
+SUMMARY_SYSTEM_PROMPT = """Tu résumes des conversations entre un utilisateur et un assistant.
+
+Règles importantes:
+- Conserve les faits, chiffres, noms de documents et décisions utiles pour la suite
+- Conserve les questions de l'utilisateur restées sans réponse
+- Intègre les nouveaux échanges au résumé existant sans le réécrire inutilement
+- Sois concis : quelques phrases, sans introduction ni conclusion"""
+
+# Températures par mode (faible pour réponses factuelles)
+RAG_TEMPERATURE = 0.3
+GENERAL_TEMPERATURE = 0.7
+SUMMARY_TEMPERATURE = 0.2
+
+# Rôle des messages de résumé insérés par ConversationMemory
+SUMMARY_ROLE = "summary"
+
+
+def format_history(conversation_history: List = None) -> str:
+    """
+    Formate l'historique de conversation en texte
+
+    Args:
+        conversation_history: Messages précédents (dict ou objets Pydantic)
+
+    Returns:
+        Historique au format "Utilisateur: ... / Assistant: ..." (vide si aucun)
+    """
+    if not conversation_history:
+        return ""
+
+    history_lines = []
+    for msg in conversation_history:
+        # Supporter à la fois dict et objet Pydantic
+        role = msg.role if hasattr(msg, 'role') else msg.get("role")
+        content = msg.content if hasattr(msg, 'content') else msg.get('content', '')
+        if role == SUMMARY_ROLE:
+            history_lines.append(f"Résumé des échanges précédents: {content}")
+            continue
+        role_label = "Utilisateur" if role == "user" else "Assistant"
+        history_lines.append(f"{role_label}: {content}")
+    return "\n".join(history_lines)
+
+
+def build_chat_messages(system_prompt: str, conversation_history: List, turn_prompt: str) -> List[Dict]:
+    """
+    Construit les messages de l'API chat (préfixe stable d'abord)
+
+    Le prompt système et l'historique précèdent la partie variable (contexte
+    et question du tour courant) : d'un tour à l'autre, le début de la
+    séquence est identique et le cache KV du serveur LLM peut être réutilisé.
+
+    Args:
+        system_prompt: Instructions système
+        conversation_history: Messages précédents (dict ou objets Pydantic)
+        turn_prompt: Contenu du message utilisateur du tour courant
+
+    Returns:
+        Liste de messages {'role', 'content'}
+    """
+    messages = [{"role": "system", "content": system_prompt}]
+    for msg in conversation_history or []:
+        role = msg.role if hasattr(msg, 'role') else msg.get("role")
+        content = msg.content if hasattr(msg, 'content') else msg.get('content', '')
+        if role == SUMMARY_ROLE:
+            messages.append({"role": "system", "content": f"Résumé des échanges précédents: {content}"})
+        else:
+            messages.append({"role": "user" if role == "user" else "assistant", "content": content})
+    messages.append({"role": "user", "content": turn_prompt})
+    return messages
+
+
+def compute_confidence(context_chunks: List[Dict]) -> float:
+    """Estime la confiance à partir des scores de similarité des 3 meilleurs chunks"""
+    if not context_chunks:
+        return 0.0
+    avg_similarity = sum(c["similarity"] for c in context_chunks[:3]) / min(3, len(context_chunks))
+    return round(min(avg_similarity * 100, 95), 1)  # Cap à 95%
+
+
+def build_rag_prompt(
+    query: str,
+    context_chunks: List[Dict],
+    max_context_tokens: int = 1000,
+    conversation_history: List = None,
+    count_tokens: Callable[[str], int] = estimate_tokens
+) -> Dict:
+    """
+    Construit le prompt RAG à partir des chunks récupérés
+
+    Args:
+        query: Question utilisateur
+        context_chunks: Chunks récupérés de la recherche vectorielle
+        max_context_tokens: Budget de tokens pour le contexte documentaire
+        conversation_history: Historique des messages précédents
+        count_tokens: Compteur de tokens du provider
+
+    Returns:
+        Dict avec 'system_prompt', 'user_prompt', 'messages', 'temperature',
+        'sources', 'context_used', 'confidence'
+    """
+    # 1. Contexte : chunks adjacents fusionnés, doublons retirés, sous budget
+    packed = build_context(context_chunks, max_context_tokens, count_tokens)
+    context = packed["context"]
+
+    # 2. Historique de conversation si disponible
+    history_text = format_history(conversation_history)
+
+    # 3. Prompt du tour courant (API chat : l'historique est passé en messages)
+    turn_prompt = f"""Contexte (documents de l'entreprise):
+{context}
+
+Question de l'utilisateur:
+{query}
+
+Réponds à la question en te basant sur le contexte ci-dessus. Structure ta réponse clairement et cite tes sources."""
+
+    # 4. Prompt utilisateur complet (API de complétion)
+    if history_text:
+        user_prompt = f"""Historique de la conversation:
+{history_text}
+
+Contexte (documents de l'entreprise):
+{context}
+
+Question de l'utilisateur:
+{query}
+
+Réponds à la question en tenant compte de l'historique de conversation et du contexte fourni. Structure ta réponse clairement et cite tes sources."""
+    else:
+        user_prompt = turn_prompt
+
+    return {
+        "system_prompt": RAG_SYSTEM_PROMPT,
+        "user_prompt": user_prompt,
+        "messages": build_chat_messages(RAG_SYSTEM_PROMPT, conversation_history, turn_prompt),
+        "temperature": RAG_TEMPERATURE,
+        "sources": packed["sources"],
+        "context_used": packed["context_used"],
+        "confidence": compute_confidence(context_chunks)
+    }
+
+
+def build_general_prompt(query: str, conversation_history: List = None) -> Dict:
+    """
+    Construit le prompt pour une réponse en connaissance générale (sans RAG)
+
+    Args:
+        query: Question utilisateur
+        conversation_history: Historique des messages précédents
+
+    Returns:
+        Dict avec 'system_prompt', 'user_prompt', 'messages', 'temperature',
+        'sources', 'context_used', 'confidence'
+    """
+    history_text = format_history(conversation_history)
+
+    turn_prompt = f"""Question:
+{query}
+
+Réponds à cette question avec ta connaissance générale."""
+
+    if history_text:
+        user_prompt = f"""Historique de la conversation:
+{history_text}
+
+Question:
+{query}
+
+Réponds à cette question en tenant compte de l'historique de conversation et avec ta connaissance générale."""
+    else:
+        user_prompt = turn_prompt
+
+    return {
+        "system_prompt": GENERAL_SYSTEM_PROMPT,
+        "user_prompt": user_prompt,
+        "messages": build_chat_messages(GENERAL_SYSTEM_PROMPT, conversation_history, turn_prompt),
+        "temperature": GENERAL_TEMPERATURE,
+        "sources": [],  # Pas de sources pour la connaissance générale
+        "context_used": 0,
+        "confidence": 80.0  # Confiance modérée (pas de docs pour vérifier)
+    }
+
+
+def build_summary_prompt(previous_summary: str, new_messages: List) -> Dict:
+    """
+    Construit le prompt de mise à jour incrémentale du résumé de conversation
+
+    Args:
+        previous_summary: Résumé courant (vide pour le premier résumé)
+        new_messages: Échanges sortis de la fenêtre récente depuis ce résumé
+
+    Returns:
+        Dict avec 'system_prompt', 'user_prompt', 'temperature'
+    """
+    new_text = format_history(new_messages)
+
+    if previous_summary:
+        user_prompt = f"""Résumé actuel de la conversation:
+{previous_summary}
+
+Nouveaux échanges:
+{new_text}
+
+Mets à jour le résumé pour intégrer les nouveaux échanges."""
+    else:
+        user_prompt = f"""Échanges:
+{new_text}
+
+Résume ces échanges."""
+
+    return {
+        "system_prompt": SUMMARY_SYSTEM_PROMPT,
+        "user_prompt": user_prompt,
+        "temperature": SUMMARY_TEMPERATURE
+    }
@@ -0,0 +1,197 @@
+"""
+Re-classement des chunks par cross-encoder (CPU)
+Le score cosine du bi-encoder est un signal de précision faible : le chat
+envoyait jusqu'à 20 chunks au-dessus du seuil dans le prompt. Un cross-encoder
+note chaque paire (question, chunk) et seuls les meilleurs sont gardés ; 3
+chunks bien classés au lieu de 10 moyens réduisent le prefill du LLM bien
+plus que le coût du re-classement.
+"""
+from sentence_transformers import CrossEncoder
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import threading
+import time
+import logging
+
+from ai.embeddings import normalize_query_text
+
+logger = logging.getLogger(__name__)
+
+
+class RerankScoreCache:
+    """
+    Cache LRU thread-safe des scores (question normalisée, chunk_id)
+
+    Les chunk_id sont des UUID attribués à l'insertion : un chunk réindexé
+    obtient un nouvel identifiant, un score en cache ne devient jamais faux.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query: str, chunk_id: str) -> Optional[float]:
+        """Score en cache (None si absent)"""
+        key = (query, chunk_id)
+        with self._lock:
+            score = self._scores.get(key)
+            if score is None:
+                self.misses += 1
+                return None
+            self._scores.move_to_end(key)
+            self.hits += 1
+            return score
+
+    def put(self, query: str, chunk_id: str, score: float) -> None:
+        """Enregistre un score (éviction LRU)"""
+        with self._lock:
+            self._scores[(query, chunk_id)] = score
+            self._scores.move_to_end((query, chunk_id))
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+
+    def stats(self) -> Dict:
+        """Compteurs du cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._scores),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+class CrossEncoderReranker:
+    """
+    Re-classe les chunks récupérés et garde les `top_n` meilleurs
+
+    - Paires notées par lots de `batch_size`, dans l'ordre de la recherche
+      (les chunks les plus prometteurs d'abord)
+    - Budget de latence : au-delà de `latency_budget_ms`, les lots restants ne
+      sont pas notés et leurs chunks passent après les chunks notés, dans
+      l'ordre de la recherche
+    """
+
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1",
+        top_n: int = 3,
+        batch_size: int = 16,
+        latency_budget_ms: float = 300.0,
+        max_length: int = 512,
+        score_cache: Optional[RerankScoreCache] = None
+    ):
+        """
+        Args:
+            model_name: Modèle cross-encoder sentence-transformers (multilingue par défaut)
+            top_n: Nombre de chunks gardés
+            batch_size: Paires notées par appel au modèle
+            latency_budget_ms: Temps max consacré au re-classement d'une requête
+            max_length: Longueur max d'une paire (tokens, tronquée au-delà)
+            score_cache: Cache des scores (None = désactivé)
+        """
+        self.model_name = model_name
+        self.top_n = top_n
+        self.batch_size = batch_size
+        self.latency_budget_ms = latency_budget_ms
+        self.score_cache = score_cache
+        self.budget_exceeded = 0
+
+        logger.info(f"Chargement du cross-encoder: {model_name}")
+        self.model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+        logger.info(f"✅ Cross-encoder chargé: {model_name}")
+
+    def rerank(self, query: str, chunks: List[Dict], top_n: Optional[int] = None) -> List[Dict]:
+        """
+        Note les chunks pour la question et garde les meilleurs
+
+        Args:
+            query: Question de l'utilisateur
+            chunks: Chunks triés par la recherche (chunk_id, content, ...)
+            top_n: Nombre de chunks gardés (défaut : self.top_n)
+
+        Returns:
+            Chunks gardés, triés par rerank_score décroissant (None si non noté)
+        """
+        top_n = top_n or self.top_n
+        if len(chunks) <= 1:
+            return chunks[:top_n]
+
+        start = time.perf_counter()
+        normalized = normalize_query_text(query)
+        scores: Dict[int, float] = {}
+
+        to_score = []
+        for i, chunk in enumerate(chunks):
+            cached = self.score_cache.get(normalized, chunk["chunk_id"]) if self.score_cache else None
+            if cached is not None:
+                scores[i] = cached
+            else:
+                to_score.append(i)
+
+        for offset in range(0, len(to_score), self.batch_size):
+            if offset and (time.perf_counter() - start) * 1000 > self.latency_budget_ms:
+                self.budget_exceeded += 1
+                logger.info(
+                    f"  ⏱️ Budget de re-classement dépassé: {len(to_score) - offset} chunks non notés"
+                )
+                break
+
+            batch = to_score[offset:offset + self.batch_size]
+            batch_scores = self.model.predict(
+                [(normalized, chunks[i]["content"]) for i in batch],
+                batch_size=len(batch),
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+            for i, score in zip(batch, batch_scores):
+                scores[i] = float(score)
+                if self.score_cache is not None:
+                    self.score_cache.put(normalized, chunks[i]["chunk_id"], scores[i])
+
+        scored = sorted(scores, key=lambda i: scores[i], reverse=True)
+        unscored = [i for i in range(len(chunks)) if i not in scores]
+        kept = [{**chunks[i], "rerank_score": scores.get(i)} for i in (scored + unscored)[:top_n]]
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"  🏅 Re-classement: {len(chunks)} → {len(kept)} chunks en {elapsed_ms:.0f} ms")
+        return kept
+
+    def stats(self) -> Dict:
+        """État du re-classement"""
+        return {
+            "model": self.model_name,
+            "top_n": self.top_n,
+            "latency_budget_ms": self.latency_budget_ms,
+            "budget_exceeded": self.budget_exceeded,
+            "score_cache": self.score_cache.stats() if self.score_cache else None
+        }
+
+
+# Instance globale (False = désactivé)
+_reranker_instance = None
+
+def get_reranker() -> Optional[CrossEncoderReranker]:
+    """Retourne l'instance singleton du re-classement (None si désactivé)"""
+    global _reranker_instance
+    if _reranker_instance is None:
+        from config import settings
+
+        if not settings.rerank_enabled:
+            _reranker_instance = False
+            return None
+
+        score_cache = RerankScoreCache(settings.rerank_cache_size) if settings.rerank_cache_size > 0 else None
+        _reranker_instance = CrossEncoderReranker(
+            model_name=settings.rerank_model,
+            top_n=settings.rerank_top_n,
+            batch_size=settings.rerank_batch_size,
+            latency_budget_ms=settings.rerank_latency_budget_ms,
+            score_cache=score_cache
+        )
+
+    return _reranker_instance or None
@@ -0,0 +1,131 @@
+"""
+Cache des résultats de recherche, invalidé par version du corpus
+Une même recherche (même requête normalisée, mêmes filtres, mêmes paramètres)
+réexécutait l'encodage et la requête pgvector à chaque appel. Chaque entrée
+est estampillée avec les versions de corpus des portées interrogées :
+store_document et la suppression d'un document incrémentent ces versions,
+l'entrée n'est alors plus servie (invalidation exacte, sans TTL).
+"""
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import json
+import threading
+import logging
+
+from ai.corpus_version import search_scope_keys, get_corpus_version_tracker
+from ai.embeddings import normalize_query_text
+
+logger = logging.getLogger(__name__)
+
+
+class SearchResultCache:
+    """
+    Cache LRU thread-safe des résultats de VectorStore
+
+    Clé = type de recherche + requête normalisée + filtres + paramètres.
+    Valeur = (versions du corpus lues avant la recherche, résultats). Une
+    entrée dont les versions diffèrent des versions courantes est supprimée
+    à la lecture : un document ajouté pendant la recherche rend donc
+    l'entrée obsolète dès la lecture suivante.
+    """
+
+    def __init__(self, version_tracker, max_entries: int = 2000):
+        """
+        Args:
+            version_tracker: CorpusVersionTracker (invalidation par portée)
+            max_entries: Nombre max de recherches en cache (éviction LRU)
+        """
+        self.version_tracker = version_tracker
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Dict[str, int], List[Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def build_key(
+        self,
+        kind: str,
+        query_text: str,
+        organization_id: Optional[str],
+        user_id: Optional[str],
+        conversation_id: Optional[str],
+        params: Dict
+    ) -> Tuple[str, Dict[str, int]]:
+        """
+        Construit la clé d'une recherche et lit les versions courantes de ses portées
+
+        Returns:
+            Tuple (clé, versions du corpus à estampiller sur l'entrée)
+        """
+        versions = self.version_tracker.get_versions(
+            search_scope_keys(organization_id, user_id, conversation_id)
+        )
+        key = json.dumps({
+            "kind": kind,
+            "query": normalize_query_text(query_text),
+            "filters": [organization_id, user_id, conversation_id],
+            "params": params
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        return key, versions
+
+    def get(self, key: str, versions: Dict[str, int]) -> Optional[List[Dict]]:
+        """Résultats en cache (copies) si les versions du corpus n'ont pas changé"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] != versions:
+                del self._entries[key]
+                self.invalidations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return [dict(r) for r in entry[1]]
+
+    def put(self, key: str, versions: Dict[str, int], results: List[Dict]) -> None:
+        """Enregistre les résultats d'une recherche (éviction LRU)"""
+        with self._lock:
+            self._entries[key] = (versions, [dict(r) for r in results])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict:
+        """Compteurs du cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+# Instance globale (False = désactivé)
+_search_cache_instance = None
+
+def get_search_cache() -> Optional[SearchResultCache]:
+    """Retourne l'instance singleton du cache de recherche (None si désactivé)"""
+    global _search_cache_instance
+    if _search_cache_instance is None:
+        from config import settings
+
+        if not settings.search_cache_enabled:
+            _search_cache_instance = False
+            return None
+
+        _search_cache_instance = SearchResultCache(
+            get_corpus_version_tracker(),
+            max_entries=settings.search_cache_max_entries
+        )
+        logger.info(f"✅ Cache de recherche initialisé ({settings.search_cache_max_entries} entrées max)")
+
+    return _search_cache_instance or None
@@ -3,16 +3,70 @@ Service de stockage des documents et embeddings dans PostgreSQL + pgvector
 """
 from sqlalchemy import text
 from sqlalchemy.dialects.postgresql import UUID, JSONB
-from utils.database import engine, SessionLocal
+from utils.database import engine, SessionLocal, AsyncSessionLocal
+from utils.concurrency import get_embedding_executor, run_in_executor
+from utils.pg_copy import (
+    copy_rows, as_float32_rows, encode_uuid, encode_int4, encode_text, encode_jsonb, encode_vector
+)
 from ai.chunking import get_chunker
 from ai.embeddings import get_embeddings_generator
-from typing import List, Dict
+from ai.corpus_version import get_corpus_version_tracker, document_scope_keys
+from ai.exact_index import get_exact_index
+from ai.search_cache import get_search_cache
+from ai.chunk_embedding_cache import get_chunk_embedding_cache, chunk_content_hash
+from ai.mmr import maximal_marginal_relevance
+from ai.context_builder import merge_neighbor_spans
+from typing import Callable, List, Dict, Optional, Tuple
+import numpy as np
 import uuid
+import asyncio
 import logging
 import json
 
 logger = logging.getLogger(__name__)
 
+PGVECTOR_VERSION_QUERY = "SELECT extversion FROM pg_extension WHERE extname = 'vector'"
+# Valeur max acceptée par pgvector pour hnsw.ef_search (au-delà, erreur)
+HNSW_MAX_EF_SEARCH = 1000
+
+# Requêtes plein texte (configuration française, index GIN sur content_tsv)
+# - tous les termes (syntaxe web : "expression exacte", -exclusion) : recherche d'un terme
+# - au moins un terme : candidats lexicaux de la recherche hybride (questions en langage naturel)
+#   (lexèmes déjà normalisés par la configuration française, réunis par OR
+#   sous la configuration simple : pas de seconde racinisation)
+LEXICAL_TSQUERY_ALL = "websearch_to_tsquery('french', :query_text)"
+LEXICAL_TSQUERY_ANY = (
+    "to_tsquery('simple', array_to_string(tsvector_to_array(to_tsvector('french', :query_text)), ' | '))"
+)
+
+# Distance sur la représentation compacte (premier passage), mêmes expressions
+# que les index HNSW de migrations/add_quantized_embedding_indexes.sql
+QUANTIZED_DISTANCES = {
+    "halfvec": "dc.embedding::halfvec({dim}) <=> ({query})::halfvec({dim})",
+    "binary": "binary_quantize(dc.embedding)::bit({dim}) <~> binary_quantize({query})"
+}
+
+# Schéma de migrations/add_embedding_cache.sql (empreintes et cache d'embeddings)
+CONTENT_HASH_SCHEMA_QUERY = """
+    SELECT to_regclass('chunk_embedding_cache') IS NOT NULL
+       AND (SELECT count(*) FROM information_schema.columns
+            WHERE column_name = 'content_hash' AND table_name IN ('documents', 'document_chunks')) = 2
+"""
+
+# Chunks encodés entre deux comptes rendus d'avancement (ingestion en arrière-plan)
+EMBEDDING_PROGRESS_STEP = 256
+
+# Colonnes de document_chunks remplies par store_document (COPY binaire) ;
+# id fourni pour la mise à jour incrémentale de la recherche exacte
+CHUNK_COPY_COLUMNS = (
+    "id", "document_id", "chunk_index", "content", "embedding", "metadata",
+    "scope", "organization_id", "user_id", "conversation_id", "content_hash"
+)
+CHUNK_COPY_ENCODERS = (
+    encode_uuid, encode_uuid, encode_int4, encode_text, encode_vector, encode_jsonb,
+    encode_text, encode_text, encode_text, encode_text, encode_text
+)
+
 
 class VectorStore:
     """
@@ -23,6 +77,11 @@ class VectorStore:
         self.chunker = get_chunker()
         self.embeddings = get_embeddings_generator()
         self.embedding_dim = self.embeddings.embedding_dim
+        
+        # Détecté à la première recherche (dépend de la version de pgvector)
+        self._iterative_scan_supported = None
+        # Détecté au premier document (migrations/add_embedding_cache.sql appliquée ou non)
+        self._content_hash_supported = None
     
     
     def store_document(
@@ -36,7 +95,10 @@ class VectorStore:
         scope: str = "admin",
         user_id: str = None,
         organization_id: str = None,
-        conversation_id: str = None
+        conversation_id: str = None,
+        progress: Optional[Callable[..., None]] = None,
+        content_hash: str = None,
+        document_id: str = None
     ) -> str:
         """
         Stocke un document et génère ses chunks + embeddings
@@ -51,43 +113,40 @@ class VectorStore:
             scope: Portée du document (organization, user)
             user_id: ID de l'utilisateur propriétaire (pour docs personnels)
             organization_id: ID de l'organisation (pour docs partagés)
+            progress: Rapporteur d'avancement progress(étape, done, total)
+                (voir ai/ingestion.JobProgress, optionnel)
+            content_hash: sha256 du fichier (détection des réuploads identiques)
+            document_id: Ligne créée par create_pending_document (ingestion en
+                arrière-plan) ; None = nouvelle ligne
         
         Returns:
             document_id (UUID string)
         """
-        document_id = str(uuid.uuid4())
+        existing_row = document_id is not None
+        document_id = document_id or str(uuid.uuid4())
         
         logger.info(f"📝 Stockage document: {filename} (id: {document_id[:8]}...)")
         
         try:
             with SessionLocal() as db:
-                # 1. Insérer le document
-
-                insert_doc_query = text("""
-                    INSERT INTO documents (
-                        id, filename, file_type, file_size, file_path, 
-                        scope, user_id, organization_id, conversation_id, uploaded_at, is_indexed, indexing_status
-                    )
-                    VALUES (
-                        :id, :filename, :file_type, :file_size, :file_path,
-                        :scope, :user_id, :organization_id, :conversation_id, CURRENT_TIMESTAMP, false, 'processing'
+                # 1. Insérer le document (ou reprendre la ligne créée à la mise en file)
+                with_hashes = self._content_hash_ready(db)
+                if existing_row:
+                    db.execute(text("""
+                        UPDATE documents SET indexing_status = 'processing', indexing_error = NULL
+                        WHERE id = :id
+                    """), {"id": document_id})
+                else:
+                    self._insert_document(
+                        db, document_id, filename, file_type, file_size, file_path, scope,
+                        user_id, organization_id, conversation_id, content_hash, "processing"
                     )
-                """)
-                db.execute(insert_doc_query, {
-                    "id": document_id,
-                    "filename": filename,
-                    "file_type": file_type,
-                    "file_size": file_size,
-                    "file_path": file_path,
-                    "scope": scope,
-                    "user_id": user_id,
-                    "organization_id": organization_id,
-                    "conversation_id": conversation_id
-                })
                 db.commit()
                 logger.info(f"  ✅ Document enregistré en DB (conversation_id={conversation_id})")
                 
                 # 2. Découper en chunks
+                if progress:
+                    progress("chunking")
                 chunks = self.chunker.chunk_document(
                     text=content,
                     document_id=document_id,
@@ -101,48 +160,62 @@ class VectorStore:
                 
                 logger.info(f"  ✂️  {len(chunks)} chunks générés")
                 
-                # 3. Générer embeddings en batch (plus rapide)
+                # 3. Générer embeddings en batch (chunks déjà connus non ré-encodés)
                 texts = [chunk["content"] for chunk in chunks]
-                embeddings = self.embeddings.generate_embeddings(texts)
-                
-                logger.info(f"  🧠 {len(embeddings)} embeddings générés")
+                chunk_hashes = [chunk_content_hash(t) for t in texts]
+                chunk_cache = get_chunk_embedding_cache() if with_hashes else None
+                embeddings, encoded_hashes, embedding_stats = self._embed_chunks(
+                    db, texts, chunk_hashes, chunk_cache, progress
+                )
                 
-                # 4. Insérer chunks + embeddings
-                insert_chunk_query = text("""
-                    INSERT INTO document_chunks (
-                        id, document_id, chunk_index, content, embedding, metadata
-                    )
-                    VALUES (
-                        :id, :document_id, :chunk_index, :content, :embedding, :metadata
-                    )
-                """)
+                logger.info(
+                    f"  🧠 {len(embeddings)} embeddings: {embedding_stats['encoded']} encodés, "
+                    f"{embedding_stats['cache_hits']} en cache, {embedding_stats['duplicates']} doublons"
+                )
                 
-                for idx, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+                # 4. Insérer chunks + embeddings (un seul COPY binaire, embeddings en float32)
+                if progress:
+                    progress("storing", done=0, total=len(chunks))
+                chunk_rows = []
+                chunk_values = []
+                vectors = as_float32_rows(embeddings)
+                for idx, (chunk, vector, chunk_hash) in enumerate(zip(chunks, vectors, chunk_hashes)):
                     chunk_id = str(uuid.uuid4())
                     
                     # Nettoyer le contenu (supprimer caractères NULL)
                     clean_content = chunk["content"].replace('\x00', '')
                     
-                    # Convertir embedding numpy en liste pour PostgreSQL
-                    embedding_list = embedding.tolist()
-                    
-                    # Convertir metadata en JSON string
-                    metadata_json = json.dumps(chunk.get("metadata", {}))
-                    
-                    db.execute(insert_chunk_query, {
-                        "id": chunk_id,
+                    chunk_values.append((
+                        chunk_id, document_id, idx, clean_content, vector, chunk.get("metadata", {}),
+                        # Clés de portée dénormalisées (index HNSW partiels par portée)
+                        scope, organization_id, user_id, conversation_id, chunk_hash
+                    ))
+                    chunk_rows.append({
+                        "chunk_id": chunk_id,
                         "document_id": document_id,
                         "chunk_index": idx,
                         "content": clean_content,
-                        "embedding": f"[{','.join(map(str, embedding_list))}]",
-                        "metadata": metadata_json
+                        "filename": filename,
+                        "file_type": file_type,
+                        "scope": scope
                     })
                 
-                db.commit()
+                if with_hashes:
+                    copy_rows(db, "document_chunks", CHUNK_COPY_COLUMNS, CHUNK_COPY_ENCODERS, chunk_values)
+                else:
+                    # Sans la migration : pas de colonne content_hash (dernière colonne)
+                    copy_rows(
+                        db, "document_chunks", CHUNK_COPY_COLUMNS[:-1], CHUNK_COPY_ENCODERS[:-1],
+                        [row[:-1] for row in chunk_values]
+                    )
+                
+                logger.info(f"  💾 {len(chunks)} chunks envoyés à pgvector (COPY binaire)")
                 
-                logger.info(f"  💾 {len(chunks)} chunks stockés dans pgvector")
+                # Nouveaux vecteurs ajoutés au cache persistant (copie côté serveur)
+                if chunk_cache is not None:
+                    chunk_cache.store_from_chunks(db, document_id, encoded_hashes)
                 
-                # 5. Mettre à jour statut document
+                # 5. Mettre à jour statut document (même transaction que les chunks)
                 update_doc_query = text("""
                     UPDATE documents
                     SET is_indexed = true, 
@@ -153,6 +226,18 @@ class VectorStore:
                 
                 db.execute(update_doc_query, {"id": document_id})
                 db.commit()
+                if progress:
+                    progress("storing", done=len(chunks), total=len(chunks))
+                
+                # 6. Invalider les caches dépendant des portées de ce document
+                new_versions = get_corpus_version_tracker().bump(
+                    document_scope_keys(scope, organization_id, user_id, conversation_id)
+                )
+                
+                # 7. Mise à jour incrémentale des matrices de recherche exacte chargées
+                exact_index = get_exact_index()
+                if exact_index is not None:
+                    exact_index.add_document(new_versions, chunk_rows, embeddings)
                 
                 logger.info(f"✅ Document {filename} indexé avec succès!")
                 
@@ -183,6 +268,667 @@ class VectorStore:
             raise
     
     
+    def _embed_chunks(
+        self,
+        db,
+        texts: List[str],
+        chunk_hashes: List[str],
+        chunk_cache=None,
+        progress: Optional[Callable[..., None]] = None
+    ) -> Tuple[np.ndarray, List[str], Dict]:
+        """
+        Embeddings des chunks d'un document sans ré-encoder les textes connus
+        
+        - Chunks identiques dans le document : encodés une seule fois
+        - Chunks déjà encodés par le même modèle : relus dans chunk_embedding_cache
+          (si chunk_cache est fourni)
+        
+        Returns:
+            Tuple (embeddings (n, dim) dans l'ordre des chunks, empreintes
+            encodées par le modèle, compteurs de réutilisation)
+        """
+        unique_texts = {}
+        for chunk_hash, chunk_text in zip(chunk_hashes, texts):
+            unique_texts.setdefault(chunk_hash, chunk_text)
+        
+        known = chunk_cache.lookup(db, list(unique_texts)) if chunk_cache is not None else {}
+        to_encode = [h for h in unique_texts if h not in known]
+        
+        vectors = dict(known)
+        vectors.update(zip(to_encode, self._encode_texts([unique_texts[h] for h in to_encode], progress)))
+        embeddings = np.vstack([vectors[h] for h in chunk_hashes]).astype(np.float32)
+        
+        cache_hits = sum(1 for h in chunk_hashes if h in known)
+        stats = {
+            "chunks": len(texts),
+            "encoded": len(to_encode),
+            "cache_hits": cache_hits,
+            "duplicates": len(texts) - len(to_encode) - cache_hits,
+            "reuse_rate": round(1 - len(to_encode) / len(texts), 3)
+        }
+        if progress:
+            progress("embedding", done=len(to_encode), total=len(to_encode), **stats)
+        return embeddings, to_encode, stats
+    
+    
+    def _encode_texts(self, texts: List[str], progress: Optional[Callable[..., None]] = None) -> np.ndarray:
+        """Encode des textes de chunks (par tranches si l'avancement est suivi)"""
+        if not texts:
+            return np.empty((0, self.embedding_dim), dtype=np.float32)
+        if not progress:
+            return self.embeddings.generate_embeddings(texts)
+        
+        parts = []
+        for start in range(0, len(texts), EMBEDDING_PROGRESS_STEP):
+            progress("embedding", done=start, total=len(texts))
+            parts.append(self.embeddings.generate_embeddings(texts[start:start + EMBEDDING_PROGRESS_STEP]))
+        return np.vstack(parts)
+    
+    
+    def _content_hash_ready(self, db) -> bool:
+        """
+        Colonnes content_hash et table chunk_embedding_cache présentes
+        (sinon déduplication et cache d'embeddings désactivés, avec un avertissement)
+        """
+        if self._content_hash_supported is None:
+            self._content_hash_supported = bool(db.execute(text(CONTENT_HASH_SCHEMA_QUERY)).scalar())
+            if not self._content_hash_supported:
+                logger.warning(
+                    "⚠️ migrations/add_embedding_cache.sql non appliquée : "
+                    "déduplication et cache d'embeddings de chunks désactivés"
+                )
+        return self._content_hash_supported
+    
+    
+    def _insert_document(
+        self,
+        db,
+        document_id: str,
+        filename: str,
+        file_type: str,
+        file_size: int,
+        file_path: str,
+        scope: str,
+        user_id: str,
+        organization_id: str,
+        conversation_id: str,
+        content_hash: str,
+        status: str
+    ) -> None:
+        """Insère la ligne documents (content_hash seulement si la migration est appliquée)"""
+        hash_column, hash_value = (", content_hash", ", :content_hash") if self._content_hash_ready(db) else ("", "")
+        db.execute(text(f"""
+            INSERT INTO documents (
+                id, filename, file_type, file_size, file_path{hash_column},
+                scope, user_id, organization_id, conversation_id, uploaded_at, is_indexed, indexing_status
+            )
+            VALUES (
+                :id, :filename, :file_type, :file_size, :file_path{hash_value},
+                :scope, :user_id, :organization_id, :conversation_id, CURRENT_TIMESTAMP, false, :status
+            )
+        """), {
+            "id": document_id,
+            "filename": filename,
+            "file_type": file_type,
+            "file_size": file_size,
+            "file_path": file_path,
+            "content_hash": content_hash,
+            "scope": scope,
+            "user_id": user_id,
+            "organization_id": organization_id,
+            "conversation_id": conversation_id,
+            "status": status
+        })
+    
+    
+    def create_pending_document(
+        self,
+        filename: str,
+        file_path: str,
+        file_type: str,
+        file_size: int,
+        scope: str,
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None,
+        content_hash: str = None
+    ) -> str:
+        """
+        Ligne documents d'un upload mis en file d'indexation (indexing_status
+        'pending') : le document est listé et son statut survit à un redémarrage
+        
+        Returns:
+            document_id à passer à store_document
+        """
+        document_id = str(uuid.uuid4())
+        with SessionLocal() as db:
+            self._insert_document(
+                db, document_id, filename, file_type, file_size, file_path, scope,
+                user_id, organization_id, conversation_id, content_hash, "pending"
+            )
+            db.commit()
+        return document_id
+    
+    
+    def set_indexing_status(self, document_id: str, status: str, error: str = None) -> None:
+        """Met à jour indexing_status d'un document pas encore indexé (étapes avant store_document)"""
+        with SessionLocal() as db:
+            db.execute(text("""
+                UPDATE documents SET indexing_status = :status, indexing_error = :error
+                WHERE id = :id AND NOT is_indexed
+            """), {"id": document_id, "status": status, "error": error})
+            db.commit()
+    
+    
+    def discard_pending_document(self, document_id: str) -> None:
+        """Supprime la ligne d'un upload qui ne sera pas indexé (doublon, file pleine)"""
+        with SessionLocal() as db:
+            db.execute(text("DELETE FROM documents WHERE id = :id AND NOT is_indexed"), {"id": document_id})
+            db.commit()
+    
+    
+    def find_indexed_document(
+        self,
+        content_hash: str,
+        filename: str,
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None
+    ) -> Optional[str]:
+        """
+        Document déjà indexé avec le même fichier (même nom, même sha256)
+        dans la même portée : un réupload identique n'est pas réindexé
+        
+        Returns:
+            document_id existant, ou None
+        """
+        with SessionLocal() as db:
+            if not self._content_hash_ready(db):
+                return None
+            row = db.execute(text("""
+                SELECT id FROM documents
+                WHERE content_hash = :content_hash
+                  AND filename = :filename
+                  AND is_indexed = true
+                  AND user_id::text IS NOT DISTINCT FROM :user_id
+                  AND organization_id::text IS NOT DISTINCT FROM :organization_id
+                  AND conversation_id::text IS NOT DISTINCT FROM :conversation_id
+                ORDER BY indexed_at DESC
+                LIMIT 1
+            """), {
+                "content_hash": content_hash,
+                "filename": filename,
+                "user_id": user_id,
+                "organization_id": organization_id,
+                "conversation_id": conversation_id
+            }).fetchone()
+        return str(row[0]) if row else None
+    
+    
+    def _build_search_queries(
+        self,
+        query_embedding,
+        top_k: int,
+        similarity_threshold: float,
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None,
+        with_embeddings: bool = False,
+        neighbors: int = 0
+    ) -> List[Tuple[str, object, Dict]]:
+        """
+        Construit une requête SQL de recherche par portée et leurs paramètres
+        
+        Args:
+            with_embeddings: Renvoyer aussi l'embedding de chaque chunk (diversification MMR)
+            neighbors: Joindre les chunks chunk_index ± neighbors du même document
+        
+        Returns:
+            Liste de tuples (portée, requête SQLAlchemy text, dict de paramètres)
+        """
+        query_embedding_list = query_embedding.tolist()
+        query_vector_str = f"[{','.join(map(str, query_embedding_list))}]"
+        
+        # Recherche par similarité cosine avec pgvector
+        # Stratégie :
+        # - Toujours inclure les documents globaux de l'organisation
+        # - Toujours inclure les documents personnels de l'utilisateur
+        # - Si conversation_id fourni, AJOUTER les documents de cette conversation
+        # Résultat : une recherche par portée (globaux, perso, conversation),
+        # exécutées en parallèle puis fusionnées par distance
+        #
+        # Les clés de portée sont dénormalisées sur document_chunks : chaque
+        # filtre correspond à un index HNSW partiel (ou, pour un petit tenant,
+        # à un index B-tree + tri exact), sans parcourir le graphe des autres tenants.
+        
+        scope_filters = self._scope_filters(user_id, organization_id, conversation_id)
+        
+        logger.info(f"  📊 Recherche dans: organization={bool(organization_id)}, user={bool(user_id)}, conversation={bool(conversation_id)}")
+        logger.info(f"  🎯 Params: org_id={organization_id}, user_id={user_id}, conv_id={conversation_id}")
+        
+        params = {
+            "query_embedding": query_vector_str,
+            "max_distance": 1 - similarity_threshold,
+            "top_k": top_k,
+            "candidates": self._candidate_count(top_k),
+            "neighbors": neighbors,
+            "org_id": organization_id,
+            "user_id": user_id,
+            "conversation_id": conversation_id
+        }
+        
+        queries = []
+        for scope_name, _, scope_filter in scope_filters:
+            chunk_filter = f"WHERE {scope_filter}" if scope_filter else ""
+            nearest_chunks = self._nearest_chunks_query(chunk_filter)
+            
+            # Distance calculée une seule fois ; le seuil est appliqué après le
+            # LIMIT (les top_k plus proches triés par distance : filtrer avant ou
+            # après donne le même résultat, mais seul ce sens laisse l'index servir
+            # le ORDER BY ... LIMIT).
+            search_sql = f"""
+                SELECT 
+                    c.id,
+                    c.document_id,
+                    c.chunk_index,
+                    c.content,
+                    d.filename,
+                    d.file_type,
+                    d.scope,
+                    1 - c.distance as similarity
+                    {", CAST(c.embedding AS real[]) as embedding" if with_embeddings else ""}
+                FROM ({nearest_chunks}) c
+                JOIN documents d ON c.document_id = d.id
+                WHERE c.distance <= :max_distance
+                ORDER BY c.distance
+            """
+            if neighbors:
+                search_sql = self._with_neighbors_sql(search_sql)
+            queries.append((scope_name, text(search_sql), params))
+        
+        return queries
+    
+    
+    @staticmethod
+    def _with_neighbors_sql(search_sql: str) -> str:
+        """
+        Ajoute aux résultats d'une recherche les chunks voisins de chaque hit
+        
+        Même aller-retour : pour chaque hit, un parcours de l'index unique
+        (document_id, chunk_index) sur chunk_index ± :neighbors, agrégé en JSON
+        (colonne neighbors, en dernière position).
+        """
+        return f"""
+            WITH hits AS ({search_sql})
+            SELECT h.*, nb.neighbors
+            FROM hits h
+            LEFT JOIN LATERAL (
+                SELECT json_agg(
+                    json_build_object('chunk_index', n.chunk_index, 'content', n.content)
+                    ORDER BY n.chunk_index
+                ) AS neighbors
+                FROM document_chunks n
+                WHERE n.document_id = h.document_id
+                  AND n.chunk_index BETWEEN h.chunk_index - :neighbors AND h.chunk_index + :neighbors
+                  AND n.chunk_index <> h.chunk_index
+            ) nb ON true
+            ORDER BY h.similarity DESC
+        """
+    
+    
+    @staticmethod
+    def _quantization() -> str:
+        """Mode de stockage compact utilisé pour le premier passage (none, halfvec, binary)"""
+        from config import settings
+        return settings.vector_quantization
+    
+    
+    def _candidate_count(self, top_k: int) -> int:
+        """
+        Candidats du premier passage quantifié, re-classés en pleine précision
+        (bornés par HNSW_MAX_EF_SEARCH : l'index n'en renvoie pas davantage)
+        """
+        from config import settings
+        if self._quantization() == "none":
+            return min(top_k, HNSW_MAX_EF_SEARCH)
+        return min(top_k * settings.vector_rerank_factor, HNSW_MAX_EF_SEARCH)
+    
+    
+    def _nearest_chunks_query(self, chunk_filter: str, query_vector: str = "CAST(:query_embedding AS vector)") -> str:
+        """
+        Sous-requête des top_k chunks les plus proches d'une portée (distance exacte)
+        
+        Args:
+            chunk_filter: Clause WHERE de la portée (alias dc)
+            query_vector: Expression SQL du vecteur de requête (paramètre, ou
+                colonne d'une jointure LATERAL pour la recherche par lot)
+        
+        - Pleine précision : ORDER BY distance LIMIT servi par l'index HNSW vector
+        - Quantifié : les :candidates plus proches selon la représentation
+          compacte (index HNSW halfvec ou binaire, 2 à 32 fois plus petit),
+          re-classés sur les embeddings float32 de ces seuls candidats
+        """
+        quantization = self._quantization()
+        if quantization == "none":
+            return f"""
+                    SELECT
+                        dc.id,
+                        dc.document_id,
+                        dc.chunk_index,
+                        dc.content,
+                        dc.embedding,
+                        dc.embedding <=> {query_vector} as distance
+                    FROM document_chunks dc
+                    {chunk_filter}
+                    ORDER BY distance
+                    LIMIT :top_k
+                """
+        
+        compact_distance = QUANTIZED_DISTANCES[quantization].format(dim=self.embedding_dim, query=query_vector)
+        return f"""
+                    SELECT
+                        q.id,
+                        q.document_id,
+                        q.chunk_index,
+                        q.content,
+                        q.embedding,
+                        q.embedding <=> {query_vector} as distance
+                    FROM (
+                        SELECT dc.id, dc.document_id, dc.chunk_index, dc.content, dc.embedding
+                        FROM document_chunks dc
+                        {chunk_filter}
+                        ORDER BY {compact_distance}
+                        LIMIT :candidates
+                    ) q
+                    ORDER BY distance
+                    LIMIT :top_k
+                """
+    
+    
+    @staticmethod
+    def _scope_filters(
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None
+    ) -> List[Tuple[str, str, str]]:
+        """
+        Portées à interroger
+        
+        Returns:
+            Liste de tuples (portée, clé de corpus_version, filtre SQL sur dc)
+        """
+        scope_filters = []
+        
+        # Documents d'organisation (globaux) - toujours inclus si org_id fourni
+        if organization_id:
+            scope_filters.append((
+                "organization", f"org:{organization_id}",
+                "dc.scope = 'organization' AND dc.organization_id = :org_id"
+            ))
+        
+        # Documents personnels de l'utilisateur - toujours inclus si user_id fourni
+        if user_id:
+            scope_filters.append((
+                "user", f"user:{user_id}",
+                "dc.scope = 'user' AND dc.user_id = :user_id"
+            ))
+        
+        # Documents de conversation - AJOUTÉS en plus si conversation_id fourni
+        if conversation_id:
+            scope_filters.append((
+                "conversation", f"conv:{conversation_id}",
+                "dc.conversation_id = :conversation_id"
+            ))
+        
+        # Si aucun filtre, chercher dans tous les documents (fallback, index global)
+        if not scope_filters:
+            scope_filters.append(("all", None, None))
+        
+        return scope_filters
+    
+    
+    @staticmethod
+    def _merge_scope_results(results_per_scope: List[List[Dict]], top_k: int, key: str = "similarity") -> List[Dict]:
+        """
+        Fusionne les résultats des portées : tri par score (`key`), sans doublon
+        (un document de conversation peut aussi être un document personnel)
+        """
+        merged = {}
+        for results in results_per_scope:
+            for result in results:
+                current = merged.get(result["chunk_id"])
+                if current is None or result[key] > current[key]:
+                    merged[result["chunk_id"]] = result
+        
+        return sorted(merged.values(), key=lambda r: r[key], reverse=True)[:top_k]
+    
+    
+    @staticmethod
+    def _fuse_rankings(rankings: List[List[Dict]], top_k: int, rrf_k: int = 60) -> List[Dict]:
+        """
+        Fusion de classements par Reciprocal Rank Fusion
+        
+        score(chunk) = somme des 1 / (rrf_k + rang) sur les classements où il
+        apparaît : seuls les rangs comptent, les échelles de score (cosine,
+        ts_rank) n'ont pas à être comparables.
+        """
+        fused = {}
+        for ranking in rankings:
+            for rank, result in enumerate(ranking, 1):
+                entry = fused.get(result["chunk_id"])
+                if entry is None:
+                    entry = fused[result["chunk_id"]] = {
+                        **result,
+                        "lexical_rank": result.get("lexical_rank"),
+                        "rrf_score": 0.0
+                    }
+                else:
+                    if entry["similarity"] is None:
+                        entry["similarity"] = result["similarity"]
+                    if entry["lexical_rank"] is None:
+                        entry["lexical_rank"] = result.get("lexical_rank")
+                entry["rrf_score"] += 1.0 / (rrf_k + rank)
+        
+        return sorted(fused.values(), key=lambda r: r["rrf_score"], reverse=True)[:top_k]
+    
+    
+    def _build_search_settings(self, top_k: int):
+        """
+        Paramètres HNSW de la transaction de recherche (set_config local)
+        
+        - hnsw.ef_search >= nombre de candidats (top_k, ou top_k x facteur de
+          re-classement en mode quantifié), sinon l'index en renvoie moins ;
+          borné à HNSW_MAX_EF_SEARCH (un grand top_k renvoie moins de lignes
+          au lieu d'une erreur)
+        - hnsw.iterative_scan (pgvector >= 0.8) : le parcours continue tant que
+          les filtres de portée éliminent des candidats
+        
+        Returns:
+            Tuple (requête SQLAlchemy text, dict de paramètres)
+        """
+        from config import settings
+        
+        assignments = ["set_config('hnsw.ef_search', :ef_search, true)"]
+        params = {"ef_search": str(min(max(settings.vector_ef_search, self._candidate_count(top_k)), HNSW_MAX_EF_SEARCH))}
+        
+        if self._iterative_scan_supported and settings.vector_iterative_scan != "off":
+            assignments.append("set_config('hnsw.iterative_scan', :iterative_scan, true)")
+            params["iterative_scan"] = settings.vector_iterative_scan
+        
+        return text(f"SELECT {', '.join(assignments)}"), params
+    
+    
+    @staticmethod
+    def _supports_iterative_scan(extversion) -> bool:
+        """hnsw.iterative_scan existe à partir de pgvector 0.8.0"""
+        try:
+            major, minor = (int(part) for part in str(extversion).split(".")[:2])
+        except ValueError:
+            return False
+        return (major, minor) >= (0, 8)
+    
+    
+    def _apply_search_settings(self, db, top_k: int) -> None:
+        """Applique les paramètres HNSW à la transaction courante (session synchrone)"""
+        if self._iterative_scan_supported is None:
+            version = db.execute(text(PGVECTOR_VERSION_QUERY)).scalar()
+            self._iterative_scan_supported = self._supports_iterative_scan(version)
+            logger.info(f"  🧭 pgvector {version} (iterative scan: {self._iterative_scan_supported})")
+        
+        settings_query, params = self._build_search_settings(top_k)
+        db.execute(settings_query, params)
+    
+    
+    async def _aapply_search_settings(self, db, top_k: int) -> None:
+        """Applique les paramètres HNSW à la transaction courante (session asyncpg)"""
+        if self._iterative_scan_supported is None:
+            version = (await db.execute(text(PGVECTOR_VERSION_QUERY))).scalar()
+            self._iterative_scan_supported = self._supports_iterative_scan(version)
+            logger.info(f"  🧭 pgvector {version} (iterative scan: {self._iterative_scan_supported})")
+        
+        settings_query, params = self._build_search_settings(top_k)
+        await db.execute(settings_query, params)
+    
+    
+    @staticmethod
+    def _format_search_rows(rows, with_embeddings: bool = False, with_neighbors: bool = False) -> List[Dict]:
+        """
+        Convertit les lignes SQL de recherche en dictionnaires
+        
+        Colonnes optionnelles après similarity, dans cet ordre : embedding,
+        neighbors (voir _build_search_queries)
+        """
+        results = []
+        for row in rows:
+            results.append({
+                "chunk_id": str(row[0]),
+                "document_id": str(row[1]),
+                "chunk_index": row[2],
+                "content": row[3],
+                "filename": row[4],
+                "file_type": row[5],
+                "scope": row[6],
+                "similarity": float(row[7])
+            })
+            if with_embeddings:
+                results[-1]["embedding"] = np.asarray(row[8], dtype=np.float32)
+            if with_neighbors:
+                neighbors = row[-1] or []
+                # asyncpg renvoie le JSON sous forme de texte
+                results[-1]["neighbors"] = json.loads(neighbors) if isinstance(neighbors, str) else neighbors
+        return results
+    
+    
+    def _diversification(self, top_k: int, diversify: Optional[bool]) -> Tuple[bool, int]:
+        """
+        Diversification MMR active pour cette recherche, et nombre de
+        candidats à récupérer par portée (top_k x MMR_FETCH_FACTOR si active)
+        """
+        from config import settings
+        if diversify is None:
+            diversify = settings.mmr_enabled
+        if not diversify:
+            return False, top_k
+        return True, top_k * settings.mmr_fetch_factor
+    
+    
+    def _diversify(self, candidates: List[Dict], query_embedding, top_k: int) -> List[Dict]:
+        """
+        Garde top_k candidats par MMR (pertinence vs redondance entre chunks)
+        
+        Les embeddings des candidats arrivent avec les lignes de la recherche ;
+        ils sont retirés des résultats renvoyés.
+        """
+        from config import settings
+        
+        if len(candidates) > top_k:
+            embeddings = np.stack([c["embedding"] for c in candidates])
+            selected = maximal_marginal_relevance(query_embedding, embeddings, top_k, settings.mmr_lambda)
+            logger.info(f"  🎛️ MMR (λ={settings.mmr_lambda}): {len(candidates)} candidats → {len(selected)}")
+            candidates = [candidates[i] for i in selected]
+        
+        return [{k: v for k, v in c.items() if k != "embedding"} for c in candidates]
+    
+    
+    def _neighbor_count(self, neighbors: Optional[int]) -> int:
+        """Nombre de voisins de part et d'autre de chaque hit (défaut : CONTEXT_NEIGHBOR_CHUNKS)"""
+        from config import settings
+        return settings.context_neighbor_chunks if neighbors is None else neighbors
+    
+    
+    def _search_params(
+        self,
+        top_k: int,
+        similarity_threshold: float,
+        diversify: Optional[bool],
+        neighbors: Optional[int]
+    ) -> Dict:
+        """Paramètres qui déterminent le résultat d'une recherche vectorielle (clé du cache)"""
+        return {
+            "top_k": top_k,
+            "threshold": similarity_threshold,
+            "diversify": self._diversification(top_k, diversify)[0],
+            "neighbors": self._neighbor_count(neighbors),
+            "quantization": self._quantization()
+        }
+    
+    
+    def _hybrid_params(self, query_text: str, top_k: int, similarity_threshold: float, query_embedding=None) -> Dict:
+        """Paramètres qui déterminent le résultat d'une recherche hybride (clé du cache)"""
+        from config import settings
+        return {
+            **self._search_params(top_k, similarity_threshold, None, None),
+            "rrf_k": settings.hybrid_rrf_k,
+            # Sans embedding fourni, un terme exact peut être servi par le plein texte seul
+            "term_lookup": query_embedding is None and self.is_term_lookup(query_text)
+        }
+    
+    
+    def _cache_lookup(
+        self,
+        kind: str,
+        query_text: str,
+        user_id: Optional[str],
+        organization_id: Optional[str],
+        conversation_id: Optional[str],
+        params: Dict
+    ) -> Tuple[Optional[Tuple[str, Dict[str, int]]], Optional[List[Dict]]]:
+        """
+        Cherche une recherche identique dans le cache (appel bloquant : lit
+        les versions du corpus dans Redis)
+        
+        Returns:
+            Tuple (entrée à passer à _cache_store, résultats en cache ou None).
+            Entrée None si le cache est désactivé.
+        """
+        cache = get_search_cache()
+        if cache is None:
+            return None, None
+        try:
+            key, versions = cache.build_key(kind, query_text, organization_id, user_id, conversation_id, params)
+        except Exception as e:
+            logger.warning(f"⚠️ Cache de recherche indisponible: {e}")
+            return None, None
+        cached = cache.get(key, versions)
+        if cached is not None:
+            logger.info(f"  ⚡ Cache de recherche: hit ({kind}, {len(cached)} résultats)")
+        return (key, versions), cached
+    
+    
+    async def _acache_lookup(self, *args):
+        """Variante asynchrone de _cache_lookup (lecture Redis hors de la boucle asyncio)"""
+        if get_search_cache() is None:
+            return None, None
+        return await asyncio.to_thread(self._cache_lookup, *args)
+    
+    
+    def _cache_store(self, entry: Optional[Tuple[str, Dict[str, int]]], results: List[Dict]) -> None:
+        """Enregistre les résultats d'une recherche, estampillés des versions lues avant celle-ci"""
+        cache = get_search_cache()
+        if cache is not None and entry is not None:
+            cache.put(entry[0], entry[1], results)
+    
+    
     def search_similar(
         self,
         query_text: str,
@@ -190,7 +936,9 @@ class VectorStore:
         similarity_threshold: float = 0.0,
         user_id: str = None,
         organization_id: str = None,
-        conversation_id: str = None
+        conversation_id: str = None,
+        diversify: Optional[bool] = None,
+        neighbors: Optional[int] = None
     ) -> List[Dict]:
         """
         Recherche les chunks les plus similaires à une requête
@@ -201,49 +949,355 @@ class VectorStore:
             similarity_threshold: Seuil de similarité minimum (0-1)
             user_id: ID de l'utilisateur pour filtrer ses documents (optionnel)
             organization_id: ID de l'organisation pour filtrer documents partagés (optionnel)
+            diversify: Diversification MMR des résultats (défaut : MMR_ENABLED)
+            neighbors: Étendre chaque hit aux chunks chunk_index ± neighbors du
+                même document (défaut : CONTEXT_NEIGHBOR_CHUNKS, 0 = désactivé)
         
         Returns:
-            Liste de dictionnaires avec chunks et scores de similarité
+            Liste de dictionnaires avec chunks et scores de similarité (avec
+            extension : un résultat par passage contigu, voir merge_neighbor_spans)
         """
+        params = self._search_params(top_k, similarity_threshold, diversify, neighbors)
+        entry, cached = self._cache_lookup("vector", query_text, user_id, organization_id, conversation_id, params)
+        if cached is not None:
+            return cached
+        
+        results = self._search_similar(
+            query_text, top_k, similarity_threshold, user_id, organization_id, conversation_id,
+            diversify, neighbors
+        )
+        self._cache_store(entry, results)
+        return results
+    
+    
+    def _search_similar(
+        self,
+        query_text: str,
+        top_k: int,
+        similarity_threshold: float,
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None,
+        diversify: Optional[bool] = None,
+        neighbors: Optional[int] = None
+    ) -> List[Dict]:
+        """Recherche vectorielle sans passer par le cache (voir search_similar)"""
         logger.info(f"🔍 Recherche similaire: '{query_text[:50]}...' (user: {user_id or 'all'}, org: {organization_id or 'none'})")
         
         # Générer embedding de la requête
         query_embedding = self.embeddings.generate_embedding(query_text)
-        query_embedding_list = query_embedding.tolist()
-        query_vector_str = f"[{','.join(map(str, query_embedding_list))}]"
+        diversify, fetch_k = self._diversification(top_k, diversify)
+        neighbors = self._neighbor_count(neighbors)
+        queries = self._build_search_queries(
+            query_embedding, fetch_k, similarity_threshold, user_id, organization_id, conversation_id,
+            with_embeddings=diversify, neighbors=neighbors
+        )
+        
+        # Portées servies en mémoire (recherche exacte), les autres par pgvector
+        results_per_scope = []
+        sql_queries = []
+        scopes = self._scope_filters(user_id, organization_id, conversation_id)
+        for (_, tenant_key, scope_filter), (_, search_query, params) in zip(scopes, queries):
+            exact = self._exact_search(
+                tenant_key, scope_filter, params, query_embedding, fetch_k, similarity_threshold,
+                diversify, neighbors
+            )
+            if exact is not None:
+                results_per_scope.append(exact)
+            else:
+                sql_queries.append((search_query, params))
+        
+        if sql_queries:
+            with SessionLocal() as db:
+                self._apply_search_settings(db, fetch_k)
+                for search_query, params in sql_queries:
+                    rows = db.execute(search_query, params)
+                    results_per_scope.append(self._format_search_rows(rows, diversify, bool(neighbors)))
+        results = self._merge_scope_results(results_per_scope, fetch_k)
+        if diversify:
+            results = self._diversify(results, query_embedding, top_k)
+        if neighbors:
+            results = merge_neighbor_spans(results)
+        
+        logger.info(f"  ✅ {len(results)} résultats trouvés")
+        
+        return results
+    
+    
+    def _build_batch_search_query(
+        self,
+        query_embeddings,
+        top_k: int,
+        similarity_threshold: float,
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None
+    ) -> Tuple[object, Dict]:
+        """
+        Construit une requête SQL unique pour un lot de requêtes
+        
+        Les vecteurs sont passés en un seul tableau ; pour chacun (LATERAL),
+        les sous-requêtes par portée de _nearest_chunks_query s'exécutent avec
+        leur index HNSW, comme pour une recherche unitaire.
+        
+        Returns:
+            Tuple (requête SQLAlchemy text, dict de paramètres)
+        """
+        scope_filters = self._scope_filters(user_id, organization_id, conversation_id)
+        nearest_per_scope = " UNION ALL ".join(
+            f"({self._nearest_chunks_query(f'WHERE {scope_filter}' if scope_filter else '', 'b.query_embedding')})"
+            for _, _, scope_filter in scope_filters
+        )
+        
+        search_query = text(f"""
+            WITH batch AS (
+                SELECT q.ord, CAST(q.vec AS vector) AS query_embedding
+                FROM unnest(CAST(:query_embeddings AS text[])) WITH ORDINALITY AS q(vec, ord)
+            )
+            SELECT 
+                b.ord,
+                c.id,
+                c.document_id,
+                c.chunk_index,
+                c.content,
+                d.filename,
+                d.file_type,
+                d.scope,
+                1 - c.distance as similarity
+            FROM batch b
+            CROSS JOIN LATERAL ({nearest_per_scope}) c
+            JOIN documents d ON c.document_id = d.id
+            WHERE c.distance <= :max_distance
+            ORDER BY b.ord, c.distance
+        """)
+        params = {
+            "query_embeddings": [f"[{','.join(map(str, e.tolist()))}]" for e in query_embeddings],
+            "max_distance": 1 - similarity_threshold,
+            "top_k": top_k,
+            "candidates": self._candidate_count(top_k),
+            "org_id": organization_id,
+            "user_id": user_id,
+            "conversation_id": conversation_id
+        }
+        return search_query, params
+    
+    
+    def _split_batch_rows(self, rows, batch_size: int, top_k: int) -> List[List[Dict]]:
+        """Répartit les lignes d'une recherche par lot par requête (ord 1..n), sans doublon"""
+        per_query = [[] for _ in range(batch_size)]
+        for row in rows:
+            per_query[row[0] - 1].extend(self._format_search_rows([row[1:]]))
+        return [self._merge_scope_results([results], top_k) for results in per_query]
+    
+    
+    def search_many(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        similarity_threshold: float = 0.0,
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None
+    ) -> List[List[Dict]]:
+        """
+        Recherche par lot : un seul encodage et un seul aller-retour SQL
         
+        Args:
+            queries: Textes des requêtes
+            (autres arguments : voir search_similar, communs à tout le lot)
+        
+        Returns:
+            Une liste de résultats par requête, dans l'ordre de `queries`
+        """
+        if not queries:
+            return []
+        logger.info(f"🔍 Recherche par lot: {len(queries)} requêtes (user: {user_id or 'all'}, org: {organization_id or 'none'})")
+        
+        query_embeddings = self.embeddings.generate_query_embeddings(queries)
+        search_query, params = self._build_batch_search_query(
+            query_embeddings, top_k, similarity_threshold, user_id, organization_id, conversation_id
+        )
         with SessionLocal() as db:
-            # Recherche par similarité cosine avec pgvector
-            # Stratégie :
-            # - Toujours inclure les documents globaux de l'organisation
-            # - Toujours inclure les documents personnels de l'utilisateur
-            # - Si conversation_id fourni, AJOUTER les documents de cette conversation
-            # Résultat : cherche dans (globaux + perso + conversation) simultanément
-            
-            where_conditions = []
-            
-            # Documents d'organisation (globaux) - toujours inclus si org_id fourni
-            if organization_id:
-                where_conditions.append("(d.scope = 'organization' AND d.organization_id = :org_id)")
-            
-            # Documents personnels de l'utilisateur - toujours inclus si user_id fourni
-            if user_id:
-                where_conditions.append("(d.scope = 'user' AND d.user_id = :user_id)")
-            
-            # Documents de conversation - AJOUTÉS en plus si conversation_id fourni
-            if conversation_id:
-                where_conditions.append("(d.conversation_id = :conversation_id)")
-            
-            # Si aucun filtre, chercher dans tous les documents (fallback)
-            if not where_conditions:
-                where_conditions.append("1=1")
-            
-            where_clause = " OR ".join(where_conditions)
-            
-            logger.info(f"  📊 Recherche dans: organization={bool(organization_id)}, user={bool(user_id)}, conversation={bool(conversation_id)}")
-            logger.info(f"  🔍 WHERE clause: {where_clause}")
-            logger.info(f"  🎯 Params: org_id={organization_id}, user_id={user_id}, conv_id={conversation_id}")
+            self._apply_search_settings(db, top_k)
+            results = self._split_batch_rows(db.execute(search_query, params), len(queries), top_k)
+        
+        logger.info(f"  ✅ {sum(len(r) for r in results)} résultats pour {len(queries)} requêtes")
+        
+        return results
+    
+    
+    async def asearch_many(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        similarity_threshold: float = 0.0,
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None
+    ) -> List[List[Dict]]:
+        """
+        Variante asynchrone de search_many pour les routes FastAPI
+        
+        L'encodage du lot tourne dans l'executor embeddings (borné) et la
+        requête passe par la session asyncpg.
+        """
+        if not queries:
+            return []
+        logger.info(f"🔍 Recherche par lot: {len(queries)} requêtes (user: {user_id or 'all'}, org: {organization_id or 'none'})")
+        
+        query_embeddings = await run_in_executor(
+            get_embedding_executor(), self.embeddings.generate_query_embeddings, queries
+        )
+        search_query, params = self._build_batch_search_query(
+            query_embeddings, top_k, similarity_threshold, user_id, organization_id, conversation_id
+        )
+        async with AsyncSessionLocal() as db:
+            await self._aapply_search_settings(db, top_k)
+            rows = await db.execute(search_query, params)
+            results = self._split_batch_rows(rows, len(queries), top_k)
+        
+        logger.info(f"  ✅ {sum(len(r) for r in results)} résultats pour {len(queries)} requêtes")
+        
+        return results
+    
+    
+    async def aembed_query(self, query_text: str):
+        """
+        Encode une requête sans bloquer la boucle asyncio
+        
+        Avec le batching actif, la requête rejoint le prochain lot sans occuper
+        de thread ; sinon elle est encodée dans l'executor embeddings (borné).
+        """
+        if self.embeddings.batcher is not None:
+            return await asyncio.wrap_future(self.embeddings.submit_embedding(query_text))
+        return await run_in_executor(
+            get_embedding_executor(), self.embeddings.generate_embedding, query_text
+        )
+    
+    
+    async def asearch_similar(
+        self,
+        query_text: str,
+        top_k: int = 5,
+        similarity_threshold: float = 0.0,
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None,
+        query_embedding=None,
+        diversify: Optional[bool] = None,
+        neighbors: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Variante asynchrone de search_similar pour les routes FastAPI
+        
+        L'encodage de la requête tourne dans l'executor embeddings (borné)
+        et la requête pgvector passe par la session asyncpg.
+        
+        Args:
+            query_embedding: Embedding déjà calculé de la requête (optionnel)
+            diversify: Diversification MMR des résultats (défaut : MMR_ENABLED)
+            neighbors: Extension aux chunks voisins (défaut : CONTEXT_NEIGHBOR_CHUNKS)
+        """
+        params = self._search_params(top_k, similarity_threshold, diversify, neighbors)
+        entry, cached = await self._acache_lookup(
+            "vector", query_text, user_id, organization_id, conversation_id, params
+        )
+        if cached is not None:
+            return cached
+        
+        results = await self._asearch_similar(
+            query_text, top_k, similarity_threshold, user_id, organization_id, conversation_id,
+            query_embedding, diversify, neighbors
+        )
+        self._cache_store(entry, results)
+        return results
+    
+    
+    async def _asearch_similar(
+        self,
+        query_text: str,
+        top_k: int,
+        similarity_threshold: float,
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None,
+        query_embedding=None,
+        diversify: Optional[bool] = None,
+        neighbors: Optional[int] = None
+    ) -> List[Dict]:
+        """Recherche vectorielle asynchrone sans passer par le cache (voir asearch_similar)"""
+        logger.info(f"🔍 Recherche similaire: '{query_text[:50]}...' (user: {user_id or 'all'}, org: {organization_id or 'none'})")
+        
+        if query_embedding is None:
+            query_embedding = await self.aembed_query(query_text)
+        diversify, fetch_k = self._diversification(top_k, diversify)
+        neighbors = self._neighbor_count(neighbors)
+        queries = self._build_search_queries(
+            query_embedding, fetch_k, similarity_threshold, user_id, organization_id, conversation_id,
+            with_embeddings=diversify, neighbors=neighbors
+        )
+        
+        # Une session (connexion) par portée : les recherches s'exécutent en parallèle
+        scopes = self._scope_filters(user_id, organization_id, conversation_id)
+        results_per_scope = await asyncio.gather(*[
+            self._asearch_scope(
+                search_query, params, fetch_k,
+                tenant_key, scope_filter, query_embedding, similarity_threshold, diversify, neighbors
+            )
+            for (_, tenant_key, scope_filter), (_, search_query, params) in zip(scopes, queries)
+        ])
+        results = self._merge_scope_results(results_per_scope, fetch_k)
+        if diversify:
+            results = self._diversify(results, query_embedding, top_k)
+        if neighbors:
+            results = merge_neighbor_spans(results)
+        
+        logger.info(f"  ✅ {len(results)} résultats trouvés")
+        
+        return results
+
+    
+    
+    def _build_lexical_queries(
+        self,
+        query_text: str,
+        top_k: int,
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None,
+        query_embedding=None,
+        match_any: bool = False
+    ) -> List[Tuple[str, object, Dict]]:
+        """
+        Construit une requête plein texte par portée (index GIN content_tsv)
+        
+        Args:
+            query_embedding: Si fourni, la similarité cosine des chunks trouvés
+                est aussi calculée (sur les seuls top_k résultats)
+            match_any: Au moins un terme (sinon tous les termes)
+        
+        Returns:
+            Liste de tuples (portée, requête SQLAlchemy text, dict de paramètres)
+        """
+        tsquery = LEXICAL_TSQUERY_ANY if match_any else LEXICAL_TSQUERY_ALL
+        params = {
+            "query_text": query_text,
+            "top_k": top_k,
+            "org_id": organization_id,
+            "user_id": user_id,
+            "conversation_id": conversation_id
+        }
+        
+        similarity = "NULL"
+        if query_embedding is not None:
+            params["query_embedding"] = f"[{','.join(map(str, query_embedding.tolist()))}]"
+            similarity = "1 - (dc.embedding <=> CAST(:query_embedding AS vector))"
+        
+        queries = []
+        for scope_name, _, scope_filter in self._scope_filters(user_id, organization_id, conversation_id):
+            chunk_filter = f"AND {scope_filter}" if scope_filter else ""
             
+            # ts_rank_cd normalisé (32 : rang / (rang + 1), entre 0 et 1)
             search_query = text(f"""
                 SELECT 
                     dc.id,
@@ -253,39 +1307,373 @@ class VectorStore:
                     d.filename,
                     d.file_type,
                     d.scope,
-                    1 - (dc.embedding <=> CAST(:query_embedding AS vector)) as similarity
+                    {similarity} as similarity,
+                    ts_rank_cd(dc.content_tsv, {tsquery}, 32) as lexical_rank
                 FROM document_chunks dc
                 JOIN documents d ON dc.document_id = d.id
-                WHERE 1 - (dc.embedding <=> CAST(:query_embedding AS vector)) >= :threshold
-                AND ({where_clause})
-                ORDER BY dc.embedding <=> CAST(:query_embedding AS vector)
+                WHERE dc.content_tsv @@ {tsquery}
+                {chunk_filter}
+                ORDER BY lexical_rank DESC
                 LIMIT :top_k
             """)
-            result = db.execute(search_query, {
-                "query_embedding": query_vector_str,
-                "threshold": similarity_threshold,
-                "top_k": top_k,
-                "org_id": organization_id,
-                "user_id": user_id,
-                "conversation_id": conversation_id
+            queries.append((scope_name, search_query, params))
+        
+        return queries
+    
+    
+    @staticmethod
+    def _format_lexical_rows(rows) -> List[Dict]:
+        """Convertit les lignes SQL de recherche plein texte en dictionnaires"""
+        results = []
+        for row in rows:
+            results.append({
+                "chunk_id": str(row[0]),
+                "document_id": str(row[1]),
+                "chunk_index": row[2],
+                "content": row[3],
+                "filename": row[4],
+                "file_type": row[5],
+                "scope": row[6],
+                "similarity": float(row[7]) if row[7] is not None else None,
+                "lexical_rank": float(row[8])
             })
-            
-            results = []
-            for row in result:
-                results.append({
-                    "chunk_id": row[0],
-                    "document_id": row[1],
-                    "chunk_index": row[2],
-                    "content": row[3],
-                    "filename": row[4],
-                    "file_type": row[5],
-                    "scope": row[6],
-                    "similarity": float(row[7])
-                })
-            
-            logger.info(f"  ✅ {len(results)} résultats trouvés")
-            
-            return results
+        return results
+    
+    
+    @staticmethod
+    def _mark_term_matches(results: List[Dict]) -> List[Dict]:
+        """
+        Marque les résultats du chemin rapide de la recherche hybride (tous les
+        termes d'une recherche de terme exact trouvés par l'index plein texte)
+        """
+        for result in results:
+            result["term_match"] = True
+        return results
+    
+    
+    @staticmethod
+    def is_term_lookup(query_text: str) -> bool:
+        """
+        Requête de recherche d'un terme exact : entre guillemets, ou un ou deux
+        mots sans point d'interrogation (ex: "RTT", "mutuelle santé")
+        """
+        stripped = query_text.strip()
+        if len(stripped) > 2 and stripped[0] == stripped[-1] == '"':
+            return True
+        return 0 < len(stripped.split()) <= 2 and "?" not in stripped
+    
+    
+    def search_lexical(
+        self,
+        query_text: str,
+        top_k: int = 5,
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None,
+        match_any: bool = False
+    ) -> List[Dict]:
+        """
+        Recherche plein texte seule (aucun encodage de la requête)
+        
+        Adaptée aux acronymes et termes exacts ("RTT") que les embeddings
+        représentent mal. Les résultats n'ont pas de similarité (None).
+        
+        Returns:
+            Chunks triés par pertinence lexicale (lexical_rank)
+        """
+        params = {"top_k": top_k, "match_any": match_any}
+        entry, cached = self._cache_lookup("lexical", query_text, user_id, organization_id, conversation_id, params)
+        if cached is not None:
+            return cached
+        
+        results = self._search_lexical(query_text, top_k, user_id, organization_id, conversation_id, match_any)
+        self._cache_store(entry, results)
+        return results
+    
+    
+    def _search_lexical(
+        self,
+        query_text: str,
+        top_k: int,
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None,
+        match_any: bool = False
+    ) -> List[Dict]:
+        """Recherche plein texte sans passer par le cache (voir search_lexical)"""
+        logger.info(f"🔤 Recherche lexicale: '{query_text[:50]}...'")
+        
+        queries = self._build_lexical_queries(
+            query_text, top_k, user_id, organization_id, conversation_id, match_any=match_any
+        )
+        with SessionLocal() as db:
+            results_per_scope = [
+                self._format_lexical_rows(db.execute(search_query, params))
+                for _, search_query, params in queries
+            ]
+        results = self._merge_scope_results(results_per_scope, top_k, key="lexical_rank")
+        
+        logger.info(f"  ✅ {len(results)} résultats lexicaux")
+        
+        return results
+    
+    
+    async def asearch_lexical(
+        self,
+        query_text: str,
+        top_k: int = 5,
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None,
+        query_embedding=None,
+        match_any: bool = False
+    ) -> List[Dict]:
+        """
+        Variante asynchrone de search_lexical (une session asyncpg par portée)
+        
+        Args:
+            query_embedding: Si fourni, la similarité cosine des résultats est renseignée
+        """
+        params = {"top_k": top_k, "match_any": match_any, "with_similarity": query_embedding is not None}
+        entry, cached = await self._acache_lookup(
+            "lexical", query_text, user_id, organization_id, conversation_id, params
+        )
+        if cached is not None:
+            return cached
+        
+        results = await self._asearch_lexical(
+            query_text, top_k, user_id, organization_id, conversation_id, query_embedding, match_any
+        )
+        self._cache_store(entry, results)
+        return results
+    
+    
+    async def _asearch_lexical(
+        self,
+        query_text: str,
+        top_k: int,
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None,
+        query_embedding=None,
+        match_any: bool = False
+    ) -> List[Dict]:
+        """Recherche plein texte asynchrone sans passer par le cache (voir asearch_lexical)"""
+        logger.info(f"🔤 Recherche lexicale: '{query_text[:50]}...'")
+        
+        queries = self._build_lexical_queries(
+            query_text, top_k, user_id, organization_id, conversation_id, query_embedding, match_any
+        )
+        
+        async def search_scope(search_query, params):
+            async with AsyncSessionLocal() as db:
+                return self._format_lexical_rows(await db.execute(search_query, params))
+        
+        results_per_scope = await asyncio.gather(*[
+            search_scope(search_query, params) for _, search_query, params in queries
+        ])
+        results = self._merge_scope_results(results_per_scope, top_k, key="lexical_rank")
+        
+        logger.info(f"  ✅ {len(results)} résultats lexicaux")
+        
+        return results
+    
+    
+    def search_hybrid(
+        self,
+        query_text: str,
+        top_k: int = 5,
+        similarity_threshold: float = 0.0,
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None
+    ) -> List[Dict]:
+        """
+        Recherche hybride : classements vectoriel et plein texte fusionnés (RRF)
+        
+        Le seuil de similarité ne s'applique qu'aux candidats vectoriels : un
+        chunk contenant les termes de la requête est gardé même si son
+        embedding est éloigné (cas des acronymes).
+        
+        Returns:
+            Chunks triés par rrf_score, avec similarity et lexical_rank (None
+            si le chunk n'a pas de correspondance lexicale). Une recherche de
+            terme exact trouvée par l'index plein texte seul renvoie ses
+            résultats sans rrf_score ni similarity, marqués term_match
+        """
+        params = self._hybrid_params(query_text, top_k, similarity_threshold)
+        entry, cached = self._cache_lookup("hybrid", query_text, user_id, organization_id, conversation_id, params)
+        if cached is not None:
+            return cached
+        
+        results = self._search_hybrid(query_text, top_k, similarity_threshold, user_id, organization_id, conversation_id)
+        self._cache_store(entry, results)
+        return results
+    
+    
+    def _search_hybrid(
+        self,
+        query_text: str,
+        top_k: int,
+        similarity_threshold: float,
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None
+    ) -> List[Dict]:
+        """Recherche hybride sans passer par le cache (voir search_hybrid)"""
+        from config import settings
+        
+        if self.is_term_lookup(query_text):
+            results = self._search_lexical(query_text, top_k, user_id, organization_id, conversation_id)
+            if results:
+                return self._mark_term_matches(results)
+        
+        vector_results = self._search_similar(
+            query_text, top_k, similarity_threshold, user_id, organization_id, conversation_id
+        )
+        lexical_results = self._search_lexical(
+            query_text, top_k, user_id, organization_id, conversation_id, match_any=True
+        )
+        return self._fuse_rankings([vector_results, lexical_results], top_k, settings.hybrid_rrf_k)
+    
+    
+    async def asearch_hybrid(
+        self,
+        query_text: str,
+        top_k: int = 5,
+        similarity_threshold: float = 0.0,
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None,
+        query_embedding=None
+    ) -> List[Dict]:
+        """
+        Variante asynchrone de search_hybrid
+        
+        Sans embedding fourni, une recherche de terme exact est d'abord servie
+        par l'index plein texte seul, sans encoder la requête ; l'encodage n'a
+        lieu que si elle ne trouve rien.
+        
+        Args:
+            query_embedding: Embedding déjà calculé de la requête (optionnel)
+        """
+        params = self._hybrid_params(query_text, top_k, similarity_threshold, query_embedding)
+        entry, cached = await self._acache_lookup(
+            "hybrid", query_text, user_id, organization_id, conversation_id, params
+        )
+        if cached is not None:
+            return cached
+        
+        results = await self._asearch_hybrid(
+            query_text, top_k, similarity_threshold, user_id, organization_id, conversation_id, query_embedding
+        )
+        self._cache_store(entry, results)
+        return results
+    
+    
+    async def _asearch_hybrid(
+        self,
+        query_text: str,
+        top_k: int,
+        similarity_threshold: float,
+        user_id: str = None,
+        organization_id: str = None,
+        conversation_id: str = None,
+        query_embedding=None
+    ) -> List[Dict]:
+        """Recherche hybride asynchrone sans passer par le cache (voir asearch_hybrid)"""
+        from config import settings
+        
+        if query_embedding is None and self.is_term_lookup(query_text):
+            results = await self._asearch_lexical(query_text, top_k, user_id, organization_id, conversation_id)
+            if results:
+                logger.info("  ⚡ Terme exact trouvé par l'index plein texte (requête non encodée)")
+                return self._mark_term_matches(results)
+        
+        if query_embedding is None:
+            query_embedding = await self.aembed_query(query_text)
+        
+        vector_results, lexical_results = await asyncio.gather(
+            self._asearch_similar(
+                query_text, top_k, similarity_threshold, user_id, organization_id, conversation_id,
+                query_embedding=query_embedding
+            ),
+            self._asearch_lexical(
+                query_text, top_k, user_id, organization_id, conversation_id,
+                query_embedding=query_embedding, match_any=True
+            )
+        )
+        results = self._fuse_rankings([vector_results, lexical_results], top_k, settings.hybrid_rrf_k)
+        
+        logger.info(
+            f"  🔀 Fusion hybride: {len(vector_results)} vectoriels + {len(lexical_results)} lexicaux "
+            f"→ {len(results)} résultats"
+        )
+        
+        return results
+    
+    
+    def _exact_search(
+        self,
+        tenant_key: str,
+        scope_filter: str,
+        params: Dict,
+        query_embedding,
+        top_k: int,
+        similarity_threshold: float,
+        with_embeddings: bool = False,
+        neighbors: int = 0
+    ):
+        """
+        Recherche exacte en mémoire d'une portée (appel bloquant)
+        
+        Returns:
+            Résultats, ou None si le tier est désactivé, la portée trop grande
+            ou en cas d'erreur (l'appelant utilise alors pgvector)
+        """
+        exact_index = get_exact_index()
+        if exact_index is None or tenant_key is None:
+            return None
+        try:
+            return exact_index.search(
+                tenant_key, scope_filter, params, query_embedding, top_k, similarity_threshold,
+                with_embeddings, neighbors
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Recherche exacte {tenant_key} impossible, fallback pgvector: {e}")
+            return None
+    
+    
+    async def _asearch_scope(
+        self,
+        search_query,
+        params: Dict,
+        top_k: int,
+        tenant_key: str = None,
+        scope_filter: str = None,
+        query_embedding=None,
+        similarity_threshold: float = 0.0,
+        with_embeddings: bool = False,
+        neighbors: int = 0
+    ) -> List[Dict]:
+        """
+        Recherche d'une portée : en mémoire si possible, sinon dans sa propre
+        session asyncpg
+        """
+        if tenant_key is not None and get_exact_index() is not None:
+            # Executor borné : le chargement d'un tenant froid (count + lecture
+            # de tous ses chunks) n'occupe pas le pool par défaut de la boucle
+            exact = await run_in_executor(
+                get_embedding_executor(), self._exact_search, tenant_key, scope_filter, params, query_embedding, top_k,
+                similarity_threshold, with_embeddings, neighbors
+            )
+            if exact is not None:
+                return exact
+        
+        async with AsyncSessionLocal() as db:
+            await self._aapply_search_settings(db, top_k)
+            result = await db.execute(search_query, params)
+            return self._format_search_rows(result, with_embeddings, bool(neighbors))
 
 
 # Instance globale
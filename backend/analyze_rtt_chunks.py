@@ -27,9 +27,7 @@ def analyze_rtt_in_documents():
                 LENGTH(dc.content) as content_length
             FROM document_chunks dc
             JOIN documents d ON dc.document_id = d.id
-            WHERE LOWER(dc.content) LIKE '%rtt%'
-            OR LOWER(dc.content) LIKE '%réduction du temps de travail%'
-            OR LOWER(dc.content) LIKE '%reduction du temps%'
+            WHERE dc.content_tsv @@ websearch_to_tsquery('french', 'rtt OR "réduction du temps de travail" OR "reduction du temps"')
             ORDER BY d.filename, dc.chunk_index
         """)
         
@@ -3,15 +3,37 @@ API Routes pour le chat RAG
 Endpoint principal pour conversations avec LLM + recherche vectorielle
 """
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, AsyncIterator, Tuple
+import asyncio
+import json
+import time
 import logging
 from ai.vector_store import get_vector_store
 from ai.llm_factory import get_llm_generator
+from ai.health_monitor import get_llm_health_monitor
+from ai.answer_cache import get_answer_cache
+from ai.search_cache import get_search_cache
+from ai.chunk_embedding_cache import get_chunk_embedding_cache
+from ai.exact_index import get_exact_index
+from ai.reranker import get_reranker
+from utils.concurrency import get_embedding_executor, run_in_executor
+from ai.conversation_memory import get_conversation_memory
+from utils.pipeline import StagedPipeline
+from config import settings
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Seuil à 0.35 (35%) : en dessous, la similarité est trop faible pour être pertinente
+RELEVANCE_THRESHOLD = 0.35
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"  # Désactiver le buffering des reverse proxies
+}
+
 
 class HistoryMessage(BaseModel):
     """Message de l'historique de conversation"""
@@ -52,6 +74,213 @@ class ChatResponse(BaseModel):
     confidence: float
     context_used: int
     chunks_found: int
+    cached: bool = False
+    timings: Optional[Dict[str, float]] = Field(default=None, description="Durée de chaque étape du pipeline (ms)")
+
+
+async def _retrieve_relevant_chunks(request: ChatRequest, query_embedding=None) -> List[Dict]:
+    """
+    Recherche vectorielle ou hybride (filtrage user/organisation/conversation)
+    puis filtrage des chunks par seuil de pertinence
+    
+    En mode hybride, une recherche de terme exact ("RTT") trouvée par l'index
+    plein texte seul (term_match, requête non encodée) est gardée sans seuil :
+    ces chunks n'ont pas de similarité cosine et reçoivent le seuil de
+    pertinence comme score (confiance modérée). Les autres chunks, y compris
+    les correspondances lexicales de la fusion, doivent atteindre le seuil.
+    """
+    vector_store = get_vector_store()
+    logger.info(f"   🔍 Recherche avec conversation_id={request.conversation_id}")
+    search = vector_store.asearch_hybrid if settings.retrieval_mode == "hybrid" else vector_store.asearch_similar
+    chunks = await search(
+        query_text=request.user_query,
+        top_k=request.top_k,
+        similarity_threshold=0.0,  # Récupérer tous les chunks pour filtrer ensuite
+        user_id=request.user_id,
+        organization_id=request.organization_id,
+        conversation_id=request.conversation_id,
+        query_embedding=query_embedding
+    )
+    logger.info(f"   📦 {len(chunks)} chunks trouvés")
+    
+    for chunk in chunks:
+        if chunk.get('term_match') and chunk['similarity'] is None:
+            chunk['similarity'] = RELEVANCE_THRESHOLD
+    
+    return [
+        chunk for chunk in chunks
+        if chunk.get('term_match') or (chunk['similarity'] is not None and chunk['similarity'] >= RELEVANCE_THRESHOLD)
+    ]
+
+
+def _retrieval_params(request: ChatRequest) -> Dict:
+    """Paramètres qui déterminent les chunks du contexte (clé du cache de réponses)"""
+    return {
+        "top_k": request.top_k,
+        "similarity_threshold": request.similarity_threshold,
+        "relevance_threshold": RELEVANCE_THRESHOLD,
+        "retrieval_mode": settings.retrieval_mode,
+        "hybrid_rrf_k": settings.hybrid_rrf_k,
+        "rerank": [settings.rerank_enabled, settings.rerank_model, settings.rerank_top_n],
+        "mmr": [settings.mmr_enabled, settings.mmr_lambda, settings.mmr_fetch_factor]
+    }
+
+
+async def _lookup_cached_answer(request: ChatRequest, llm, query_embedding) -> Tuple[Optional[str], Optional[Dict]]:
+    """
+    Cherche une réponse en cache pour une question similaire (même portée,
+    même version du corpus, même historique, mêmes paramètres de recherche)
+    
+    Returns:
+        Tuple (clé de portée, réponse en cache ou None). Clé None si cache désactivé.
+    """
+    cache = get_answer_cache()
+    if cache is None:
+        return None, None
+    
+    scope_key = await asyncio.to_thread(
+        cache.build_scope_key,
+        llm.model,
+        request.organization_id,
+        request.user_id,
+        request.conversation_id,
+        request.history,
+        request.temperature,
+        _retrieval_params(request)
+    )
+    cached = await asyncio.to_thread(cache.lookup, scope_key, query_embedding)
+    return scope_key, cached
+
+
+async def _store_cached_answer(scope_key: Optional[str], query_embedding, payload: Dict) -> None:
+    """Enregistre une réponse générée dans le cache (si activé)"""
+    cache = get_answer_cache()
+    if cache is None or scope_key is None:
+        return
+    await asyncio.to_thread(cache.store, scope_key, query_embedding, payload)
+
+
+def _sse_event(event: str, data: Dict) -> str:
+    """Formate un événement Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _cached_event_stream(request: ChatRequest, cached: Dict, start_time: float) -> AsyncIterator[str]:
+    """Rejoue une réponse en cache avec les mêmes événements que le streaming"""
+    yield _sse_event("sources", {
+        "query": request.user_query,
+        "mode": "rag" if cached.get("sources") else "general",
+        "sources": cached.get("sources", []),
+        "confidence": cached.get("confidence", 0.0),
+        "context_used": cached.get("context_used", 0),
+        "chunks_found": cached.get("chunks_found", 0)
+    })
+    yield _sse_event("token", {"text": cached["answer"]})
+    
+    total_ms = round((time.perf_counter() - start_time) * 1000, 1)
+    yield _sse_event("done", {
+        "time_to_first_token_ms": total_ms,
+        "generation_ms": 0.0,
+        "total_ms": total_ms,
+        "answer_length": len(cached["answer"]),
+        "cached": True
+    })
+
+
+def _build_chat_pipeline(request: ChatRequest, name: str) -> StagedPipeline:
+    """
+    Étapes communes à /chat et /chat/stream jusqu'au prompt préparé
+    
+    embed ──┬── cache ──────────────┐
+            └── retrieve ── rerank ─┤
+    history ────────────────────────┼── prepare
+    llm_ready ──────────────────────┘
+    
+    La recherche vectorielle démarre en même temps que la consultation du
+    cache de réponses : un miss ne paie pas les deux allers-retours en série
+    (un hit gaspille une recherche). L'étape prepare renvoie None sur un hit.
+    L'étape rerank (cross-encoder, si activé) ne garde que les meilleurs chunks.
+    
+    En mode hybride, la recherche d'un terme exact ("RTT") n'encode pas la
+    question : embed renvoie None, le cache de réponses (sémantique) est
+    ignoré et la recherche passe d'abord par l'index plein texte.
+    """
+    vector_store = get_vector_store()
+    llm = get_llm_generator()
+    
+    async def embed():
+        if settings.retrieval_mode == "hybrid" and vector_store.is_term_lookup(request.user_query):
+            return None
+        return await vector_store.aembed_query(request.user_query)
+    
+    async def history():
+        # Historique borné (anciens échanges remplacés par un résumé)
+        return await get_conversation_memory().compact(request.conversation_id, request.history)
+    
+    async def llm_ready():
+        # État en cache du moniteur, sans appel réseau
+        return get_llm_health_monitor().is_available()
+    
+    async def cache(embed):
+        if embed is None:
+            return None, None
+        return await _lookup_cached_answer(request, llm, embed)
+    
+    async def retrieve(embed):
+        return await _retrieve_relevant_chunks(request, embed)
+    
+    async def rerank(cache, retrieve):
+        _, cached = cache
+        if not settings.rerank_enabled or cached is not None or not retrieve:
+            return retrieve
+        # CPU : executor embeddings (le modèle est chargé au démarrage)
+        try:
+            return await run_in_executor(
+                get_embedding_executor(), lambda: get_reranker().rerank(request.user_query, retrieve)
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Re-classement impossible, chunks de la recherche conservés: {e}")
+            return retrieve
+    
+    async def prepare(cache, rerank, history, llm_ready):
+        _, cached = cache
+        if cached is not None:
+            return None
+        
+        if not llm_ready:
+            raise HTTPException(
+                status_code=503,
+                detail="Le service LLM (Ollama) n'est pas disponible. Veuillez vérifier qu'Ollama est installé et démarré."
+            )
+        
+        logger.info(f"  💬 Historique: {len(request.history)} messages ({len(history)} dans le prompt)")
+        
+        # Décider du mode : RAG (documents pertinents) ou Général (connaissance du modèle)
+        if rerank:
+            logger.info(f"  📚 Mode RAG - {len(rerank)} chunks pertinents (score > {RELEVANCE_THRESHOLD})")
+            return llm.prepare_rag_prompt(
+                query=request.user_query,
+                context_chunks=rerank,
+                conversation_history=history,
+                conversation_id=request.conversation_id
+            )
+        
+        logger.info(f"  🧠 Mode Général - Aucun document pertinent (seuil: {RELEVANCE_THRESHOLD})")
+        return llm.prepare_general_prompt(
+            query=request.user_query,
+            conversation_history=history,
+            conversation_id=request.conversation_id
+        )
+    
+    pipeline = StagedPipeline(name)
+    pipeline.stage("embed", embed)
+    pipeline.stage("history", history)
+    pipeline.stage("llm_ready", llm_ready)
+    pipeline.stage("cache", cache, depends_on=["embed"])
+    pipeline.stage("retrieve", retrieve, depends_on=["embed"])
+    pipeline.stage("rerank", rerank, depends_on=["cache", "retrieve"])
+    pipeline.stage("prepare", prepare, depends_on=["cache", "rerank", "history", "llm_ready"])
+    return pipeline
 
 
 @router.post("/chat", response_model=ChatResponse)
@@ -59,11 +288,12 @@ async def chat(request: ChatRequest):
     """
     Endpoint principal du chat RAG
     
-    Process:
-    1. Recherche chunks similaires dans pgvector
-    2. Construit contexte à partir des chunks
-    3. Génère réponse avec LLM + contexte
-    4. Retourne réponse + sources citées
+    Process (étapes indépendantes exécutées en parallèle, voir _build_chat_pipeline):
+    1. Embedding de la question, historique borné, état du LLM
+    2. Cache de réponses et recherche des chunks similaires dans pgvector
+    3. Re-classe les chunks (cross-encoder, si activé) et construit le contexte
+    4. Génère réponse avec LLM + contexte
+    5. Retourne réponse + sources citées (+ durée de chaque étape)
     
     Args:
         request: ChatRequest avec query, top_k, similarity_threshold
@@ -75,67 +305,43 @@ async def chat(request: ChatRequest):
     logger.info(f"   🔑 user_id: {request.user_id}, org_id: {request.organization_id}, conv_id: {request.conversation_id}")
     
     try:
-        # 1. Recherche vectorielle (avec filtrage par user_id et organization_id si fourni)
-        vector_store = get_vector_store()
-        logger.info(f"   🔍 Recherche avec conversation_id={request.conversation_id}")
-        chunks = vector_store.search_similar(
-            query_text=request.user_query,
-            top_k=request.top_k,
-            similarity_threshold=0.0,  # Récupérer tous les chunks pour filtrer ensuite
-            user_id=request.user_id,
-            organization_id=request.organization_id,
-            conversation_id=request.conversation_id
-        )
-        logger.info(f"   📦 {len(chunks)} chunks trouvés")
+        llm = get_llm_generator()
         
-        # Filtrer les chunks par seuil de similarité pour déterminer la pertinence
-        # Seuil à 0.35 (35%) : en dessous, la similarité est trop faible pour être pertinente
-        RELEVANCE_THRESHOLD = 0.35
-        relevant_chunks = [chunk for chunk in chunks if chunk['similarity'] >= RELEVANCE_THRESHOLD]
+        async def generate(prepare):
+            if prepare is None:
+                return None
+            return await llm.agenerate_response(prepare)
         
-        # 2. Vérifier la disponibilité du LLM
-        llm = get_llm_generator()
-        if not llm.check_health():
-            raise HTTPException(
-                status_code=503,
-                detail="Le service LLM (Ollama) n'est pas disponible. Veuillez vérifier qu'Ollama est installé et démarré."
-            )
+        pipeline = _build_chat_pipeline(request, "chat")
+        pipeline.stage("generate", generate, depends_on=["prepare"])
+        results = await pipeline.run()
         
-        # 3. Décider du mode : RAG (documents pertinents) ou Général (connaissance du modèle)
-        if relevant_chunks:
-            # MODE RAG : Documents pertinents trouvés
-            logger.info(f"  📚 Mode RAG - {len(relevant_chunks)} chunks pertinents (score > {RELEVANCE_THRESHOLD})")
-            logger.info(f"  💬 Historique: {len(request.history)} messages")
-            
-            rag_result = llm.generate_rag_response(
-                query=request.user_query,
-                context_chunks=relevant_chunks,
-                max_context_length=3000,
-                conversation_history=request.history
-            )
-            
-        else:
-            # MODE GÉNÉRAL : Pas de documents pertinents, utiliser la connaissance du modèle
-            logger.info(f"  🧠 Mode Général - Aucun document pertinent (seuil: {RELEVANCE_THRESHOLD})")
-            logger.info(f"  💬 Historique: {len(request.history)} messages")
-            
-            # Générer une réponse avec la connaissance générale du modèle
-            rag_result = llm.generate_general_response(
-                query=request.user_query,
-                conversation_history=request.history
-            )
+        scope_key, cached = results["cache"]
+        if cached is not None:
+            return ChatResponse(**{**cached, "query": request.user_query, "cached": True, "timings": pipeline.timings})
+        
+        rag_result = results["generate"]
+        relevant_chunks = results["retrieve"]
         
         logger.info(f"  ✅ Réponse générée (confidence: {rag_result.get('confidence', 100)}%)")
         
-        # 4. Formater la réponse
-        return ChatResponse(
+        # Formater la réponse
+        response = ChatResponse(
             query=request.user_query,
             answer=rag_result["answer"],
             sources=[Source(**s) for s in rag_result.get("sources", [])],
             confidence=rag_result.get("confidence", 100),
             context_used=rag_result.get("context_used", 0),
-            chunks_found=len(relevant_chunks) if relevant_chunks else 0
+            chunks_found=len(relevant_chunks) if relevant_chunks else 0,
+            timings=pipeline.timings
         )
+        
+        if not rag_result.get("failed"):
+            await _store_cached_answer(
+                scope_key, results["embed"], response.model_dump(exclude={"cached", "timings"})
+            )
+        
+        return response
     
     except HTTPException:
         raise
@@ -144,17 +350,128 @@ async def chat(request: ChatRequest):
         raise HTTPException(status_code=500, detail=f"Erreur lors du traitement de la requête: {str(e)}")
 
 
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Variante streaming du chat RAG (Server-Sent Events)
+    
+    Événements émis:
+    - sources: sources retenues, confiance et mode (envoyé avant la génération)
+    - token: fragment de texte généré ({"text": ...})
+    - done: statistiques (time_to_first_token_ms, total_ms, answer_length,
+      durée des étapes, et métriques de prefill Ollama si disponibles)
+    - error: erreur survenue pendant la génération
+    
+    Args:
+        request: ChatRequest (mêmes paramètres que /chat)
+    
+    Returns:
+        StreamingResponse text/event-stream
+    """
+    logger.info(f"💬 Chat stream request: '{request.user_query[:50]}...'")
+    start_time = time.perf_counter()
+    
+    try:
+        # Recherche et vérification LLM avant d'ouvrir le flux pour renvoyer
+        # un vrai code HTTP en cas d'erreur
+        llm = get_llm_generator()
+        pipeline = _build_chat_pipeline(request, "chat_stream")
+        results = await pipeline.run()
+        
+        scope_key, cached = results["cache"]
+        if cached is not None:
+            return StreamingResponse(
+                _cached_event_stream(request, cached, start_time),
+                media_type="text/event-stream",
+                headers=SSE_HEADERS
+            )
+        
+        query_embedding = results["embed"]
+        relevant_chunks = results["retrieve"]
+        prepared = results["prepare"]
+        mode = "rag" if relevant_chunks else "general"
+        
+        logger.info(f"  📡 Streaming en mode {mode} ({prepared['context_used']} chunks de contexte)")
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Erreur chat stream: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur lors du traitement de la requête: {str(e)}")
+    
+    async def event_stream() -> AsyncIterator[str]:
+        yield _sse_event("sources", {
+            "query": request.user_query,
+            "mode": mode,
+            "sources": prepared["sources"],
+            "confidence": prepared["confidence"],
+            "context_used": prepared["context_used"],
+            "chunks_found": len(relevant_chunks)
+        })
+        
+        generation_start = time.perf_counter()
+        first_token_ms = None
+        answer_length = 0
+        answer_parts = []
+        llm_metrics = {}
+        
+        try:
+            async for token in llm.agenerate_stream_prepared(prepared, metrics=llm_metrics):
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - generation_start) * 1000
+                    logger.info(f"  ⚡ Premier token après {first_token_ms:.0f} ms")
+                answer_length += len(token)
+                answer_parts.append(token)
+                yield _sse_event("token", {"text": token})
+        
+        except Exception as e:
+            logger.error(f"❌ Erreur génération streaming: {e}")
+            llm.notify_failure(e)
+            yield _sse_event("error", {"detail": f"Erreur lors de la génération de la réponse: {str(e)}"})
+            return
+        
+        total_ms = (time.perf_counter() - start_time) * 1000
+        logger.info(f"  ✅ Streaming terminé en {total_ms:.0f} ms ({answer_length} caractères)")
+        yield _sse_event("done", {
+            "time_to_first_token_ms": round(first_token_ms, 1) if first_token_ms is not None else None,
+            "generation_ms": round((time.perf_counter() - generation_start) * 1000, 1),
+            "total_ms": round(total_ms, 1),
+            "answer_length": answer_length,
+            "cached": False,
+            "timings": pipeline.timings,
+            **llm_metrics
+        })
+        
+        await _store_cached_answer(scope_key, query_embedding, {
+            "query": request.user_query,
+            "answer": "".join(answer_parts).strip(),
+            "sources": prepared["sources"],
+            "confidence": prepared["confidence"],
+            "context_used": prepared["context_used"],
+            "chunks_found": len(relevant_chunks)
+        })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
 @router.get("/chat/health")
 async def chat_health():
     """
     Vérifie la santé du service de chat
     
+    L'état du LLM provient du moniteur en arrière-plan (aucune sonde ici)
+    
     Returns:
         Status du LLM (Ollama) et du vector store
     """
     try:
         llm = get_llm_generator()
-        ollama_available = llm.check_health()
+        monitor = get_llm_health_monitor()
+        ollama_available = monitor.is_available()
         
         vector_store = get_vector_store()
         
@@ -162,8 +479,17 @@ async def chat_health():
             "status": "healthy" if ollama_available else "degraded",
             "ollama_available": ollama_available,
             "ollama_model": llm.model,
+            "llm_health": monitor.snapshot(),
             "vector_store_initialized": True,
             "embedding_dim": vector_store.embedding_dim,
+            "embedding_cache": vector_store.embeddings.cache_stats(),
+            "embedding_batching": vector_store.embeddings.batching_stats(),
+            "answer_cache": get_answer_cache().stats() if get_answer_cache() else None,
+            "prefix_cache": llm.prefix_tracker.stats() if hasattr(llm, "prefix_tracker") else None,
+            "exact_search": get_exact_index().stats() if get_exact_index() else None,
+            "search_cache": get_search_cache().stats() if get_search_cache() else None,
+            "chunk_embedding_cache": get_chunk_embedding_cache().stats() if get_chunk_embedding_cache() else None,
+            "reranker": get_reranker().stats() if settings.rerank_enabled else None,
             "message": "Service chat opérationnel" if ollama_available else "Ollama non disponible - installez et démarrez Ollama"
         }
     
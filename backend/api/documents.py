@@ -4,12 +4,23 @@ Upload, parsing PDF, gestion fichiers
 """
 from fastapi import APIRouter, UploadFile, File, HTTPException, Query
 from fastapi.responses import JSONResponse
-import pypdf
-import pdfplumber
 import os
+import uuid
+import hashlib
+import asyncio
 import logging
 from pathlib import Path
+from typing import Dict, Optional, Tuple
+from functools import partial
+from sqlalchemy import text
 from ai.vector_store import get_vector_store
+from ai.corpus_version import get_corpus_version_tracker, document_scope_keys
+from ai.exact_index import get_exact_index
+from ai.ingestion import get_ingestion_queue, QueueFullError
+from utils.database import AsyncSessionLocal
+from utils.concurrency import get_document_executor, get_pdf_process_pool, run_in_executor
+from utils.pdf_extraction import extract_pdf_text, PDFExtractionError
+from config import settings
 
 logger = logging.getLogger(__name__)
 if not logger.hasHandlers():
@@ -26,80 +37,268 @@ UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 
 
+def _extract_pdf_text(file_path: Path) -> Tuple[str, int]:
+    """
+    Extrait le texte d'un PDF (plages de pages en parallèle, pypdf puis
+    pdfplumber pour les pages en échec)
+    Fonction bloquante : à exécuter dans l'executor documents (jobs
+    d'ingestion ou aperçu)
+    
+    Returns:
+        Tuple (texte extrait, nombre de pages)
+    
+    Raises:
+        PDFExtractionError: PDF illisible (l'aperçu la convertit en HTTP 500)
+    """
+    try:
+        return extract_pdf_text(file_path, get_pdf_process_pool(), settings.pdf_pages_per_task)
+    except PDFExtractionError as e:
+        logger.error(f"Échec parsing PDF: {e}")
+        raise PDFExtractionError("Impossible de parser le PDF") from e
+
+
+async def _save_upload(file: UploadFile, file_path: Path) -> Tuple[int, str]:
+    """
+    Écrit l'upload sur disque par blocs de taille fixe
+    
+    La mémoire utilisée ne dépend pas de la taille du fichier : chaque bloc
+    est haché (sha256) puis écrit avant la lecture du suivant. L'écriture se
+    fait dans un fichier .part renommé à la fin : un upload refusé ne
+    remplace pas un fichier existant.
+    
+    Returns:
+        Tuple (taille en bytes, empreinte sha256 hexadécimale)
+    
+    Raises:
+        HTTPException: 413 au-delà de UPLOAD_MAX_BYTES, 400 si le fichier est vide
+    """
+    max_bytes = settings.upload_max_bytes
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"Fichier trop volumineux (max {max_bytes // (1024 * 1024)} Mo)"
+    )
+    # Taille annoncée connue : refus sans lire le fichier
+    if file.size is not None and file.size > max_bytes:
+        raise too_large
+    
+    # Écritures hors de l'executor documents : l'upload n'attend pas les indexations en cours
+    part_path = file_path.with_name(file_path.name + ".part")
+    digest = hashlib.sha256()
+    size = 0
+    
+    output = await asyncio.to_thread(open, part_path, "wb")
+    try:
+        while True:
+            block = await file.read(settings.upload_chunk_bytes)
+            if not block:
+                break
+            size += len(block)
+            if size > max_bytes:
+                raise too_large
+            digest.update(block)
+            await asyncio.to_thread(output.write, block)
+        await asyncio.to_thread(output.close)
+        
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Fichier vide")
+        await asyncio.to_thread(os.replace, part_path, file_path)
+    except BaseException:
+        output.close()
+        part_path.unlink(missing_ok=True)
+        raise
+    
+    return size, digest.hexdigest()
+
+
+def _ingest_pdf(
+    document_id: str,
+    file_path: Path,
+    filename: str,
+    file_size: int,
+    scope: str,
+    user_id: str,
+    organization_id: str,
+    conversation_id: str,
+    content_hash: str,
+    progress
+) -> Dict:
+    """
+    Ingestion complète d'un PDF : parsing → chunking → embeddings → stockage
+    Fonction bloquante exécutée par la file d'ingestion
+    
+    La ligne documents (document_id, 'pending') est créée à la mise en file :
+    indexing_status passe à 'processing' au parsing, puis 'completed' ou
+    'failed'. Un fichier identique (même nom, même sha256) déjà indexé dans
+    la même portée n'est pas réindexé : le job rend le document existant.
+    
+    Returns:
+        Résultat du job (document_id, page_count, text_length, duplicate)
+    """
+    vector_store = get_vector_store()
+    existing_id = vector_store.find_indexed_document(
+        content_hash, filename, user_id, organization_id, conversation_id
+    )
+    if existing_id:
+        logger.info(f"♻️ {filename} déjà indexé à l'identique: {existing_id}, indexation ignorée")
+        # Le document existant garde son fichier : la copie et la ligne de cet upload ne servent plus
+        vector_store.discard_pending_document(document_id)
+        file_path.unlink(missing_ok=True)
+        return {
+            "document_id": existing_id,
+            "page_count": None,
+            "text_length": None,
+            "duplicate": True
+        }
+    
+    progress("parsing")
+    vector_store.set_indexing_status(document_id, "processing")
+    try:
+        extracted_text, page_count = _extract_pdf_text(file_path)
+        extracted_text = extracted_text.strip()
+        
+        if not extracted_text:
+            raise ValueError("Aucun texte trouvé dans le PDF (PDF image?)")
+    except Exception as e:
+        # PDF inexploitable : le document reste listé en échec, sans fichier
+        vector_store.set_indexing_status(document_id, "failed", str(e))
+        file_path.unlink(missing_ok=True)
+        raise
+    
+    progress("parsing", done=page_count, total=page_count)
+    logger.info(f"✅ PDF parsé avec succès: {filename}")
+    logger.info(f"➡️ conversation_id={conversation_id}, user_id={user_id}, organization_id={organization_id}")
+    
+    document_id = vector_store.store_document(
+        filename=filename,
+        content=extracted_text,
+        file_path=str(file_path),
+        file_type="pdf",
+        file_size=file_size,
+        page_count=page_count,
+        scope=scope,
+        user_id=user_id,
+        organization_id=organization_id,
+        conversation_id=conversation_id,
+        progress=progress,
+        content_hash=content_hash,
+        document_id=document_id
+    )
+    logger.info(f"✅ Document {filename} indexé: {document_id} (conversation_id={conversation_id})")
+    
+    return {
+        "document_id": document_id,
+        "page_count": page_count,
+        "text_length": len(extracted_text),
+        "duplicate": False
+    }
+
+
 @router.post("/upload")
 async def upload_document(
     file: UploadFile = File(...),
     auto_index: bool = Query(True, description="Automatically index document (chunking + embeddings)"),
+    wait: bool = Query(False, description="Wait for indexing to finish instead of returning 202 with a job id"),
     user_id: str = Query(None, description="User ID who owns this document"),
     organization_id: str = Query(None, description="Organization ID for shared documents"),
     conversation_id: str = Query(None, description="Conversation ID for private chat documents")
 ):
     """
-    Upload et parse un document PDF
+    Upload d'un document PDF
+    
+    Avec auto_index, le fichier est enregistré puis indexé en arrière-plan :
+    la réponse (202) contient un job_id dont l'avancement se consulte sur
+    GET /api/documents/jobs/{job_id}. Avec wait=true, la réponse attend la
+    fin de l'indexation (documents joints à une question dans le chat).
     
     Args:
         file: Fichier PDF à uploader
-        auto_index: Si True, indexe automatiquement (chunking + embeddings)
+        auto_index: Si True, indexe le document (chunking + embeddings)
+        wait: Attendre la fin de l'indexation avant de répondre
         user_id: ID de l'utilisateur propriétaire (pour documents personnels)
         organization_id: ID de l'organisation (pour documents partagés)
     
     Returns:
         - filename: Nom du fichier
         - size: Taille en bytes
-        - text_preview: Aperçu du texte extrait
-        - page_count: Nombre de pages
+        - job_id / status_url: Job d'indexation (auto_index)
         - indexed: Si le document a été indexé
-        - document_id: ID du document si indexé
-        - chunks_count: Nombre de chunks si indexé
+        - document_id: ID du document (ligne créée dès la mise en file, indexing_status 'pending')
+        - text_preview / page_count: Aperçu du texte (sans auto_index)
     """
     # Vérifier que c'est bien un PDF
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Seuls les fichiers PDF sont acceptés")
     
-    # Sauvegarder le fichier temporairement
-    file_path = UPLOAD_DIR / file.filename
+    queue = get_ingestion_queue()
+    if auto_index and queue.is_full():
+        raise HTTPException(status_code=503, detail="Trop de documents en attente d'indexation, réessayez plus tard")
+    
+    # Un fichier par upload : un upload concurrent du même nom ne remplace pas
+    # le fichier qu'un job en file n'a pas encore lu (le nom reste en métadonnée)
+    file_path = UPLOAD_DIR / f"{uuid.uuid4()}.pdf"
+    document_id = None
+    job = None
     
     try:
-        # Écrire le fichier sur disque
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        file_size = len(content)
-        logger.info(f"Fichier sauvegardé : {file.filename} ({file_size} bytes)")
+        file_size, sha256 = await _save_upload(file, file_path)
+        logger.info(f"Fichier sauvegardé : {file.filename} ({file_size} bytes, sha256 {sha256[:12]}...)")
         
-        # Parser le PDF - Méthode 1: pypdf (plus rapide)
-        extracted_text = ""
-        page_count = 0
-        
-        try:
-            with open(file_path, "rb") as pdf_file:
-                pdf_reader = pypdf.PdfReader(pdf_file)
-                page_count = len(pdf_reader.pages)
-                
-                # Extraire texte de toutes les pages
-                for page in pdf_reader.pages:
-                    extracted_text += page.extract_text() + "\n"
-                
-                logger.info(f"pypdf: {page_count} pages, {len(extracted_text)} caractères")
+        response = {
+            "success": True,
+            "filename": file.filename,
+            "size_bytes": file_size,
+            "sha256": sha256,
+            "file_path": str(file_path),
+            "indexed": False
+        }
         
-        except Exception as e:
-            logger.warning(f"pypdf a échoué, tentative avec pdfplumber: {e}")
+        # Indexation en arrière-plan : la durée de l'upload ne dépend plus de la taille du document
+        if auto_index:
+            logger.info(f"🚀 Indexation automatique activée pour {file.filename}")
+            scope = "organization" if organization_id else ("user" if user_id else "conversation")
+            # Document listé (indexing_status 'pending') dès la mise en file
+            document_id = await asyncio.to_thread(
+                get_vector_store().create_pending_document,
+                file.filename, str(file_path), "pdf", file_size, scope,
+                user_id, organization_id, conversation_id, sha256
+            )
+            job = await queue.submit(
+                file.filename,
+                partial(
+                    _ingest_pdf, document_id, file_path, file.filename, file_size, scope,
+                    user_id, organization_id, conversation_id, sha256
+                )
+            )
+            response["document_id"] = document_id
+            response["job_id"] = job["job_id"]
+            response["status_url"] = f"/api/documents/jobs/{job['job_id']}"
             
-            # Fallback: pdfplumber (plus robuste pour PDFs complexes)
-            try:
-                with pdfplumber.open(file_path) as pdf:
-                    page_count = len(pdf.pages)
-                    for page in pdf.pages:
-                        text = page.extract_text()
-                        if text:
-                            extracted_text += text + "\n"
-                    
-                    logger.info(f"pdfplumber: {page_count} pages, {len(extracted_text)} caractères")
+            if not wait:
+                response["status"] = job["status"]
+                response["message"] = "Document uploadé, indexation en cours"
+                return JSONResponse(status_code=202, content=response)
             
-            except Exception as e2:
-                logger.error(f"Échec parsing PDF: {e2}")
-                raise HTTPException(status_code=500, detail="Impossible de parser le PDF")
+            job = await queue.wait(job["job_id"])
+            response["status"] = job["status"]
+            if job["status"] == "completed":
+                response.update(job["result"])
+                response["indexed"] = True
+                if job["result"]["duplicate"]:
+                    response["message"] = "Document identique déjà indexé, indexation ignorée"
+                else:
+                    response["message"] = f"Document uploadé et indexé avec succès ({job['result']['page_count']} pages)"
+            else:
+                response["indexing_error"] = job["error"]
+                response["message"] = "Document uploadé mais erreur lors de l'indexation"
+            return response
+        
+        # Sans indexation : parser le PDF hors de la boucle asyncio (CPU-bound) pour l'aperçu
+        try:
+            extracted_text, page_count = await run_in_executor(
+                get_document_executor(), _extract_pdf_text, file_path
+            )
+        except PDFExtractionError as e:
+            raise HTTPException(status_code=500, detail=str(e))
         
         # Nettoyer le texte
         extracted_text = extracted_text.strip()
@@ -112,59 +311,56 @@ async def upload_document(
         
         logger.info(f"✅ PDF parsé avec succès: {file.filename}")
         
-        # Préparer la réponse de base
-        response = {
-            "success": True,
-            "filename": file.filename,
-            "size_bytes": file_size,
+        response.update({
             "page_count": page_count,
             "text_length": len(extracted_text),
-            "text_preview": text_preview,
-            "file_path": str(file_path),
-            "indexed": False
-        }
-        
-        # Si auto_index activé, indexer le document
-        if auto_index:
-            try:
-                logger.info(f"🚀 Indexation automatique activée pour {file.filename}")
-                logger.info(f"➡️ conversation_id={conversation_id}, user_id={user_id}, organization_id={organization_id}")
-                # Obtenir le VectorStore
-                vector_store = get_vector_store()
-                # Stocker document + chunks + embeddings
-                document_id = vector_store.store_document(
-                    filename=file.filename,
-                    content=extracted_text,
-                    file_path=str(file_path),
-                    file_type="pdf",
-                    file_size=file_size,
-                    page_count=page_count,
-                    scope="organization" if organization_id else ("user" if user_id else "conversation"),
-                    user_id=user_id,
-                    organization_id=organization_id,
-                    conversation_id=conversation_id
-                )
-                logger.info(f"✅ Document {file.filename} indexé: {document_id} (conversation_id={conversation_id})")
-                response["indexed"] = True
-                response["document_id"] = document_id
-                response["message"] = f"Document uploadé et indexé avec succès ({page_count} pages)"
-            except Exception as e:
-                logger.error(f"❌ Erreur indexation: {e}")
-                response["indexed"] = False
-                response["indexing_error"] = str(e)
-                response["message"] = "Document uploadé mais erreur lors de l'indexation"
-        
+            "text_preview": text_preview
+        })
         return response
     
     except HTTPException:
-        # Re-raise les erreurs HTTP
+        # Re-raise les erreurs HTTP (upload supprimé s'il n'a pas été confié à un job)
+        if job is None:
+            await _discard_upload(file_path, document_id)
         raise
     
+    except QueueFullError as e:
+        await _discard_upload(file_path, document_id)
+        raise HTTPException(status_code=503, detail=str(e))
+    
     except Exception as e:
         logger.error(f"Erreur upload: {e}")
+        if job is None:
+            await _discard_upload(file_path, document_id)
         raise HTTPException(status_code=500, detail=f"Erreur serveur: {str(e)}")
 
 
+async def _discard_upload(file_path: Path, document_id: Optional[str]) -> None:
+    """Supprime le fichier (et la ligne 'pending') d'un upload qui ne sera pas indexé"""
+    file_path.unlink(missing_ok=True)
+    if document_id is not None:
+        try:
+            await asyncio.to_thread(get_vector_store().discard_pending_document, document_id)
+        except Exception as e:
+            logger.error(f"❌ Ligne d'upload {document_id} non supprimée: {e}")
+
+
+@router.get("/jobs/{job_id}")
+async def get_ingestion_job(job_id: str):
+    """
+    État d'un job d'indexation
+    
+    Returns:
+        status (queued, running, completed, failed), étape courante et
+        avancement de chaque étape (parsing, chunking, embedding, storing :
+        status, done/total, horodatages), résultat ou erreur
+    """
+    job = await get_ingestion_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job d'indexation introuvable (inconnu ou expiré)")
+    return job
+
+
 @router.get("/documents")
 async def list_documents(
     user_id: str = Query(None, description="Filter by user ID"),
@@ -172,10 +368,7 @@ async def list_documents(
 ):
     """Liste tous les documents uploadés depuis la base de données"""
     try:
-        from utils.database import SessionLocal
-        from sqlalchemy import text
-        
-        with SessionLocal() as db:
+        async with AsyncSessionLocal() as db:
             # Récupérer les documents :
             # - Documents publics (scope='organization') de l'organisation de l'utilisateur
             # - Documents personnels (scope='user') appartenant à l'utilisateur
@@ -185,7 +378,8 @@ async def list_documents(
                     file_size,
                     EXTRACT(EPOCH FROM uploaded_at) as uploaded_at,
                     is_indexed,
-                    scope
+                    scope,
+                    indexing_status
                 FROM documents
                 WHERE (
                     (scope = 'organization' AND organization_id = :org_id)
@@ -194,7 +388,7 @@ async def list_documents(
                 ORDER BY uploaded_at DESC
             """)
             
-            result = db.execute(query, {
+            result = await db.execute(query, {
                 "org_id": organization_id,
                 "user_id": user_id
             })
@@ -206,7 +400,8 @@ async def list_documents(
                     "file_size": row[1],
                     "uploaded_at": row[2],
                     "is_indexed": row[3],
-                    "scope": row[4]
+                    "scope": row[4],
+                    "indexing_status": row[5]
                 })
         
         return {
@@ -227,27 +422,25 @@ async def delete_document(
     role: str = Query(None, description="User role (ADMIN or MEMBER)")
 ):
     """Supprime un document uploadé de la base et du disque avec vérification des permissions"""
-    from utils.database import SessionLocal
-    from sqlalchemy import text
-    
     try:
-        with SessionLocal() as db:
+        async with AsyncSessionLocal() as db:
             # Vérifier si le document existe et récupérer ses infos
             check_query = text("""
-                SELECT id, file_path, user_id, organization_id, scope 
+                SELECT id, file_path, user_id, organization_id, scope, conversation_id
                 FROM documents 
                 WHERE filename = :filename
             """)
-            result = db.execute(check_query, {"filename": filename}).fetchone()
+            result = (await db.execute(check_query, {"filename": filename})).fetchone()
             
             if not result:
                 raise HTTPException(status_code=404, detail="Document non trouvé dans la base de données")
             
             document_id = result[0]
             file_path_db = result[1]
-            doc_user_id = result[2]
-            doc_org_id = result[3]
+            doc_user_id = str(result[2]) if result[2] is not None else None  # asyncpg renvoie des UUID
+            doc_org_id = str(result[3]) if result[3] is not None else None
             doc_scope = result[4]
+            doc_conversation_id = str(result[5]) if result[5] is not None else None
             
             # Vérification des permissions
             can_delete = False
@@ -268,17 +461,28 @@ async def delete_document(
             
             # Supprimer les chunks associés (CASCADE devrait le faire mais soyons explicites)
             delete_chunks_query = text("DELETE FROM document_chunks WHERE document_id = :document_id")
-            db.execute(delete_chunks_query, {"document_id": document_id})
+            await db.execute(delete_chunks_query, {"document_id": document_id})
             
             # Supprimer le document de la base
             delete_doc_query = text("DELETE FROM documents WHERE id = :document_id")
-            db.execute(delete_doc_query, {"document_id": document_id})
-            db.commit()
+            await db.execute(delete_doc_query, {"document_id": document_id})
+            await db.commit()
             
             logger.info(f"Document supprimé de la DB: {filename} (user: {user_id}, role: {role})")
         
-        # Supprimer le fichier du disque
-        file_path = UPLOAD_DIR / filename
+        # Invalider les caches dépendant des portées de ce document
+        new_versions = await asyncio.to_thread(
+            get_corpus_version_tracker().bump,
+            document_scope_keys(doc_scope, doc_org_id, doc_user_id, doc_conversation_id)
+        )
+        
+        # Retirer le document des matrices de recherche exacte chargées
+        exact_index = get_exact_index()
+        if exact_index is not None:
+            exact_index.remove_document(new_versions, str(document_id))
+        
+        # Supprimer le fichier du disque (fichier nommé par upload, ou par nom pour les anciens documents)
+        file_path = UPLOAD_DIR / Path(file_path_db).name if file_path_db else UPLOAD_DIR / filename
         if file_path.exists():
             os.remove(file_path)
             logger.info(f"Fichier supprimé du disque: {filename}")
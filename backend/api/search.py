@@ -2,10 +2,11 @@
 API Routes pour recherche et chat
 """
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 import logging
 from ai.vector_store import get_vector_store
+from config import settings
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -14,8 +15,11 @@ router = APIRouter()
 class SearchRequest(BaseModel):
     """Requête de recherche"""
     query: str
-    top_k: int = 5
+    top_k: int = Field(default=5, description="Nombre de résultats max", ge=1, le=100)
     similarity_threshold: float = 0.5
+    # vector : embeddings seuls ; lexical : plein texte seul (sans encodage) ;
+    # hybrid : fusion des deux (termes exacts servis par le plein texte seul)
+    mode: Literal["vector", "lexical", "hybrid"] = "vector"
 
 
 class SearchResult(BaseModel):
@@ -27,35 +31,112 @@ class SearchResult(BaseModel):
     filename: str
     file_type: str
     scope: str
-    similarity: float
+    similarity: Optional[float] = None
+    lexical_rank: Optional[float] = None
+    rrf_score: Optional[float] = None
+
+
+class BatchSearchRequest(BaseModel):
+    """Requête de recherche par lot (filtres communs à toutes les requêtes)"""
+    queries: List[str] = Field(min_length=1)
+    top_k: int = Field(default=5, description="Nombre de résultats max par requête", ge=1, le=100)
+    similarity_threshold: float = 0.5
+    user_id: Optional[str] = None
+    organization_id: Optional[str] = None
+    conversation_id: Optional[str] = None
+
+
+class BatchSearchResult(BaseModel):
+    """Résultats d'une requête du lot"""
+    query: str
+    results: List[SearchResult]
 
 
 @router.post("/search", response_model=List[SearchResult])
 async def search_documents(request: SearchRequest):
     """
-    Recherche par similarité vectorielle dans les documents indexés
+    Recherche dans les documents indexés (vectorielle, plein texte ou hybride)
     
     Args:
         query: Texte de la requête
         top_k: Nombre de résultats max
+        similarity_threshold: Seuil de similarité (0-1, candidats vectoriels)
+        mode: vector, lexical ou hybrid
+    
+    Returns:
+        Liste des chunks les plus pertinents avec scores
+    """
+    try:
+        vector_store = get_vector_store()
+        
+        if request.mode == "lexical":
+            results = await vector_store.asearch_lexical(
+                query_text=request.query,
+                top_k=request.top_k
+            )
+        elif request.mode == "hybrid":
+            results = await vector_store.asearch_hybrid(
+                query_text=request.query,
+                top_k=request.top_k,
+                similarity_threshold=request.similarity_threshold
+            )
+        else:
+            results = await vector_store.asearch_similar(
+                query_text=request.query,
+                top_k=request.top_k,
+                similarity_threshold=request.similarity_threshold
+            )
+        
+        return results
+    
+    except Exception as e:
+        logger.error(f"Erreur recherche: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/batch", response_model=List[BatchSearchResult])
+async def search_documents_batch(request: BatchSearchRequest):
+    """
+    Recherche vectorielle pour un lot de requêtes (évaluations, intégrations)
+    
+    Toutes les requêtes sont encodées en un seul appel au modèle et cherchées
+    en une seule requête SQL, au lieu d'un encodage et d'un aller-retour
+    base de données par requête.
+    
+    Args:
+        queries: Textes des requêtes (max SEARCH_BATCH_MAX_QUERIES)
+        top_k: Nombre de résultats max par requête
         similarity_threshold: Seuil de similarité (0-1)
+        user_id, organization_id, conversation_id: Filtres de portée (optionnels)
     
     Returns:
-        Liste des chunks les plus similaires avec scores
+        Résultats de chaque requête, dans l'ordre du lot
     """
+    if len(request.queries) > settings.search_batch_max_queries:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Lot trop grand: {len(request.queries)} requêtes (max {settings.search_batch_max_queries})"
+        )
+    
     try:
         vector_store = get_vector_store()
         
-        results = vector_store.search_similar(
-            query_text=request.query,
+        results = await vector_store.asearch_many(
+            queries=request.queries,
             top_k=request.top_k,
-            similarity_threshold=request.similarity_threshold
+            similarity_threshold=request.similarity_threshold,
+            user_id=request.user_id,
+            organization_id=request.organization_id,
+            conversation_id=request.conversation_id
         )
         
-        return results
+        return [
+            {"query": query, "results": query_results}
+            for query, query_results in zip(request.queries, results)
+        ]
     
     except Exception as e:
-        logger.error(f"Erreur recherche: {e}")
+        logger.error(f"Erreur recherche par lot: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -67,7 +148,7 @@ async def test_search(q: str = "intelligence artificielle"):
     try:
         vector_store = get_vector_store()
         
-        results = vector_store.search_similar(
+        results = await vector_store.asearch_similar(
             query_text=q,
             top_k=3,
             similarity_threshold=0.3
@@ -0,0 +1,69 @@
+"""
+Benchmark de la recherche par lot
+Compare N recherches unitaires (un encodage + un aller-retour SQL chacune)
+et une recherche par lot VectorStore.search_many (un encodage, une requête
+SQL) : débit en requêtes/seconde et résultats identiques.
+
+Usage: python benchmark_batch_search.py [taille_du_lot] [top_k]
+"""
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(__file__))
+
+from ai.vector_store import get_vector_store
+
+QUESTIONS = [
+    "Combien de jours de RTT ai-je par an ?",
+    "Quelle est la politique de télétravail ?",
+    "Comment poser des congés payés ?",
+    "Quelles sont les règles de remboursement des frais ?",
+    "Qui contacter pour un arrêt maladie ?",
+    "Quels sont les horaires de travail ?",
+    "Comment fonctionne la mutuelle santé ?",
+    "Quelle est la durée de la période d'essai ?"
+]
+
+
+def main():
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    top_k = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    store = get_vector_store()
+    # Variantes distinctes (pas de hit du cache d'embeddings de requêtes)
+    queries = [f"{QUESTIONS[i % len(QUESTIONS)]} (variante {i})" for i in range(batch_size)]
+
+    print("\n" + "="*60)
+    print(f"🧪 BENCHMARK RECHERCHE PAR LOT ({batch_size} requêtes, top_k={top_k})")
+    print("="*60)
+
+    # Chauffe (chargement du modèle, connexions du pool)
+    store.search_similar("chauffe", top_k=top_k)
+
+    start = time.perf_counter()
+    single_results = [store.search_similar(q, top_k=top_k) for q in queries]
+    single_s = time.perf_counter() - start
+
+    if store.embeddings.query_cache is not None:
+        store.embeddings.query_cache.clear()
+
+    start = time.perf_counter()
+    batch_results = store.search_many(queries, top_k=top_k)
+    batch_s = time.perf_counter() - start
+
+    identical = sum(
+        [r["chunk_id"] for r in single] == [r["chunk_id"] for r in batch]
+        for single, batch in zip(single_results, batch_results)
+    )
+
+    print(f"\n{'Méthode':<20} {'durée s':>10} {'req/s':>10}")
+    print("-"*60)
+    print(f"{'Unitaire':<20} {single_s:>10.2f} {batch_size / single_s:>10.1f}")
+    print(f"{'Par lot':<20} {batch_s:>10.2f} {batch_size / batch_s:>10.1f}")
+    print("-"*60)
+    print(f"⚡ Débit x{single_s / batch_s:.1f}")
+    print(f"🎯 Résultats identiques: {identical}/{batch_size}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark de l'écriture des chunks
+Compare l'ancienne insertion (un INSERT par chunk, embedding converti en
+texte) et le COPY binaire de store_document (embeddings float32, codec
+pgvector) : débit en chunks/seconde. Les lignes sont insérées pour un
+document temporaire puis annulées (ROLLBACK), la base n'est pas modifiée.
+
+Usage: python benchmark_chunk_insert.py [nombre_de_chunks]
+"""
+import sys
+import os
+import time
+import uuid
+import json
+sys.path.insert(0, os.path.dirname(__file__))
+
+import numpy as np
+from sqlalchemy import text
+from utils.database import SessionLocal
+from utils.pg_copy import copy_rows, as_float32_rows
+from ai.vector_store import CHUNK_COPY_COLUMNS, CHUNK_COPY_ENCODERS
+
+# Chunk typique (~1000 caractères, taille par défaut du TextChunker)
+SAMPLE_CONTENT = ("Les salariés bénéficient de jours de RTT selon leur temps de travail. " * 15)[:1000]
+
+
+def embedding_dim(db):
+    """Dimension de la colonne embedding (typmod du type vector)"""
+    return db.execute(text("""
+        SELECT atttypmod FROM pg_attribute
+        WHERE attrelid = 'document_chunks'::regclass AND attname = 'embedding'
+    """)).scalar()
+
+
+def insert_document(db):
+    """Document temporaire (annulé avec la transaction)"""
+    document_id = str(uuid.uuid4())
+    db.execute(text("""
+        INSERT INTO documents (id, filename, file_type, file_size, file_path, scope, is_indexed, indexing_status)
+        VALUES (:id, 'benchmark.pdf', 'pdf', 0, '', 'organization', false, 'processing')
+    """), {"id": document_id})
+    return document_id
+
+
+def insert_row_by_row(db, document_id, embeddings):
+    """Ancienne écriture : un aller-retour par chunk, embedding en texte"""
+    query = text("""
+        INSERT INTO document_chunks (
+            id, document_id, chunk_index, content, embedding, metadata,
+            scope, organization_id, user_id, conversation_id
+        )
+        VALUES (
+            :id, :document_id, :chunk_index, :content, :embedding, :metadata,
+            :scope, :organization_id, :user_id, :conversation_id
+        )
+    """)
+    for idx, embedding in enumerate(embeddings):
+        db.execute(query, {
+            "id": str(uuid.uuid4()),
+            "document_id": document_id,
+            "chunk_index": idx,
+            "content": SAMPLE_CONTENT,
+            "embedding": f"[{','.join(map(str, embedding.tolist()))}]",
+            "metadata": json.dumps({"chunk_index": idx}),
+            "scope": "organization",
+            "organization_id": None,
+            "user_id": None,
+            "conversation_id": None
+        })
+
+
+def insert_copy(db, document_id, embeddings):
+    """Nouvelle écriture : un COPY binaire pour tout le document"""
+    rows = [
+        (str(uuid.uuid4()), document_id, idx, SAMPLE_CONTENT, vector, {"chunk_index": idx},
+         "organization", None, None, None, None)
+        for idx, vector in enumerate(as_float32_rows(embeddings))
+    ]
+    copy_rows(db, "document_chunks", CHUNK_COPY_COLUMNS, CHUNK_COPY_ENCODERS, rows)
+
+
+def run(method, embeddings):
+    """Durée (s) de l'insertion, transaction annulée ensuite"""
+    with SessionLocal() as db:
+        document_id = insert_document(db)
+        start = time.perf_counter()
+        method(db, document_id, embeddings)
+        db.execute(text("SELECT 1"))  # Fin des écritures côté serveur
+        elapsed = time.perf_counter() - start
+        count = db.execute(
+            text("SELECT count(*) FROM document_chunks WHERE document_id = :id"), {"id": document_id}
+        ).scalar()
+        db.rollback()
+    return elapsed, count
+
+
+def main():
+    n_chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    with SessionLocal() as db:
+        dim = embedding_dim(db)
+
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(n_chunks, dim)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    print("\n" + "="*60)
+    print(f"🧪 BENCHMARK ÉCRITURE DES CHUNKS ({n_chunks} chunks, {dim} dimensions)")
+    print("="*60)
+
+    results = {}
+    print(f"\n{'Méthode':<28} {'durée s':>10} {'chunks/s':>12}")
+    print("-"*60)
+    for label, method in (("INSERT ligne par ligne", insert_row_by_row), ("COPY binaire", insert_copy)):
+        elapsed, count = run(method, embeddings)
+        if count != n_chunks:
+            print(f"❌ {label}: {count} chunks insérés au lieu de {n_chunks}")
+            return
+        results[label] = elapsed
+        print(f"{label:<28} {elapsed:>10.2f} {n_chunks / elapsed:>12.0f}")
+    print("-"*60)
+    print(f"⚡ Accélération: x{results['INSERT ligne par ligne'] / results['COPY binaire']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
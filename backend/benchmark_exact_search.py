@@ -0,0 +1,101 @@
+"""
+Benchmark de la recherche exacte en mémoire vs pgvector
+Pour une portée (organisation ou utilisateur), compare la latence de la
+recherche NumPy en mémoire et de la requête SQL de VectorStore (HNSW ou
+B-tree + tri), ainsi que le recall@k du SQL par rapport au top-k exact.
+
+Usage: python benchmark_exact_search.py org|user <id> [nombre_de_requêtes] [top_k]
+"""
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(__file__))
+
+import numpy as np
+from sqlalchemy import text
+from utils.database import SessionLocal
+from ai.vector_store import get_vector_store
+from ai.exact_index import ExactSearchIndex
+
+
+def percentile(values, p):
+    return float(np.percentile(values, p)) if values else 0.0
+
+
+def sample_queries(scope_filter, params, n):
+    """Requêtes = embeddings de chunks de la portée, bruités (proches de cas réels)"""
+    with SessionLocal() as db:
+        rows = db.execute(text(f"""
+            SELECT CAST(dc.embedding AS real[]) FROM document_chunks dc
+            WHERE {scope_filter} ORDER BY random() LIMIT :n
+        """), {**params, "n": n}).fetchall()
+    rng = np.random.default_rng(0)
+    queries = []
+    for (embedding,) in rows:
+        vector = np.array(embedding, dtype=np.float32)
+        queries.append(vector + rng.normal(0, 0.05 * np.abs(vector).mean(), vector.shape).astype(np.float32))
+    return queries
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ("org", "user"):
+        print(__doc__)
+        return
+
+    scope, scope_id = sys.argv[1], sys.argv[2]
+    n_queries = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    top_k = int(sys.argv[4]) if len(sys.argv) > 4 else 10
+
+    store = get_vector_store()
+    filters = {"organization_id": scope_id} if scope == "org" else {"user_id": scope_id}
+    _, tenant_key, scope_filter = store._scope_filters(**filters)[0]
+
+    print("\n" + "="*60)
+    print(f"🧪 BENCHMARK RECHERCHE EXACTE ({tenant_key}, top_k={top_k})")
+    print("="*60)
+
+    index = ExactSearchIndex(max_rows_per_tenant=10**7, max_total_rows=10**7)
+    base_params = store._build_search_queries(np.zeros(store.embedding_dim), top_k, 0.0, **filters)[0][2]
+
+    start = time.perf_counter()
+    if index.search(tenant_key, scope_filter, base_params, np.ones(store.embedding_dim), top_k, 0.0) is None:
+        print("❌ Portée non chargée")
+        return
+    load_ms = (time.perf_counter() - start) * 1000
+    stats = index.stats()
+    print(f"\n📥 Chargement: {stats['rows_loaded']} chunks en {load_ms:.0f} ms ({stats['memory_mb']} Mo)")
+
+    queries = sample_queries(scope_filter, base_params, n_queries)
+    if not queries:
+        print("❌ Aucun chunk dans cette portée")
+        return
+
+    exact_ms, sql_ms, recalls = [], [], []
+    for query_embedding in queries:
+        start = time.perf_counter()
+        exact = index.search(tenant_key, scope_filter, base_params, query_embedding, top_k, 0.0)
+        exact_ms.append((time.perf_counter() - start) * 1000)
+
+        _, search_query, params = store._build_search_queries(query_embedding, top_k, 0.0, **filters)[0]
+        start = time.perf_counter()
+        with SessionLocal() as db:
+            store._apply_search_settings(db, top_k)
+            sql = store._format_search_rows(db.execute(search_query, params))
+        sql_ms.append((time.perf_counter() - start) * 1000)
+
+        expected = {r["chunk_id"] for r in exact}
+        if expected:
+            recalls.append(len(expected & {r["chunk_id"] for r in sql}) / len(expected))
+
+    print(f"\n{'Méthode':<20} {'p50 ms':>10} {'p95 ms':>10}")
+    print("-"*60)
+    print(f"{'Exacte (NumPy)':<20} {percentile(exact_ms, 50):>10.2f} {percentile(exact_ms, 95):>10.2f}")
+    print(f"{'pgvector (SQL)':<20} {percentile(sql_ms, 50):>10.2f} {percentile(sql_ms, 95):>10.2f}")
+    print("-"*60)
+    print(f"🎯 Recall@{top_k} pgvector vs exact: {np.mean(recalls) * 100:.1f}% ({len(queries)} requêtes)")
+    if percentile(exact_ms, 50):
+        print(f"⚡ Accélération p50: x{percentile(sql_ms, 50) / percentile(exact_ms, 50):.1f}")
+
+
+if __name__ == "__main__":
+    main()
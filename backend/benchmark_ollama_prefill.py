@@ -0,0 +1,115 @@
+"""
+Benchmark du prefill Ollama sur une conversation multi-tours
+Compare /api/generate (prompt aplati, contexte avant l'historique) et
+/api/chat (préfixe stable système + historique, keep_alive) : durée de
+prefill et nombre de tokens évalués à chaque tour.
+
+Usage: python benchmark_ollama_prefill.py [nombre_de_tours]
+"""
+import sys
+import os
+import uuid
+sys.path.insert(0, os.path.dirname(__file__))
+
+from ai.llm import LLMGenerator
+from ai.prompts import build_rag_prompt
+from config import settings
+
+
+CHUNKS = [
+    {
+        "filename": "reglement_interieur.pdf",
+        "chunk_index": 3,
+        "content": "Les salariés bénéficient de 25 jours de congés payés et de 10 jours de RTT par an. "
+                   "Les RTT doivent être posés avant le 31 décembre de l'année en cours.",
+        "similarity": 0.82
+    },
+    {
+        "filename": "guide_teletravail.pdf",
+        "chunk_index": 1,
+        "content": "Le télétravail est autorisé jusqu'à deux jours par semaine après accord du manager. "
+                   "Une indemnité forfaitaire de 20 euros par mois est versée.",
+        "similarity": 0.74
+    }
+]
+
+QUESTIONS = [
+    "Combien de jours de RTT ai-je par an ?",
+    "Avant quelle date dois-je les poser ?",
+    "Et pour le télétravail, combien de jours sont autorisés ?",
+    "Y a-t-il une indemnité associée ?",
+    "Faut-il l'accord de quelqu'un ?",
+    "Résume les règles dont on a parlé."
+]
+
+
+def run_generate(llm: LLMGenerator, turns: int):
+    """Conversation via /api/generate (prompt aplati, comportement historique)"""
+    history = []
+    results = []
+    for question in (QUESTIONS * 2)[:turns]:
+        prepared = build_rag_prompt(question, CHUNKS, llm.context_token_budget, history, llm.count_tokens)
+        payload = llm._build_payload(prepared["user_prompt"], prepared["system_prompt"],
+                                     prepared["temperature"], 128, stream=False)
+        data = llm.client.post(f"{llm.base_url}/api/generate", json=payload).json()
+        answer = data.get("response", "").strip()
+        results.append((data.get("prompt_eval_count", 0), data.get("prompt_eval_duration", 0) / 1e6))
+        history += [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+    return results
+
+
+def run_chat(llm: LLMGenerator, turns: int):
+    """Conversation via /api/chat (préfixe stable + suivi par conversation)"""
+    conversation_id = str(uuid.uuid4())
+    history = []
+    results = []
+    for question in (QUESTIONS * 2)[:turns]:
+        prepared = llm.prepare_rag_prompt(question, CHUNKS, None, history, conversation_id)
+        metrics = {}
+        answer = llm.generate_prepared(prepared, metrics).strip()
+        results.append((metrics.get("prompt_tokens_evaluated", 0), metrics.get("prefill_ms", 0.0)))
+        history += [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+    return results
+
+
+def main():
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+
+    llm = LLMGenerator(
+        base_url=settings.ollama_base_url,
+        model=settings.ollama_model,
+        max_tokens=128,
+        context_token_budget=settings.ollama_context_tokens,
+        keep_alive=settings.ollama_keep_alive,
+        num_ctx=settings.ollama_num_ctx
+    )
+    if not llm.check_health():
+        print("❌ Ollama non disponible")
+        return
+
+    print("\n" + "="*60)
+    print(f"🧪 BENCHMARK PREFILL OLLAMA ({llm.model}, {turns} tours)")
+    print("="*60)
+
+    # Charger le modèle une première fois (exclure le temps de chargement)
+    llm.generate("Bonjour", max_tokens=1)
+
+    generate_results = run_generate(llm, turns)
+    chat_results = run_chat(llm, turns)
+
+    print(f"\n{'Tour':>4} | {'generate tokens':>15} {'ms':>8} | {'chat tokens':>11} {'ms':>8}")
+    print("-"*60)
+    for i, ((g_tokens, g_ms), (c_tokens, c_ms)) in enumerate(zip(generate_results, chat_results), 1):
+        print(f"{i:>4} | {g_tokens:>15} {g_ms:>8.0f} | {c_tokens:>11} {c_ms:>8.0f}")
+
+    g_total = sum(ms for _, ms in generate_results[1:])
+    c_total = sum(ms for _, ms in chat_results[1:])
+    print("-"*60)
+    print(f"Prefill cumulé (tours 2+): generate {g_total:.0f} ms, chat {c_total:.0f} ms")
+    if g_total:
+        print(f"📉 Réduction: {(1 - c_total / g_total) * 100:.1f}%")
+    print(f"\n📊 Tracker: {llm.prefix_tracker.stats()}")
+
+
+if __name__ == "__main__":
+    main()
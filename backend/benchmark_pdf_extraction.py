@@ -0,0 +1,58 @@
+"""
+Benchmark de l'extraction du texte des PDF
+Compare l'extraction dans le processus courant et l'extraction par plages
+de pages réparties sur 2, 4... processus : durée, pages/seconde et texte
+identique.
+
+Usage: python benchmark_pdf_extraction.py <fichier.pdf> [pages_par_tâche]
+"""
+import sys
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+sys.path.insert(0, os.path.dirname(__file__))
+
+from utils.pdf_extraction import extract_pdf_text, extract_page_range
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+
+    pdf_path = sys.argv[1]
+    pages_per_task = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    cpu_count = os.cpu_count() or 1
+
+    print("\n" + "="*60)
+    print(f"🧪 BENCHMARK EXTRACTION PDF ({os.path.basename(pdf_path)}, {cpu_count} cœurs)")
+    print("="*60)
+
+    start = time.perf_counter()
+    reference, page_count = extract_pdf_text(pdf_path)
+    serial_s = time.perf_counter() - start
+
+    print(f"\n{'Processus':<12} {'durée s':>10} {'pages/s':>10} {'accél.':>8} {'texte':>8}")
+    print("-"*60)
+    print(f"{'1 (local)':<12} {serial_s:>10.2f} {page_count / serial_s:>10.1f} {'x1.0':>8} {'réf.':>8}")
+
+    processes = 2
+    while processes <= cpu_count:
+        with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+            # Chauffe : démarrage des processus et imports hors mesure
+            list(pool.map(extract_page_range, [pdf_path] * processes, [0] * processes, [min(1, page_count)] * processes))
+            start = time.perf_counter()
+            extracted, _ = extract_pdf_text(pdf_path, pool, pages_per_task)
+            elapsed = time.perf_counter() - start
+        identical = "✅" if extracted == reference else "❌"
+        print(f"{processes:<12} {elapsed:>10.2f} {page_count / elapsed:>10.1f} "
+              f"{'x' + format(serial_s / elapsed, '.1f'):>8} {identical:>8}")
+        processes *= 2
+
+    print("-"*60)
+    print(f"📄 {page_count} pages, {len(reference)} caractères, {pages_per_task} pages par tâche")
+
+
+if __name__ == "__main__":
+    main()
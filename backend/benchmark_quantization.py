@@ -0,0 +1,127 @@
+"""
+Benchmark du stockage quantifié des embeddings
+Compare la recherche actuelle (index HNSW float32) et la recherche en deux
+passes sur index compact (halfvec, binaire) + re-classement float32 : taille
+des index, latence et recall@k par rapport au top-k exact (parcours complet).
+
+Prérequis : migrations/add_quantized_embedding_indexes.sql appliquée
+Usage: python benchmark_quantization.py [nombre_de_requêtes] [top_k]
+"""
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(__file__))
+
+import numpy as np
+from sqlalchemy import text
+from utils.database import SessionLocal
+from ai.vector_store import get_vector_store
+from config import settings
+
+# Index de chaque mode (nom se terminant par le suffixe)
+MODES = {
+    "none": "_embedding_idx",
+    "halfvec": "_embedding_half_idx",
+    "binary": "_embedding_bit_idx"
+}
+
+
+def percentile(values, p):
+    return float(np.percentile(values, p)) if values else 0.0
+
+
+def index_sizes():
+    """Taille (Mo) et nombre d'index HNSW de chaque mode sur document_chunks"""
+    with SessionLocal() as db:
+        rows = db.execute(text("""
+            SELECT indexname, pg_relation_size(quote_ident(indexname)::regclass)
+            FROM pg_indexes
+            WHERE tablename = 'document_chunks' AND indexdef ILIKE '%USING hnsw%'
+        """)).fetchall()
+    sizes = {}
+    for mode, suffix in MODES.items():
+        matching = [size for name, size in rows if name.endswith(suffix)]
+        sizes[mode] = (len(matching), sum(matching) / (1024 * 1024))
+    return sizes
+
+
+def sample_queries(n):
+    """Requêtes = embeddings de chunks aléatoires, bruités"""
+    with SessionLocal() as db:
+        rows = db.execute(text("""
+            SELECT CAST(embedding AS real[]) FROM document_chunks ORDER BY random() LIMIT :n
+        """), {"n": n}).fetchall()
+    rng = np.random.default_rng(0)
+    queries = []
+    for (embedding,) in rows:
+        vector = np.array(embedding, dtype=np.float32)
+        queries.append(vector + rng.normal(0, 0.05 * np.abs(vector).mean(), vector.shape).astype(np.float32))
+    return queries
+
+
+def run_search(store, query_embedding, top_k, exact=False):
+    """Recherche sans filtre de portée dans le mode courant (exact = sans index)"""
+    _, search_query, params = store._build_search_queries(query_embedding, top_k, 0.0)[0]
+    with SessionLocal() as db:
+        store._apply_search_settings(db, top_k)
+        if exact:
+            db.execute(text("SET LOCAL enable_indexscan = off"))
+        results = store._format_search_rows(db.execute(search_query, params))
+        db.rollback()
+    return [r["chunk_id"] for r in results]
+
+
+def main():
+    n_queries = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    top_k = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    store = get_vector_store()
+    with SessionLocal() as db:
+        row_count = db.execute(text("SELECT count(*) FROM document_chunks")).scalar()
+
+    print("\n" + "="*60)
+    print(f"🧪 BENCHMARK QUANTIFICATION ({row_count} chunks, top_k={top_k}, "
+          f"re-classement x{settings.vector_rerank_factor})")
+    print("="*60)
+
+    queries = sample_queries(n_queries)
+    if not queries:
+        print("❌ Aucun chunk indexé")
+        return
+
+    configured_mode = settings.vector_quantization
+    sizes = index_sizes()
+
+    # Vérité terrain : parcours complet, distance float32
+    settings.vector_quantization = "none"
+    ground_truth = [set(run_search(store, q, top_k, exact=True)) for q in queries]
+
+    print(f"\n{'Mode':<10} {'index':>6} {'Mo':>9} {'p50 ms':>9} {'p95 ms':>9} {'recall':>8}")
+    print("-"*60)
+    try:
+        for mode in MODES:
+            count, size_mb = sizes[mode]
+            if count == 0:
+                print(f"{mode:<10} {'-':>6} {'-':>9}   ⚠️ index absents (migration non appliquée ?)")
+                continue
+
+            settings.vector_quantization = mode
+            latencies, recalls = [], []
+            for query_embedding, expected in zip(queries, ground_truth):
+                start = time.perf_counter()
+                found = run_search(store, query_embedding, top_k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                if expected:
+                    recalls.append(len(expected & set(found)) / len(expected))
+
+            print(f"{mode:<10} {count:>6} {size_mb:>9.1f} {percentile(latencies, 50):>9.2f} "
+                  f"{percentile(latencies, 95):>9.2f} {np.mean(recalls) * 100:>7.1f}%")
+    finally:
+        settings.vector_quantization = configured_mode
+
+    print("-"*60)
+    print("💡 Recall insuffisant en binaire : augmenter VECTOR_RERANK_FACTOR")
+
+
+if __name__ == "__main__":
+    main()
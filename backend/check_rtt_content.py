@@ -25,9 +25,10 @@ def check_rtt_content():
                 dc.content
             FROM document_chunks dc
             JOIN documents d ON dc.document_id = d.id
-            WHERE LOWER(dc.content) LIKE '%jours de rtt%'
-               OR LOWER(dc.content) LIKE '%reduction du temps de travail%'
-               OR (LOWER(dc.content) LIKE '%rtt%' AND LOWER(dc.content) LIKE '%vous avez droit%')
+            WHERE dc.content_tsv @@ websearch_to_tsquery(
+                'french', '"jours de rtt" OR "reduction du temps de travail"'
+            )
+            OR dc.content_tsv @@ websearch_to_tsquery('french', 'rtt "vous avez droit"')
             ORDER BY d.filename, dc.chunk_index
             LIMIT 5
         """)
@@ -15,10 +15,10 @@ def clean_orphan_files():
     """Supprime les fichiers qui ne sont pas dans la base de données"""
     
     with SessionLocal() as db:
-        # Récupérer tous les fichiers de la DB
-        query = text("SELECT filename FROM documents")
+        # Récupérer tous les fichiers de la DB (fichier nommé par upload, ou par nom pour les anciens documents)
+        query = text("SELECT COALESCE(file_path, filename) FROM documents")
         result = db.execute(query)
-        db_files = {row[0] for row in result}
+        db_files = {Path(row[0]).name for row in result}
     
     # Lister tous les fichiers sur le disque
     disk_files = {f.name for f in UPLOAD_DIR.glob("*.pdf")}
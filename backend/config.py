@@ -87,6 +87,26 @@ class Settings(BaseSettings):
         description="Modèle Ollama à utiliser"
     )
     
+    ollama_keep_alive: str = Field(
+        default="30m",
+        description="Durée de maintien du modèle et de son cache KV en mémoire (keep_alive Ollama)"
+    )
+    ollama_num_ctx: int = Field(
+        default=4096,
+        ge=512,
+        description="Fenêtre de contexte Ollama (num_ctx, constante pour éviter les rechargements)"
+    )
+    ollama_chat_api: bool = Field(
+        default=True,
+        description="Utiliser /api/chat avec préfixe stable (réutilisation du cache KV entre les tours)"
+    )
+    
+    ollama_context_tokens: int = Field(
+        default=1024,
+        ge=128,
+        description="Budget de tokens du contexte documentaire pour Ollama (prefill CPU)"
+    )
+    
     # Groq (Cloud)
     groq_api_key: Optional[str] = Field(
         default=None,
@@ -97,12 +117,95 @@ class Settings(BaseSettings):
         description="Modèle Groq à utiliser"
     )
     
+    groq_context_tokens: int = Field(
+        default=3000,
+        ge=128,
+        description="Budget de tokens du contexte documentaire pour Groq"
+    )
+    
+    # Surveillance de santé LLM (sonde en arrière-plan)
+    llm_health_interval: float = Field(
+        default=30.0,
+        ge=1.0,
+        description="Intervalle entre deux sondes de santé LLM (secondes)"
+    )
+    llm_health_retry_interval: float = Field(
+        default=5.0,
+        ge=0.5,
+        description="Délai initial de re-sonde après un échec (secondes, backoff exponentiel)"
+    )
+    
     # Embeddings
     embeddings_model: str = Field(
         default="paraphrase-multilingual-MiniLM-L12-v2",
         description="Modèle sentence-transformers pour embeddings (multilingue)"
     )
     
+    embedding_cache_max_mb: float = Field(
+        default=32.0,
+        ge=0.0,
+        description="Mémoire max du cache d'embeddings de requêtes en Mo (0 = désactivé)"
+    )
+    embedding_cache_ttl_seconds: float = Field(
+        default=3600.0,
+        ge=0.0,
+        description="Durée de vie d'un embedding de requête en cache (0 = illimitée)"
+    )
+    
+    embedding_batching_enabled: bool = Field(
+        default=False,
+        description="Regrouper les encodages de requêtes concurrents en un seul batch"
+    )
+    embedding_batch_max_size: int = Field(
+        default=32,
+        ge=1,
+        le=256,
+        description="Taille max d'un lot d'encodage de requêtes"
+    )
+    embedding_batch_max_wait_ms: float = Field(
+        default=5.0,
+        ge=0.0,
+        le=100.0,
+        description="Attente max pour compléter un lot (millisecondes)"
+    )
+    
+    chunk_embedding_cache_enabled: bool = Field(
+        default=True,
+        description="Réutiliser les embeddings de chunks identiques déjà calculés (table chunk_embedding_cache)"
+    )
+    
+    # Re-classement (cross-encoder CPU) des chunks avant le prompt
+    rerank_enabled: bool = Field(
+        default=False,
+        description="Re-classer les chunks récupérés par cross-encoder et ne garder que les meilleurs"
+    )
+    rerank_model: str = Field(
+        default="cross-encoder/mmarco-mMiniLMv2-L12-H384-v1",
+        description="Modèle cross-encoder sentence-transformers (multilingue)"
+    )
+    rerank_top_n: int = Field(
+        default=3,
+        ge=1,
+        le=20,
+        description="Nombre de chunks gardés après re-classement"
+    )
+    rerank_batch_size: int = Field(
+        default=16,
+        ge=1,
+        le=128,
+        description="Paires (question, chunk) notées par appel au modèle"
+    )
+    rerank_latency_budget_ms: float = Field(
+        default=300.0,
+        ge=0.0,
+        description="Temps max de re-classement par requête (au-delà : chunks restants non notés)"
+    )
+    rerank_cache_size: int = Field(
+        default=10000,
+        ge=0,
+        description="Scores (question, chunk) gardés en cache (0 = désactivé)"
+    )
+    
     # Legacy (pour compatibilité)
     llm_model_path: Optional[str] = Field(
         default=None,
@@ -155,6 +258,211 @@ class Settings(BaseSettings):
         description="Seuil de similarité cosine"
     )
     
+    # Recherche exacte en mémoire (petits et moyens tenants)
+    exact_search_enabled: bool = Field(
+        default=False,
+        description="Servir les portées de petite taille par produit scalaire NumPy en mémoire"
+    )
+    exact_search_max_rows: int = Field(
+        default=50000,
+        ge=1,
+        description="Taille max d'une portée (chunks) pour la recherche exacte (au-delà : pgvector)"
+    )
+    exact_search_max_total_rows: int = Field(
+        default=200000,
+        ge=1,
+        description="Nombre total de chunks gardés en mémoire, toutes portées (éviction LRU)"
+    )
+    exact_search_mmap_dir: str = Field(
+        default="",
+        description="Répertoire des matrices .npy relues en memory-map (vide = mémoire uniquement)"
+    )
+    
+    # Recherche HNSW (pgvector)
+    vector_ef_search: int = Field(
+        default=64,
+        ge=1,
+        le=1000,
+        description="hnsw.ef_search par requête (taille de la liste de candidats, >= top_k)"
+    )
+    vector_iterative_scan: Literal["off", "relaxed_order", "strict_order"] = Field(
+        default="relaxed_order",
+        description="hnsw.iterative_scan (pgvector >= 0.8) : poursuit le parcours tant que les filtres éliminent des candidats"
+    )
+    
+    vector_quantization: Literal["none", "halfvec", "binary"] = Field(
+        default="none",
+        description="Premier passage sur un index compact (halfvec / binaire) puis re-classement float32 (voir migrations/add_quantized_embedding_indexes.sql)"
+    )
+    vector_rerank_factor: int = Field(
+        default=4,
+        ge=1,
+        le=50,
+        description="Candidats du premier passage quantifié = top_k x facteur"
+    )
+    
+    # Extension des hits aux chunks voisins (passages à cheval sur deux chunks)
+    context_neighbor_chunks: int = Field(
+        default=0,
+        ge=0,
+        le=3,
+        description="Chunks voisins (chunk_index ± n) joints à chaque hit, fusionnés en passages contigus (0 = désactivé)"
+    )
+    
+    # Diversification MMR des résultats (quasi-doublons : overlap, passages répétés)
+    mmr_enabled: bool = Field(
+        default=False,
+        description="Diversifier les résultats par Maximal Marginal Relevance"
+    )
+    mmr_lambda: float = Field(
+        default=0.5,
+        ge=0.0,
+        le=1.0,
+        description="Compromis MMR : 1 = pertinence seule, 0 = diversité seule"
+    )
+    mmr_fetch_factor: int = Field(
+        default=3,
+        ge=1,
+        le=10,
+        description="Candidats récupérés avant MMR = top_k x facteur"
+    )
+    
+    search_batch_max_queries: int = Field(
+        default=500,
+        ge=1,
+        description="Nombre max de requêtes par appel à /api/search/batch"
+    )
+    search_cache_enabled: bool = Field(
+        default=True,
+        description="Mettre en cache les résultats de recherche (invalidés par version du corpus)"
+    )
+    search_cache_max_entries: int = Field(
+        default=2000,
+        ge=1,
+        description="Nombre max de recherches en cache (éviction LRU)"
+    )
+    
+    # Recherche hybride (plein texte + vectorielle)
+    retrieval_mode: Literal["vector", "hybrid"] = Field(
+        default="vector",
+        description="Recherche du chat : vectorielle seule, ou fusion vectorielle + plein texte (acronymes, termes exacts)"
+    )
+    hybrid_rrf_k: int = Field(
+        default=60,
+        ge=1,
+        description="Constante k de la Reciprocal Rank Fusion (plus grande = rangs lissés)"
+    )
+    
+    # ===========================================
+    # HISTORIQUE DE CONVERSATION
+    # ===========================================
+    history_max_turns: int = Field(
+        default=4,
+        ge=0,
+        le=50,
+        description="Nombre d'échanges récents (question + réponse) gardés mot pour mot"
+    )
+    history_token_budget: int = Field(
+        default=600,
+        ge=0,
+        description="Budget de tokens pour les messages récents de l'historique"
+    )
+    history_summary_enabled: bool = Field(
+        default=True,
+        description="Remplacer les échanges plus anciens par un résumé (mis à jour en arrière-plan)"
+    )
+    history_summary_max_tokens: int = Field(
+        default=200,
+        ge=32,
+        description="Longueur max du résumé de conversation (tokens)"
+    )
+    history_summary_ttl_seconds: int = Field(
+        default=86400,
+        ge=0,
+        description="Durée de vie d'un résumé de conversation dans Redis (0 = illimitée)"
+    )
+    
+    # ===========================================
+    # CACHE DES RÉPONSES (sémantique)
+    # ===========================================
+    answer_cache_enabled: bool = Field(
+        default=True,
+        description="Réutiliser les réponses pour des questions quasi identiques sur le même corpus"
+    )
+    answer_cache_backend: Literal["redis", "memory"] = Field(
+        default="redis",
+        description="Stockage du cache de réponses (fallback mémoire si Redis indisponible)"
+    )
+    answer_cache_similarity: float = Field(
+        default=0.95,
+        ge=0.5,
+        le=1.0,
+        description="Similarité cosine minimale entre questions pour réutiliser une réponse"
+    )
+    answer_cache_ttl_seconds: float = Field(
+        default=3600.0,
+        ge=0.0,
+        description="Durée de vie d'une réponse en cache (0 = illimitée)"
+    )
+    answer_cache_max_entries: int = Field(
+        default=100,
+        ge=1,
+        description="Nombre max de réponses en cache par portée (éviction LRU)"
+    )
+    
+    # ===========================================
+    # CONCURRENCY
+    # ===========================================
+    embedding_workers: int = Field(
+        default=2,
+        ge=1,
+        le=32,
+        description="Threads dédiés aux encodages de requêtes (embeddings)"
+    )
+    document_workers: int = Field(
+        default=2,
+        ge=1,
+        le=32,
+        description="Threads dédiés au parsing PDF et à l'indexation"
+    )
+    pdf_extraction_processes: int = Field(
+        default=4,
+        ge=0,
+        le=64,
+        description="Processus d'extraction du texte des PDF (plages de pages en parallèle, 0 ou 1 = dans le processus courant)"
+    )
+    pdf_pages_per_task: int = Field(
+        default=16,
+        ge=1,
+        description="Pages extraites par tâche du pool (un PDF plus court n'est pas découpé)"
+    )
+    upload_max_bytes: int = Field(
+        default=100 * 1024 * 1024,
+        ge=1,
+        description="Taille max d'un fichier uploadé (413 au-delà, vérifiée pendant l'écriture)"
+    )
+    upload_chunk_bytes: int = Field(
+        default=1024 * 1024,
+        ge=4096,
+        description="Taille des blocs lus et écrits sur disque pendant un upload"
+    )
+    ingestion_workers: int = Field(
+        default=1,
+        ge=1,
+        le=16,
+        description="Documents indexés simultanément en arrière-plan (le reste attend en file, < DOCUMENT_WORKERS)"
+    )
+    ingestion_max_pending: int = Field(
+        default=100,
+        ge=1,
+        description="Documents max en attente d'indexation (au-delà, l'upload répond 503)"
+    )
+    ingestion_job_ttl_seconds: int = Field(
+        default=86400,
+        ge=0,
+        description="Durée de conservation de l'état d'un job d'ingestion dans Redis (0 = illimitée)"
+    )
+    
     # ===========================================
     # LOGGING
     # ===========================================
@@ -228,6 +536,19 @@ class Settings(BaseSettings):
         
         return v
     
+    @field_validator("ingestion_workers")
+    @classmethod
+    def validate_ingestion_workers(cls, v: int, info) -> int:
+        """Valide que ingestion_workers < document_workers (aperçus PDF non bloqués par l'indexation)"""
+        document_workers = info.data.get("document_workers", 2)
+        
+        if v >= document_workers:
+            raise ValueError(
+                f"ingestion_workers ({v}) doit être < document_workers ({document_workers})"
+            )
+        
+        return v
+    
     # ===========================================
     # HELPER METHODS
     # ===========================================
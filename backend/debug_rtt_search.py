@@ -70,5 +70,32 @@ SOLUTIONS:
     """)
     print("="*80 + "\n")
 
+def test_hybrid_search():
+    """Meme requete en recherche hybride (vectorielle + plein texte, fusion RRF)"""
+    
+    print("\n" + "="*80)
+    print("RECHERCHE HYBRIDE - VECTORIELLE + PLEIN TEXTE")
+    print("="*80)
+    
+    vector_store = get_vector_store()
+    query = "j'ai le droit a des rtt ?"
+    
+    chunks = vector_store.search_hybrid(query_text=query, top_k=10, similarity_threshold=0.0)
+    
+    for idx, chunk in enumerate(chunks, 1):
+        lexical = f"{chunk['lexical_rank']:.3f}" if chunk['lexical_rank'] is not None else "  -  "
+        similarity = f"{chunk['similarity']:.4f}" if chunk['similarity'] is not None else "   -  "
+        filename = chunk['filename'].replace('_WEB', '')
+        preview = chunk['content'][:50].replace('\n', ' ')
+        print(f"#{idx:2}: rrf {chunk['rrf_score']:.4f} | sim {similarity} | lex {lexical} | "
+              f"{filename[:30]:30} chunk#{chunk['chunk_index']:2} | {preview}...")
+    
+    # Recherche d'un terme exact : index GIN seul, sans encodage de la requete
+    print("\nTerme exact 'RTT' (sans embedding):")
+    for chunk in vector_store.search_lexical("RTT", top_k=5):
+        print(f"  lex {chunk['lexical_rank']:.3f} | {chunk['filename'][:30]:30} chunk#{chunk['chunk_index']:2}")
+    print("="*80 + "\n")
+
 if __name__ == "__main__":
     test_specific_chunks()
+    test_hybrid_search()
@@ -28,9 +28,9 @@ def delete_all_documents():
             print("✅ Aucun document à supprimer")
             return
         
-        # Récupérer tous les filenames pour supprimer les fichiers du disque
-        filenames_query = text("SELECT filename FROM documents")
-        filenames = [row[0] for row in db.execute(filenames_query).fetchall()]
+        # Récupérer tous les fichiers pour les supprimer du disque (fichier nommé par upload, ou par nom)
+        filenames_query = text("SELECT COALESCE(file_path, filename) FROM documents")
+        filenames = [Path(row[0]).name for row in db.execute(filenames_query).fetchall()]
         
         print(f"\n🗑️  Suppression en cours...")
         
@@ -5,6 +5,8 @@ Point d'entrée principal de l'API
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 # Import de la configuration centralisée
@@ -21,6 +23,74 @@ logger = logging.getLogger(__name__)
 if settings.debug:
     settings.display_config_summary()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Cycle de vie de l'application (démarrage / arrêt)"""
+    from ai.health_monitor import get_llm_health_monitor
+    
+    # Démarrage: sonde de santé LLM en arrière-plan (hors chemin de requête)
+    monitor = None
+    try:
+        monitor = get_llm_health_monitor()
+        await monitor.start()
+    except Exception as e:
+        logger.error(f"❌ Impossible de démarrer le moniteur LLM: {e}")
+    
+    # Recherche hybride : la colonne plein texte doit exister (migrations/add_chunk_fulltext.sql)
+    if settings.retrieval_mode == "hybrid":
+        from sqlalchemy import text
+        from utils.database import AsyncSessionLocal
+        try:
+            async with AsyncSessionLocal() as db:
+                has_fulltext = (await db.execute(text("""
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'document_chunks' AND column_name = 'content_tsv'
+                """))).scalar()
+        except Exception as e:
+            has_fulltext = True  # Base injoignable : vérification reportée (erreur à la première recherche)
+            logger.warning(f"⚠️ Colonne plein texte non vérifiée: {e}")
+        if not has_fulltext:
+            raise RuntimeError(
+                "RETRIEVAL_MODE=hybrid nécessite la colonne document_chunks.content_tsv : "
+                "appliquez migrations/add_chunk_fulltext.sql ou passez RETRIEVAL_MODE=vector"
+            )
+    
+    # Chargement du cross-encoder hors chemin de requête (si activé)
+    if settings.rerank_enabled:
+        from ai.reranker import get_reranker
+        try:
+            await asyncio.to_thread(get_reranker)
+        except Exception as e:
+            logger.error(f"❌ Impossible de charger le cross-encoder: {e}")
+    
+    yield
+    
+    # Arrêt: libérer moniteur, executors et connexions asynchrones
+    if monitor is not None:
+        await monitor.stop()
+    
+    # Singletons jamais utilisés : rien à arrêter (ne pas les créer à l'arrêt)
+    from ai import conversation_memory, ingestion
+    if conversation_memory._memory_instance is not None:
+        try:
+            await conversation_memory._memory_instance.shutdown()
+        except Exception as e:
+            logger.error(f"❌ Arrêt des résumés de conversation: {e}")
+    
+    if ingestion._queue_instance is not None:
+        try:
+            await ingestion._queue_instance.shutdown()
+        except Exception as e:
+            logger.error(f"❌ Arrêt de la file d'ingestion: {e}")
+    
+    from utils.concurrency import shutdown_executors
+    from utils.database import async_engine
+    
+    shutdown_executors()
+    await async_engine.dispose()
+    logger.info("🛑 Executors et pool asyncpg fermés")
+
+
 # Initialisation FastAPI
 app = FastAPI(
     title="AI Solution API",
@@ -28,7 +98,8 @@ app = FastAPI(
     version="0.1.0-poc",
     docs_url="/docs",
     redoc_url="/redoc",
-    debug=settings.debug
+    debug=settings.debug,
+    lifespan=lifespan
 )
 
 # Configuration CORS avec origines depuis config
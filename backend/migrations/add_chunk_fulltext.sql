@@ -0,0 +1,19 @@
+-- Migration: Recherche plein texte (français) sur document_chunks
+-- Date: 2026-10-17
+-- Description: Les acronymes ("RTT", "CSE"...) sont mal représentés par les
+-- embeddings MiniLM : les scripts de diagnostic les cherchaient avec
+-- LOWER(content) LIKE '%rtt%' (parcours de tous les chunks). Un tsvector
+-- français, généré à l'insertion et indexé en GIN, sert la recherche lexicale
+-- et la recherche hybride (fusion lexicale + vectorielle) de VectorStore.
+
+-- 1. Colonne générée : maintenue par Postgres à chaque INSERT/UPDATE de content
+--    (la reprise des chunks existants est faite par l'ALTER TABLE)
+ALTER TABLE document_chunks
+ADD COLUMN IF NOT EXISTS content_tsv tsvector
+GENERATED ALWAYS AS (to_tsvector('french', content)) STORED;
+
+-- 2. Index GIN pour les requêtes content_tsv @@ tsquery
+CREATE INDEX IF NOT EXISTS document_chunks_content_tsv_idx
+ON document_chunks USING gin (content_tsv);
+
+ANALYZE document_chunks;
@@ -0,0 +1,84 @@
+-- Migration: Clés de portée dénormalisées sur document_chunks + index HNSW partiels
+-- Date: 2026-10-17
+-- Description: La recherche vectorielle filtrait les portées via une jointure sur
+-- documents et un unique index HNSW global : la requête d'un petit tenant
+-- parcourait un graphe dominé par les vecteurs des autres tenants puis
+-- écartait la plupart des candidats. Les clés de portée sont copiées sur les
+-- chunks et chaque portée dispose de son propre index.
+
+-- 1. Colonnes de portée (mêmes valeurs que le document parent)
+ALTER TABLE document_chunks
+ADD COLUMN IF NOT EXISTS scope VARCHAR(50);
+
+ALTER TABLE document_chunks
+ADD COLUMN IF NOT EXISTS organization_id TEXT;
+
+ALTER TABLE document_chunks
+ADD COLUMN IF NOT EXISTS user_id TEXT;
+
+ALTER TABLE document_chunks
+ADD COLUMN IF NOT EXISTS conversation_id TEXT;
+
+-- 2. Reprise des chunks existants
+UPDATE document_chunks dc
+SET scope = d.scope,
+    organization_id = d.organization_id::text,
+    user_id = d.user_id::text,
+    conversation_id = d.conversation_id::text
+FROM documents d
+WHERE dc.document_id = d.id;
+
+-- 3. Cohérence si la portée d'un document change (les suppressions passent par ON DELETE CASCADE)
+CREATE OR REPLACE FUNCTION sync_document_chunks_scope() RETURNS trigger AS $$
+BEGIN
+    UPDATE document_chunks
+    SET scope = NEW.scope,
+        organization_id = NEW.organization_id::text,
+        user_id = NEW.user_id::text,
+        conversation_id = NEW.conversation_id::text
+    WHERE document_id = NEW.id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS documents_scope_sync ON documents;
+CREATE TRIGGER documents_scope_sync
+AFTER UPDATE OF scope, organization_id, user_id, conversation_id ON documents
+FOR EACH ROW
+WHEN (OLD.scope IS DISTINCT FROM NEW.scope
+      OR OLD.organization_id IS DISTINCT FROM NEW.organization_id
+      OR OLD.user_id IS DISTINCT FROM NEW.user_id
+      OR OLD.conversation_id IS DISTINCT FROM NEW.conversation_id)
+EXECUTE FUNCTION sync_document_chunks_scope();
+
+-- 4. Index HNSW partiels par portée (le prédicat de la requête implique celui de l'index)
+CREATE INDEX IF NOT EXISTS document_chunks_org_embedding_idx
+ON document_chunks USING hnsw (embedding vector_cosine_ops)
+WHERE scope = 'organization';
+
+CREATE INDEX IF NOT EXISTS document_chunks_user_embedding_idx
+ON document_chunks USING hnsw (embedding vector_cosine_ops)
+WHERE scope = 'user';
+
+CREATE INDEX IF NOT EXISTS document_chunks_conv_embedding_idx
+ON document_chunks USING hnsw (embedding vector_cosine_ops)
+WHERE conversation_id IS NOT NULL;
+
+-- 5. Index B-tree par tenant : pour un petit tenant, le planner lit ses
+-- chunks et trie les distances exactement (rappel parfait, pas de graphe)
+CREATE INDEX IF NOT EXISTS document_chunks_organization_id_idx
+ON document_chunks(organization_id) WHERE scope = 'organization';
+
+CREATE INDEX IF NOT EXISTS document_chunks_user_id_idx
+ON document_chunks(user_id) WHERE scope = 'user';
+
+CREATE INDEX IF NOT EXISTS document_chunks_conversation_id_idx
+ON document_chunks(conversation_id) WHERE conversation_id IS NOT NULL;
+
+-- 6. Statistiques à jour pour que le planner estime la taille de chaque tenant
+ANALYZE document_chunks;
+
+COMMENT ON COLUMN document_chunks.scope IS 'Copie de documents.scope (filtrage sans jointure).';
+COMMENT ON COLUMN document_chunks.organization_id IS 'Copie de documents.organization_id.';
+COMMENT ON COLUMN document_chunks.user_id IS 'Copie de documents.user_id.';
+COMMENT ON COLUMN document_chunks.conversation_id IS 'Copie de documents.conversation_id.';
@@ -0,0 +1,27 @@
+-- Migration: Empreintes de contenu et cache persistant des embeddings de chunks
+-- Date: 2026-10-17
+-- Description: Un PDF réuploadé, ou des PDF partageant des sections (modèles,
+-- annexes, mentions légales), étaient ré-encodés chunk par chunk, tout comme
+-- l'ensemble du corpus par reindex_documents.py. Les fichiers et les chunks
+-- sont identifiés par le sha256 de leur contenu ; les embeddings déjà calculés
+-- sont réutilisés par (empreinte du chunk, modèle) sans passer par le modèle.
+
+-- 1. Empreinte du fichier (réupload d'un document identique)
+ALTER TABLE documents
+ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+
+CREATE INDEX IF NOT EXISTS documents_content_hash_idx
+ON documents(content_hash) WHERE content_hash IS NOT NULL;
+
+-- 2. Empreinte du texte normalisé de chaque chunk
+ALTER TABLE document_chunks
+ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+
+-- 3. Cache des embeddings (indépendant des documents : survit à leur suppression)
+CREATE TABLE IF NOT EXISTS chunk_embedding_cache (
+    content_hash VARCHAR(64) NOT NULL,
+    model VARCHAR(200) NOT NULL,
+    embedding vector(384) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (content_hash, model)
+);
@@ -0,0 +1,54 @@
+-- Migration: Index HNSW compacts (halfvec et binaire) pour la recherche en deux passes
+-- Date: 2026-10-17
+-- Description: Les index HNSW float32 (vector(384)) grossissent linéairement avec
+-- le corpus et saturent le cache de pages. Ces index d'expression indexent une
+-- représentation compacte des embeddings existants (aucune réécriture de la
+-- table, les lignes existantes sont indexées à la création) :
+--   - halfvec : float16, index ~2x plus petit, recall quasi identique
+--   - binaire : 1 bit par dimension, index ~32x plus petit, recall plus faible
+-- VectorStore y cherche top_k x VECTOR_RERANK_FACTOR candidats puis les
+-- re-classe sur les embeddings float32. Requiert pgvector >= 0.7.
+--
+-- Opt-in : n'appliquer que la famille choisie dans VECTOR_QUANTIZATION
+-- (halfvec ou binary), puis redémarrer le backend.
+
+-- 1. halfvec (VECTOR_QUANTIZATION=halfvec)
+CREATE INDEX IF NOT EXISTS document_chunks_embedding_half_idx
+ON document_chunks USING hnsw ((embedding::halfvec(384)) halfvec_cosine_ops);
+
+CREATE INDEX IF NOT EXISTS document_chunks_org_embedding_half_idx
+ON document_chunks USING hnsw ((embedding::halfvec(384)) halfvec_cosine_ops)
+WHERE scope = 'organization';
+
+CREATE INDEX IF NOT EXISTS document_chunks_user_embedding_half_idx
+ON document_chunks USING hnsw ((embedding::halfvec(384)) halfvec_cosine_ops)
+WHERE scope = 'user';
+
+CREATE INDEX IF NOT EXISTS document_chunks_conv_embedding_half_idx
+ON document_chunks USING hnsw ((embedding::halfvec(384)) halfvec_cosine_ops)
+WHERE conversation_id IS NOT NULL;
+
+-- 2. Binaire (VECTOR_QUANTIZATION=binary)
+CREATE INDEX IF NOT EXISTS document_chunks_embedding_bit_idx
+ON document_chunks USING hnsw ((binary_quantize(embedding)::bit(384)) bit_hamming_ops);
+
+CREATE INDEX IF NOT EXISTS document_chunks_org_embedding_bit_idx
+ON document_chunks USING hnsw ((binary_quantize(embedding)::bit(384)) bit_hamming_ops)
+WHERE scope = 'organization';
+
+CREATE INDEX IF NOT EXISTS document_chunks_user_embedding_bit_idx
+ON document_chunks USING hnsw ((binary_quantize(embedding)::bit(384)) bit_hamming_ops)
+WHERE scope = 'user';
+
+CREATE INDEX IF NOT EXISTS document_chunks_conv_embedding_bit_idx
+ON document_chunks USING hnsw ((binary_quantize(embedding)::bit(384)) bit_hamming_ops)
+WHERE conversation_id IS NOT NULL;
+
+ANALYZE document_chunks;
+
+-- 3. Une fois le mode quantifié validé (benchmark_quantization.py), les index
+--    float32 ne servent plus et peuvent être supprimés pour libérer la mémoire :
+-- DROP INDEX IF EXISTS document_chunks_embedding_idx;
+-- DROP INDEX IF EXISTS document_chunks_org_embedding_idx;
+-- DROP INDEX IF EXISTS document_chunks_user_embedding_idx;
+-- DROP INDEX IF EXISTS document_chunks_conv_embedding_idx;
@@ -6,6 +6,9 @@ from pathlib import Path
 from sqlalchemy import text
 from utils.database import SessionLocal
 from ai.vector_store import VectorStore
+from utils.concurrency import get_pdf_process_pool, shutdown_executors
+from utils.pdf_extraction import extract_pdf_text
+from config import settings
 
 def reindex_documents():
     vector_store = VectorStore()
@@ -36,14 +39,9 @@ def reindex_documents():
                 print(f"❌ Fichier introuvable: {full_path}")
                 continue
             
-            # Lire le contenu du fichier
+            # Lire le contenu du fichier (plages de pages en parallèle)
             try:
-                import pypdf
-                with open(full_path, 'rb') as f:
-                    pdf_reader = pypdf.PdfReader(f)
-                    text_content = ""
-                    for page in pdf_reader.pages:
-                        text_content += page.extract_text() + "\n"
+                text_content, _ = extract_pdf_text(full_path, get_pdf_process_pool(), settings.pdf_pages_per_task)
             except Exception as e:
                 print(f"❌ Erreur lecture PDF: {e}")
                 continue
@@ -75,6 +73,7 @@ def reindex_documents():
     
     finally:
         db.close()
+        shutdown_executors()
 
 if __name__ == "__main__":
     print("🚀 Démarrage de la ré-indexation...\n")
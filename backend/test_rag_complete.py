@@ -46,7 +46,7 @@ print(f"\n3️⃣ Upload et indexation de {pdf_path.name}...")
 try:
     with open(pdf_path, "rb") as f:
         files = {"file": (pdf_path.name, f, "application/pdf")}
-        params = {"auto_index": "true"}
+        params = {"auto_index": "true", "wait": "true"}
         
         print("   ⏳ Upload en cours...")
         response = httpx.post(
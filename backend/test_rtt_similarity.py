@@ -40,7 +40,7 @@ def analyze_similarity():
                 SUBSTRING(dc.content, 1, 100) as preview
             FROM document_chunks dc
             JOIN documents d ON dc.document_id = d.id
-            WHERE LOWER(dc.content) LIKE '%rtt%'
+            WHERE dc.content_tsv @@ websearch_to_tsquery('french', 'rtt')
             ORDER BY d.filename, dc.chunk_index
             LIMIT 10
         """)
@@ -0,0 +1,182 @@
+"""
+Test de non-régression : la recherche vectorielle utilise les index
+Exécute EXPLAIN (FORMAT JSON) sur les requêtes de VectorStore (une par
+portée) pour chaque combinaison de filtres (organisation, utilisateur,
+conversation) et vérifie que chaque plan parcourt document_chunks via
+l'index HNSW de sa portée (global sans filtre, partiel sinon) : le parcours
+ordonné HNSW reste disponible pour chaque portée.
+
+Vérifie aussi que la recherche plein texte (acronymes, termes exacts) passe
+par l'index GIN content_tsv au lieu d'un parcours LIKE de tous les chunks.
+
+Usage: python test_search_explain.py
+"""
+import sys
+import os
+import uuid
+sys.path.insert(0, os.path.dirname(__file__))
+
+import numpy as np
+from sqlalchemy import text
+from utils.database import SessionLocal
+from ai.vector_store import get_vector_store
+
+# En dessous de ce volume, le planner préfère légitimement un Seq Scan + tri :
+# on désactive alors le Seq Scan pour vérifier que la forme de la requête
+# permet l'usage de l'index (une requête non indexable resterait en Seq Scan).
+SMALL_TABLE_ROWS = 10000
+
+FILTER_CASES = {
+    "sans filtre": {},
+    "organisation": {"organization_id": str(uuid.uuid4())},
+    "utilisateur": {"user_id": str(uuid.uuid4())},
+    "conversation": {"conversation_id": str(uuid.uuid4())},
+    "org + user + conversation": {
+        "organization_id": str(uuid.uuid4()),
+        "user_id": str(uuid.uuid4()),
+        "conversation_id": str(uuid.uuid4())
+    }
+}
+
+# Index HNSW attendu par portée (migrations/add_chunk_tenant_columns.sql),
+# suffixe selon le mode de stockage du premier passage
+# (migrations/add_quantized_embedding_indexes.sql)
+SCOPE_INDEX_PREFIXES = {
+    "all": "document_chunks",
+    "organization": "document_chunks_org",
+    "user": "document_chunks_user",
+    "conversation": "document_chunks_conv"
+}
+QUANTIZATION_INDEX_SUFFIXES = {
+    "none": "_embedding_idx",
+    "halfvec": "_embedding_half_idx",
+    "binary": "_embedding_bit_idx"
+}
+
+# Index GIN plein texte (migrations/add_chunk_fulltext.sql)
+FULLTEXT_INDEX = "document_chunks_content_tsv_idx"
+
+
+def iter_plan_nodes(node):
+    """Parcourt récursivement les nœuds d'un plan EXPLAIN JSON"""
+    yield node
+    for child in node.get("Plans", []):
+        yield from iter_plan_nodes(child)
+
+
+def chunk_index_used(plan):
+    """Nom de l'index utilisé pour parcourir document_chunks (None si Seq Scan)"""
+    for node in iter_plan_nodes(plan):
+        if (
+            node.get("Node Type") in ("Index Scan", "Index Only Scan", "Bitmap Index Scan")
+            and (node.get("Relation Name") == "document_chunks"
+                 or node.get("Index Name", "").startswith("document_chunks"))
+        ):
+            return node.get("Index Name")
+    return None
+
+
+def chunk_indexes_used(plan):
+    """Noms de tous les index parcourus dans le plan (BitmapAnd compris)"""
+    return {node["Index Name"] for node in iter_plan_nodes(plan) if node.get("Index Name")}
+
+
+def test_search_uses_hnsw_index() -> bool:
+    """Vérifie le plan des requêtes de recherche pour chaque combinaison de filtres"""
+    print("\n" + "="*60)
+    print("🧪 TEST EXPLAIN - RECHERCHE VECTORIELLE HNSW")
+    print("="*60)
+
+    store = get_vector_store()
+    query_embedding = np.random.default_rng(0).standard_normal(store.embedding_dim).astype(np.float32)
+
+    with SessionLocal() as db:
+        hnsw_indexes = {
+            row[0] for row in db.execute(text("""
+                SELECT indexname FROM pg_indexes
+                WHERE tablename = 'document_chunks' AND indexdef ILIKE '%USING hnsw%'
+            """))
+        }
+        row_count = db.execute(text("SELECT count(*) FROM document_chunks")).scalar()
+
+    print(f"\n📦 document_chunks: {row_count} lignes, index HNSW: {sorted(hnsw_indexes) or 'aucun'}")
+    if not hnsw_indexes:
+        print("❌ Aucun index HNSW sur document_chunks")
+        return False
+
+    force_index = row_count < SMALL_TABLE_ROWS
+    if force_index:
+        print(f"💡 Moins de {SMALL_TABLE_ROWS} lignes : enable_seqscan=off pour tester la forme de la requête")
+
+    suffix = QUANTIZATION_INDEX_SUFFIXES[store._quantization()]
+    all_ok = True
+    for label, filters in FILTER_CASES.items():
+        queries = store._build_search_queries(query_embedding, 10, 0.3, **filters)
+
+        for scope_name, search_query, params in queries:
+            with SessionLocal() as db:
+                # Mêmes paramètres de transaction que la recherche réelle
+                store._apply_search_settings(db, 10)
+                if force_index:
+                    db.execute(text("SET LOCAL enable_seqscan = off"))
+                # Un tenant vide est servi plus vite par l'index B-tree + tri :
+                # sans tri, seul le parcours ordonné HNSW satisfait la requête
+                db.execute(text("SET LOCAL enable_sort = off"))
+                plan = db.execute(text("EXPLAIN (FORMAT JSON) " + search_query.text), params).scalar()
+                db.rollback()
+
+            index_name = chunk_index_used(plan[0]["Plan"])
+            expected = SCOPE_INDEX_PREFIXES[scope_name] + suffix
+            ok = index_name == expected
+            all_ok = all_ok and ok
+            print(f"{'✅' if ok else '❌'} {label} [{scope_name}]: "
+                  f"{f'index {index_name}' if index_name else 'aucun index utilisé'}"
+                  f"{'' if ok else f' (attendu: {expected})'}")
+            if not ok:
+                for node in iter_plan_nodes(plan[0]["Plan"]):
+                    print(f"     - {node.get('Node Type')} {node.get('Relation Name', '')} {node.get('Index Name', '')}")
+
+    print("\n" + ("✅ Tous les plans utilisent l'index HNSW de leur portée" if all_ok else "❌ Régression : plan sans l'index HNSW de sa portée"))
+    return all_ok
+
+
+def test_lexical_uses_gin_index() -> bool:
+    """Vérifie le plan des requêtes plein texte pour chaque combinaison de filtres"""
+    print("\n" + "="*60)
+    print("🧪 TEST EXPLAIN - RECHERCHE PLEIN TEXTE (GIN)")
+    print("="*60)
+
+    store = get_vector_store()
+
+    with SessionLocal() as db:
+        row_count = db.execute(text("SELECT count(*) FROM document_chunks")).scalar()
+
+    all_ok = True
+    for label, filters in FILTER_CASES.items():
+        for match_any in (False, True):
+            queries = store._build_lexical_queries("RTT", 10, match_any=match_any, **filters)
+
+            for scope_name, search_query, params in queries:
+                with SessionLocal() as db:
+                    if row_count < SMALL_TABLE_ROWS:
+                        db.execute(text("SET LOCAL enable_seqscan = off"))
+                    plan = db.execute(text("EXPLAIN (FORMAT JSON) " + search_query.text), params).scalar()
+                    db.rollback()
+
+                index_name = chunk_index_used(plan[0]["Plan"])
+                # Le GIN doit être parcouru (seul ou combiné à l'index B-tree du tenant)
+                ok = FULLTEXT_INDEX in chunk_indexes_used(plan[0]["Plan"])
+                all_ok = all_ok and ok
+                mode = "un terme" if match_any else "tous les termes"
+                print(f"{'✅' if ok else '❌'} {label} [{scope_name}, {mode}]: "
+                      f"{f'index {FULLTEXT_INDEX}' if ok else (f'index {index_name}' if index_name else 'aucun index utilisé')}"
+                      f"{'' if ok else f' (attendu: {FULLTEXT_INDEX})'}")
+
+    print("\n" + ("✅ Recherche plein texte indexée" if all_ok else "❌ Régression : recherche plein texte sans index"))
+    return all_ok
+
+
+if __name__ == "__main__":
+    ok = test_search_uses_hnsw_index()
+    ok = test_lexical_uses_gin_index() and ok
+    sys.exit(0 if ok else 1)
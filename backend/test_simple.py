@@ -32,7 +32,7 @@ with open(pdf_path, "rb") as f:
     
     print("   ⏳ Upload + Indexation en cours...")
     r = httpx.post(
-        f"{API_URL}/api/documents/upload?auto_index=true",
+        f"{API_URL}/api/documents/upload?auto_index=true&wait=true",
         files=files,
         timeout=300
     )
@@ -29,6 +29,7 @@ def test_upload():
         files = {'file': (os.path.basename(test_file), f, 'application/pdf')}
         params = {
             'auto_index': 'true',
+            'wait': 'true',
             'conversation_id': 'test_conv_manual_12345'
         }
         
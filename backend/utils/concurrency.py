@@ -0,0 +1,95 @@
+"""
+Executors bornés pour le travail bloquant (CPU ou I/O synchrone)
+Évite de bloquer la boucle asyncio d'uvicorn pendant les embeddings et le parsing PDF
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional, TypeVar
+import asyncio
+import multiprocessing
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Instances globales (créées à la demande)
+_embedding_executor: Optional[ThreadPoolExecutor] = None
+_document_executor: Optional[ThreadPoolExecutor] = None
+_pdf_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_workers(name: str, default: int) -> int:
+    """Lit le nombre de workers depuis la config (fallback pour tests isolés)"""
+    try:
+        from config import settings
+        return getattr(settings, name)
+    except ImportError:
+        return default
+
+
+def get_embedding_executor() -> ThreadPoolExecutor:
+    """Executor dédié aux encodages sentence-transformers (requêtes)"""
+    global _embedding_executor
+    if _embedding_executor is None:
+        workers = _get_workers("embedding_workers", 2)
+        _embedding_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embeddings")
+        logger.info(f"Executor embeddings initialisé ({workers} workers)")
+    return _embedding_executor
+
+
+def get_document_executor() -> ThreadPoolExecutor:
+    """Executor dédié au parsing PDF et à l'indexation des documents"""
+    global _document_executor
+    if _document_executor is None:
+        workers = _get_workers("document_workers", 2)
+        _document_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="documents")
+        logger.info(f"Executor documents initialisé ({workers} workers)")
+    return _document_executor
+
+
+def get_pdf_process_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Pool de processus pour l'extraction du texte des PDF (None si désactivé)
+
+    Processus lancés en mode spawn : un fork d'un processus multi-thread
+    (uvicorn, torch) peut hériter de verrous tenus par d'autres threads.
+    """
+    global _pdf_process_pool
+    if _pdf_process_pool is None:
+        processes = _get_workers("pdf_extraction_processes", 0)
+        if processes <= 1:
+            return None
+        _pdf_process_pool = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        logger.info(f"Pool d'extraction PDF initialisé ({processes} processus)")
+    return _pdf_process_pool
+
+
+async def run_in_executor(executor: ThreadPoolExecutor, fn: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Exécute une fonction bloquante dans un executor borné sans bloquer la boucle
+
+    Args:
+        executor: Executor cible (embeddings ou documents)
+        fn: Fonction synchrone à exécuter
+        *args, **kwargs: Arguments de la fonction
+
+    Returns:
+        Résultat de la fonction
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(fn, *args, **kwargs))
+
+
+def shutdown_executors() -> None:
+    """Arrête proprement les executors (appelé à l'arrêt de l'application)"""
+    global _embedding_executor, _document_executor, _pdf_process_pool
+    for executor in (_embedding_executor, _document_executor, _pdf_process_pool):
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    _embedding_executor = None
+    _document_executor = None
+    _pdf_process_pool = None
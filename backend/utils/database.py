@@ -2,6 +2,7 @@
 Connexion et gestion de la base de données PostgreSQL
 """
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -27,6 +28,26 @@ engine = create_engine(
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def _to_async_url(url: str) -> str:
+    """Convertit une URL PostgreSQL synchrone en URL asyncpg"""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+# Engine asynchrone (asyncpg) pour les routes FastAPI
+async_engine = create_async_engine(
+    _to_async_url(DATABASE_URL),
+    pool_pre_ping=True,
+    pool_size=10,
+    max_overflow=20
+)
+
+# Session factory asynchrone
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Base pour modèles SQLAlchemy
 Base = declarative_base()
 
@@ -43,6 +64,15 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    Dependency pour obtenir une session DB asynchrone
+    Usage avec FastAPI: Depends(get_async_db)
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def test_connection():
     """Test de connexion à la base de données"""
     try:
@@ -0,0 +1,156 @@
+"""
+Extraction du texte des PDF, parallélisée par plages de pages
+Le parsing parcourait les pages une par une (concaténation quadratique) et
+reparsait tout le document avec pdfplumber au premier échec de pypdf. Les
+plages de pages sont réparties sur un pool de processus, le repli sur
+pdfplumber ne concerne que les pages en échec et le texte est assemblé en
+une passe.
+
+Ce module est importé par les processus du pool : il ne doit dépendre ni de
+la configuration ni des modèles.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+import mmap
+import logging
+
+import pypdf
+import pdfplumber
+
+logger = logging.getLogger(__name__)
+
+
+class PDFExtractionError(Exception):
+    """Aucun parseur n'a pu lire le PDF"""
+
+
+def _open_pdf(file_path: str):
+    """
+    Projette le PDF en mémoire (mmap, lecture seule) : les pages lues restent
+    dans le cache disque, aucune copie complète du fichier n'est faite
+
+    Returns:
+        Tuple (fichier, mmap) à fermer par l'appelant
+    """
+    pdf_file = open(file_path, "rb")
+    try:
+        return pdf_file, mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except Exception:
+        pdf_file.close()
+        raise
+
+
+def count_pages(pdf_data) -> int:
+    """Nombre de pages (pypdf, fallback pdfplumber)"""
+    try:
+        return len(pypdf.PdfReader(pdf_data).pages)
+    except Exception as e:
+        logger.warning(f"pypdf ne peut pas lire le PDF, tentative avec pdfplumber: {e}")
+
+    try:
+        pdf_data.seek(0)
+        with pdfplumber.open(pdf_data) as pdf:
+            return len(pdf.pages)
+    except Exception as e:
+        raise PDFExtractionError(f"Impossible de parser le PDF: {e}") from e
+
+
+def extract_page_range(file_path: str, start: int, end: int) -> List[Optional[str]]:
+    """
+    Texte des pages [start, end) d'un PDF (exécuté dans un processus du pool)
+
+    Chaque page est lue avec pypdf ; seules les pages en échec sont relues
+    avec pdfplumber.
+
+    Returns:
+        Texte de chaque page (None si aucun parseur n'a pu la lire)
+    """
+    texts: List[Optional[str]] = [None] * (end - start)
+    pdf_file, pdf_data = _open_pdf(file_path)
+    try:
+        failed = []
+        try:
+            reader = pypdf.PdfReader(pdf_data)
+            for i in range(start, end):
+                try:
+                    texts[i - start] = reader.pages[i].extract_text()
+                except Exception:
+                    failed.append(i)
+        except Exception:
+            failed = list(range(start, end))
+
+        if failed:
+            logger.warning(f"pypdf a échoué sur {len(failed)} page(s), tentative avec pdfplumber")
+            try:
+                pdf_data.seek(0)
+                with pdfplumber.open(pdf_data) as pdf:
+                    for i in failed:
+                        try:
+                            texts[i - start] = pdf.pages[i].extract_text() or ""
+                        except Exception as e:
+                            logger.error(f"Page {i + 1} illisible: {e}")
+            except Exception as e:
+                logger.error(f"pdfplumber ne peut pas lire le PDF: {e}")
+    finally:
+        pdf_data.close()
+        pdf_file.close()
+
+    return texts
+
+
+def _page_ranges(page_count: int, pages_per_task: int) -> List[Tuple[int, int]]:
+    """Plages contiguës de pages_per_task pages (la dernière peut être plus courte)"""
+    return [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+
+
+def extract_pdf_text(
+    file_path: Union[str, Path],
+    pool: Optional[ProcessPoolExecutor] = None,
+    pages_per_task: int = 16
+) -> Tuple[str, int]:
+    """
+    Extrait le texte d'un PDF, en parallèle si un pool est fourni
+
+    Args:
+        file_path: Chemin du PDF
+        pool: Pool de processus (None = extraction dans le processus courant)
+        pages_per_task: Pages par tâche du pool (un PDF plus court n'est pas découpé)
+
+    Returns:
+        Tuple (texte extrait, nombre de pages)
+
+    Raises:
+        PDFExtractionError: PDF illisible par pypdf et pdfplumber
+    """
+    file_path = str(file_path)
+    pdf_file, pdf_data = _open_pdf(file_path)
+    try:
+        page_count = count_pages(pdf_data)
+    finally:
+        pdf_data.close()
+        pdf_file.close()
+
+    ranges = _page_ranges(page_count, pages_per_task)
+
+    results = None
+    if pool is not None and len(ranges) > 1:
+        try:
+            futures = [pool.submit(extract_page_range, file_path, start, end) for start, end in ranges]
+            results = [future.result() for future in futures]
+        except BrokenProcessPool as e:
+            logger.error(f"Pool d'extraction PDF indisponible, extraction séquentielle: {e}")
+    if results is None:
+        results = [extract_page_range(file_path, 0, page_count)]
+
+    pages = [text for texts in results for text in texts]
+    unreadable = sum(text is None for text in pages)
+    if page_count and unreadable == page_count:
+        raise PDFExtractionError("Impossible de parser le PDF")
+    if unreadable:
+        logger.warning(f"{unreadable}/{page_count} page(s) illisible(s) ignorée(s)")
+
+    extracted_text = "".join(f"{text}\n" for text in pages if text is not None)
+    logger.info(f"PDF: {page_count} pages, {len(extracted_text)} caractères ({len(ranges)} plage(s))")
+    return extracted_text, page_count
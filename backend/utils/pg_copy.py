@@ -0,0 +1,111 @@
+"""
+Insertion en masse par COPY ... FROM STDIN (FORMAT binary)
+Une seule commande pour toutes les lignes d'un document, au lieu d'un
+aller-retour par ligne : les embeddings partent en float32 binaire (codec
+pgvector) sans conversion en texte ni parsing côté PostgreSQL.
+"""
+from typing import Callable, Iterable, List, Optional, Sequence
+import io
+import json
+import struct
+import uuid
+
+import numpy as np
+from pgvector.utils import to_db_binary
+
+# En-tête du format binaire de COPY : signature, flags, longueur d'extension
+COPY_BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+COPY_BINARY_TRAILER = struct.pack("!h", -1)
+NULL_FIELD = struct.pack("!i", -1)
+
+
+# Encodeurs : valeur Python -> représentation binaire du type PostgreSQL
+def encode_uuid(value) -> bytes:
+    return uuid.UUID(str(value)).bytes
+
+
+def encode_int4(value) -> bytes:
+    return struct.pack("!i", value)
+
+
+def encode_text(value) -> bytes:
+    return str(value).encode("utf-8")
+
+
+def encode_jsonb(value) -> bytes:
+    # Version 1 du format binaire jsonb, suivie du texte JSON
+    return b"\x01" + json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+def encode_vector(value) -> bytes:
+    # Dimension, champ réservé, puis float32 big-endian (pgvector)
+    return to_db_binary(value)
+
+
+def encode_copy_binary(
+    rows: Iterable[Sequence],
+    encoders: Sequence[Callable[[object], bytes]]
+) -> bytes:
+    """
+    Encode des lignes au format binaire de COPY
+
+    Args:
+        rows: Lignes (une valeur par colonne, None = NULL)
+        encoders: Encodeur de chaque colonne, dans l'ordre des valeurs
+
+    Returns:
+        Flux complet (en-tête, lignes, fin de flux)
+    """
+    field_count = struct.pack("!h", len(encoders))
+    parts: List[bytes] = [COPY_BINARY_HEADER]
+    for row in rows:
+        parts.append(field_count)
+        for value, encode in zip(row, encoders):
+            if value is None:
+                parts.append(NULL_FIELD)
+                continue
+            data = encode(value)
+            parts.append(struct.pack("!i", len(data)))
+            parts.append(data)
+    parts.append(COPY_BINARY_TRAILER)
+    return b"".join(parts)
+
+
+def copy_rows(
+    db,
+    table: str,
+    columns: Sequence[str],
+    encoders: Sequence[Callable[[object], bytes]],
+    rows: Iterable[Sequence]
+) -> Optional[int]:
+    """
+    Insère des lignes par COPY binaire dans la transaction de la session
+
+    Le COPY passe par la connexion psycopg2 de la session SQLAlchemy : il est
+    validé par le même commit que les autres requêtes de la session.
+
+    Args:
+        db: Session SQLAlchemy synchrone
+        table: Table cible
+        columns: Colonnes remplies (les autres prennent leur valeur par défaut)
+        encoders: Encodeur de chaque colonne
+        rows: Lignes à insérer
+
+    Returns:
+        Nombre de lignes insérées (selon le driver)
+    """
+    payload = encode_copy_binary(rows, encoders)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary)",
+            io.BytesIO(payload)
+        )
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def as_float32_rows(embeddings) -> np.ndarray:
+    """Matrice d'embeddings en float32 big-endian (conversion unique, lignes sans copie)"""
+    return np.ascontiguousarray(np.asarray(embeddings), dtype=">f4")
@@ -0,0 +1,98 @@
+"""
+Exécution concurrente d'étapes asynchrones avec dépendances
+Les étapes indépendantes (embedding, historique, état du LLM...) se
+chevauchent : la latence hors génération tend vers l'étape la plus longue
+du chemin critique au lieu de la somme des étapes.
+"""
+from typing import Any, Awaitable, Callable, Dict, Iterable, Tuple
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StagedPipeline:
+    """
+    Petit exécuteur d'étapes asynchrones
+
+    Chaque étape est une coroutine qui reçoit en arguments nommés les
+    résultats des étapes dont elle dépend. Une étape démarre dès que ses
+    dépendances sont terminées ; la durée de chaque étape est mesurée.
+
+    Exemple:
+        pipeline = StagedPipeline("chat")
+        pipeline.stage("embed", embed)
+        pipeline.stage("search", search, depends_on=["embed"])  # search(embed=...)
+        results = await pipeline.run()
+    """
+
+    def __init__(self, name: str = "pipeline"):
+        self.name = name
+        self.timings: Dict[str, float] = {}
+        self._stages: Dict[str, Tuple[Callable[..., Awaitable[Any]], Tuple[str, ...]]] = {}
+
+    def stage(
+        self,
+        name: str,
+        fn: Callable[..., Awaitable[Any]],
+        depends_on: Iterable[str] = ()
+    ) -> "StagedPipeline":
+        """
+        Déclare une étape
+
+        Args:
+            name: Nom de l'étape (identifiant Python, utilisé comme argument des dépendants)
+            fn: Coroutine à exécuter
+            depends_on: Étapes déjà déclarées dont les résultats sont nécessaires
+
+        Raises:
+            ValueError: Nom dupliqué ou dépendance inconnue
+        """
+        if name in self._stages:
+            raise ValueError(f"Étape déjà déclarée: {name}")
+        depends_on = tuple(depends_on)
+        for dep in depends_on:
+            if dep not in self._stages:
+                raise ValueError(f"Dépendance inconnue pour {name}: {dep}")
+        self._stages[name] = (fn, depends_on)
+        return self
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Exécute toutes les étapes en respectant les dépendances
+
+        Une erreur dans une étape annule les autres et est propagée telle quelle.
+
+        Returns:
+            Résultat de chaque étape, par nom
+        """
+        tasks: Dict[str, asyncio.Task] = {}
+        start = time.perf_counter()
+
+        async def run_stage(name: str, fn, depends_on: Tuple[str, ...]):
+            args = {dep: await tasks[dep] for dep in depends_on}
+            stage_start = time.perf_counter()
+            try:
+                return await fn(**args)
+            finally:
+                self.timings[name] = round((time.perf_counter() - stage_start) * 1000, 1)
+
+        # Ordre de déclaration = ordre topologique (dépendances déclarées avant)
+        for name, (fn, depends_on) in self._stages.items():
+            tasks[name] = asyncio.create_task(run_stage(name, fn, depends_on), name=f"{self.name}:{name}")
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            self.timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+
+        stages = ", ".join(f"{name} {ms:.0f}ms" for name, ms in self.timings.items() if name != "total")
+        logger.info(f"  ⏱️ {self.name}: {self.timings['total']:.0f} ms ({stages})")
+
+        return {name: task.result() for name, task in tasks.items()}
@@ -0,0 +1,52 @@
+"""
+Connexion Redis partagée (cache et compteurs)
+Retourne None si Redis est injoignable pour permettre un fallback en mémoire
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Instance globale (False = connexion déjà tentée sans succès)
+_redis_client = None
+
+
+def get_redis_client():
+    """
+    Retourne le client Redis singleton, ou None si Redis n'est pas disponible
+
+    La connexion est testée une seule fois (PING) ; en cas d'échec les
+    appelants basculent sur leur implémentation en mémoire.
+    """
+    global _redis_client
+    if _redis_client is None:
+        try:
+            import redis
+            from config import settings
+
+            client = redis.Redis.from_url(
+                settings.redis_url,
+                socket_connect_timeout=1.0,
+                socket_timeout=1.0
+            )
+            client.ping()
+            _redis_client = client
+            logger.info(f"✅ Redis connecté: {settings.redis_url}")
+        except Exception as e:
+            logger.warning(f"⚠️ Redis non disponible, fallback en mémoire: {e}")
+            _redis_client = False
+
+    return _redis_client or None
+
+
+def test_connection() -> bool:
+    """Test de connexion à Redis"""
+    client = get_redis_client()
+    if client is None:
+        print("❌ Redis non disponible")
+        return False
+    print("✅ Connexion Redis réussie!")
+    return True
+
+
+if __name__ == "__main__":
+    test_connection()
@@ -16,6 +16,7 @@ CREATE TABLE IF NOT EXISTS documents (
     file_path TEXT NOT NULL,
     scope VARCHAR(20) NOT NULL DEFAULT 'admin',
     user_id UUID NULL,
+    organization_id TEXT NULL,
     conversation_id UUID NULL,
     uploaded_by UUID NULL,
     uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -26,7 +27,9 @@ CREATE TABLE IF NOT EXISTS documents (
     is_indexed BOOLEAN DEFAULT FALSE,
     indexing_status VARCHAR(20) DEFAULT 'pending',
     indexing_error TEXT NULL,
-    metadata JSONB NULL
+    metadata JSONB NULL,
+    -- sha256 du fichier (réupload d'un document identique)
+    content_hash VARCHAR(64) NULL
 );
 
 -- Table pour stocker les chunks avec embeddings
@@ -37,6 +40,15 @@ CREATE TABLE IF NOT EXISTS document_chunks (
     content TEXT NOT NULL,
     embedding vector(384),  -- all-MiniLM-L6-v2 = 384 dimensions (plus léger que 768)
     metadata JSONB NULL,
+    -- Clés de portée copiées du document (filtrage sans jointure, index par portée)
+    scope VARCHAR(20) NULL,
+    organization_id TEXT NULL,
+    user_id TEXT NULL,
+    conversation_id TEXT NULL,
+    -- sha256 du texte normalisé (clé du cache d'embeddings)
+    content_hash VARCHAR(64) NULL,
+    -- Texte indexé pour la recherche plein texte (généré à l'insertion)
+    content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('french', content)) STORED,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE(document_id, chunk_index)
 );
@@ -46,8 +58,67 @@ CREATE INDEX IF NOT EXISTS document_chunks_embedding_idx
 ON document_chunks 
 USING hnsw (embedding vector_cosine_ops);
 
+-- Index HNSW partiels par portée (un tenant ne parcourt pas le graphe des autres portées)
+CREATE INDEX IF NOT EXISTS document_chunks_org_embedding_idx
+ON document_chunks USING hnsw (embedding vector_cosine_ops)
+WHERE scope = 'organization';
+
+CREATE INDEX IF NOT EXISTS document_chunks_user_embedding_idx
+ON document_chunks USING hnsw (embedding vector_cosine_ops)
+WHERE scope = 'user';
+
+CREATE INDEX IF NOT EXISTS document_chunks_conv_embedding_idx
+ON document_chunks USING hnsw (embedding vector_cosine_ops)
+WHERE conversation_id IS NOT NULL;
+
+-- Index B-tree par tenant (petits tenants : tri exact de leurs chunks)
+CREATE INDEX IF NOT EXISTS document_chunks_organization_id_idx
+ON document_chunks(organization_id) WHERE scope = 'organization';
+CREATE INDEX IF NOT EXISTS document_chunks_user_id_idx
+ON document_chunks(user_id) WHERE scope = 'user';
+CREATE INDEX IF NOT EXISTS document_chunks_conversation_id_idx
+ON document_chunks(conversation_id) WHERE conversation_id IS NOT NULL;
+
+-- Clés de portée des chunks tenues à jour si la portée d'un document change
+CREATE OR REPLACE FUNCTION sync_document_chunks_scope() RETURNS trigger AS $$
+BEGIN
+    UPDATE document_chunks
+    SET scope = NEW.scope,
+        organization_id = NEW.organization_id::text,
+        user_id = NEW.user_id::text,
+        conversation_id = NEW.conversation_id::text
+    WHERE document_id = NEW.id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS documents_scope_sync ON documents;
+CREATE TRIGGER documents_scope_sync
+AFTER UPDATE OF scope, organization_id, user_id, conversation_id ON documents
+FOR EACH ROW
+WHEN (OLD.scope IS DISTINCT FROM NEW.scope
+      OR OLD.organization_id IS DISTINCT FROM NEW.organization_id
+      OR OLD.user_id IS DISTINCT FROM NEW.user_id
+      OR OLD.conversation_id IS DISTINCT FROM NEW.conversation_id)
+EXECUTE FUNCTION sync_document_chunks_scope();
+
+-- Index GIN pour la recherche plein texte (acronymes, termes exacts)
+CREATE INDEX IF NOT EXISTS document_chunks_content_tsv_idx
+ON document_chunks USING gin (content_tsv);
+
+-- Cache persistant des embeddings de chunks, par (empreinte du texte, modèle)
+CREATE TABLE IF NOT EXISTS chunk_embedding_cache (
+    content_hash VARCHAR(64) NOT NULL,
+    model VARCHAR(200) NOT NULL,
+    embedding vector(384) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (content_hash, model)
+);
+
 -- Index classiques pour performances
 CREATE INDEX IF NOT EXISTS documents_uploaded_at_idx ON documents(uploaded_at);
+CREATE INDEX IF NOT EXISTS documents_content_hash_idx
+ON documents(content_hash) WHERE content_hash IS NOT NULL;
 CREATE INDEX IF NOT EXISTS documents_scope_idx ON documents(scope);
 CREATE INDEX IF NOT EXISTS document_chunks_document_id_idx ON document_chunks(document_id);
 
@@ -46,6 +46,8 @@ export async function POST(req: NextRequest) {
     if (conversationId) {
       // Document de conversation - priorité sur conversation_id
       url.searchParams.append('conversation_id', conversationId)
+      // Le document est interrogé juste après l'upload : attendre la fin de l'indexation
+      url.searchParams.append('wait', 'true')
       console.log('[UPLOAD] Adding conversation_id to query:', conversationId)
     } else if (isOrganizationDoc && session.user.organizationId) {
       url.searchParams.append('organization_id', session.user.organizationId)